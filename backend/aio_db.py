@@ -0,0 +1,245 @@
+import asyncio
+import os
+import time
+from contextlib import asynccontextmanager
+import logging
+
+import db
+
+if db.BACKEND == "sqlite":
+    import sqlite_backend
+
+try:
+    import aioodbc
+except ImportError:   # only needed to serve SQL Server from the ASGI server
+    aioodbc = None
+
+try:
+    import aiosqlite
+except ImportError:   # only needed to serve the SQLite stand-in from the ASGI server
+    aiosqlite = None
+
+# Async database access for the ASGI server (asgi.py).
+# Same backend switch, connection settings and SQL as db.py, with awaitable
+# cursors: aioodbc for SQL Server, aiosqlite for the local stand-in (whose
+# statements go through sqlite_backend.translate, as in the sync path).
+# The pool mirrors db.ConnectionPool: bounded, LIFO, pings long-idle
+# connections, recycles old ones, rolls back on release and raises
+# db.PoolTimeout when nothing frees up in time. Waiting for a connection
+# costs a coroutine, not a thread.
+
+logger = logging.getLogger(__name__)
+
+POOL_SIZE = int(os.getenv("ASYNC_DB_POOL_SIZE", str(db.POOL_SIZE)))
+
+class _SQLiteConnection:
+    """aiosqlite connection whose cursors translate T-SQL like sqlite_backend.Cursor"""
+
+    def __init__(self, raw):
+        self._raw = raw
+
+    async def cursor(self):
+        return _SQLiteCursor(await self._raw.cursor())
+
+    async def commit(self):
+        await self._raw.commit()
+
+    async def rollback(self):
+        await self._raw.rollback()
+
+    async def close(self):
+        await self._raw.close()
+
+class _SQLiteCursor:
+    def __init__(self, cur):
+        self._cur = cur
+
+    @property
+    def description(self):
+        return self._cur.description
+
+    @property
+    def rowcount(self):
+        return self._cur.rowcount
+
+    async def execute(self, sql, params=()):
+        await self._cur.execute(sqlite_backend.translate(sql), params)
+        return self
+
+    async def fetchone(self):
+        return await self._cur.fetchone()
+
+    async def fetchall(self):
+        return await self._cur.fetchall()
+
+    async def close(self):
+        await self._cur.close()
+
+async def connect():
+    """Open a new, unpooled async connection to the configured backend"""
+    if db.BACKEND == "sqlite":
+        if aiosqlite is None:
+            raise RuntimeError("The async server needs aiosqlite for DB_BACKEND=sqlite (pip install -r requirements-async.txt)")
+        sqlite_backend.ensure_database(sqlite_backend.PATH)
+        raw = await aiosqlite.connect(sqlite_backend.PATH, **sqlite_backend.CONNECT_ARGS)
+        for pragma in sqlite_backend.PRAGMAS:
+            await raw.execute(pragma)
+        return _SQLiteConnection(raw)
+    if aioodbc is None:
+        raise RuntimeError("The async server needs aioodbc for SQL Server (pip install -r requirements-async.txt)")
+    return await aioodbc.connect(dsn=db.connection_string())
+
+class _PoolEntry:
+    __slots__ = ("raw", "created_at", "last_used")
+
+    def __init__(self, raw):
+        self.raw = raw
+        self.created_at = time.monotonic()
+        self.last_used = self.created_at
+
+class AsyncConnectionPool:
+    """
+    Bounded pool of async connections, for use from one event loop.
+    Checkouts beyond `size` wait up to `timeout` seconds, then raise db.PoolTimeout.
+    """
+
+    def __init__(self, creator, size=POOL_SIZE, timeout=db.POOL_TIMEOUT,
+                 recycle=db.POOL_RECYCLE, ping_after=db.POOL_PING_AFTER):
+        self._creator = creator
+        self.size = max(1, size)
+        self.timeout = timeout
+        self.recycle = recycle
+        self.ping_after = ping_after
+
+        self._slots = asyncio.Semaphore(self.size)
+        self._idle = []
+        self._open = 0
+        self._in_use = 0
+
+        # metrics
+        self._checkouts = 0
+        self._created = 0
+        self._recycled = 0
+        self._invalidated = 0
+        self._timeouts = 0
+        self._wait_total = 0.0
+        self._wait_max = 0.0
+
+    async def acquire(self):
+        """Check out a live connection; hand it back with release()"""
+        started = time.monotonic()
+        try:
+            await asyncio.wait_for(self._slots.acquire(), self.timeout)
+        except asyncio.TimeoutError:
+            self._timeouts += 1
+            raise db.PoolTimeout(f"No database connection available within {self.timeout}s")
+        waited = time.monotonic() - started
+        self._checkouts += 1
+        self._wait_total += waited
+        self._wait_max = max(self._wait_max, waited)
+        try:
+            entry = await self._live_entry()
+        except BaseException:
+            self._slots.release()
+            raise
+        self._in_use += 1
+        return entry
+
+    async def _live_entry(self):
+        while self._idle:
+            entry = self._idle.pop()   # LIFO keeps the hot connections warm
+            now = time.monotonic()
+            if now - entry.created_at > self.recycle:
+                self._recycled += 1
+            elif now - entry.last_used > self.ping_after and not await self._ping(entry.raw):
+                self._invalidated += 1
+            else:
+                return entry
+            self._open -= 1
+            await self._close_raw(entry.raw)
+        entry = _PoolEntry(await self._creator())
+        self._open += 1
+        self._created += 1
+        return entry
+
+    async def release(self, entry):
+        self._in_use -= 1
+        try:
+            await entry.raw.rollback()   # never leak an open transaction to the next request
+            entry.last_used = time.monotonic()
+            self._idle.append(entry)
+        except Exception:
+            self._open -= 1
+            self._invalidated += 1
+            await self._close_raw(entry.raw)
+        finally:
+            self._slots.release()
+
+    @staticmethod
+    async def _ping(raw) -> bool:
+        try:
+            cur = await raw.cursor()
+            try:
+                await cur.execute("SELECT 1")
+                await cur.fetchone()
+            finally:
+                await cur.close()
+            return True
+        except Exception:
+            return False
+
+    @staticmethod
+    async def _close_raw(raw):
+        try:
+            await raw.close()
+        except Exception:
+            pass
+
+    async def dispose(self):
+        """Close every idle connection (shutdown, failover)"""
+        entries, self._idle = self._idle, []
+        self._open -= len(entries)
+        for entry in entries:
+            await self._close_raw(entry.raw)
+
+    # ---- helpers ----
+
+    @asynccontextmanager
+    async def get_connection(self):
+        """Checked-out connection that commits on success and rolls back on error"""
+        entry = await self.acquire()
+        try:
+            yield entry.raw
+            await entry.raw.commit()
+        except Exception as e:
+            logger.error(f"Database error: {str(e)}")
+            raise
+        finally:
+            await self.release(entry)
+
+    @asynccontextmanager
+    async def get_cursor(self):
+        async with self.get_connection() as conn:
+            cursor = await conn.cursor()
+            try:
+                yield cursor
+            finally:
+                await cursor.close()
+
+    def stats(self) -> dict:
+        return {
+            "size": self.size,
+            "open": self._open,
+            "in_use": self._in_use,
+            "idle": len(self._idle),
+            "checkouts": self._checkouts,
+            "created": self._created,
+            "recycled": self._recycled,
+            "invalidated": self._invalidated,
+            "timeouts": self._timeouts,
+            "wait_avg_ms": round(self._wait_total / self._checkouts * 1000, 3) if self._checkouts else 0.0,
+            "wait_max_ms": round(self._wait_max * 1000, 3),
+        }
+
+# Shared by the ASGI server's native async handlers
+pool = AsyncConnectionPool(connect)
@@ -0,0 +1,260 @@
+import asyncio
+import os
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import parse_qs
+
+from werkzeug.exceptions import Unauthorized
+
+import aio_db
+import auth
+import db
+import main
+import metrics
+from order_events import order_events, match_scope, sse_stream_async
+
+# ASGI entry point for many long-lived connections:
+#     uvicorn asgi:app --port 8000
+# Long-lived routes run as coroutines, so an idle dashboard or order-tracking
+# stream costs a task and a socket rather than a thread: /api/orders/stream,
+# with its one lookup on the async pool (aio_db.py). Every other route runs
+# the Flask handlers from main.py unchanged, on a bounded thread pool behind a
+# small WSGI bridge, with the sync pool from db.py. The native handlers reuse
+# the Flask side's logic and SQL (main.authenticate_stream, main.stream_scope_query,
+# order_events' frames), so moving another route over means rewriting only
+# its I/O. Needs an ASGI server (uvicorn) and aioodbc, or aiosqlite for the
+# SQLite stand-in: pip install -r requirements-async.txt
+
+WSGI_THREADS = int(os.getenv("ASGI_WSGI_THREADS", "32"))   # concurrent requests on the Flask handlers
+SPOOL_BYTES = 1024 * 1024   # request bodies larger than this wait in a temp file, not in memory
+
+executor = ThreadPoolExecutor(WSGI_THREADS, thread_name_prefix="wsgi")
+
+async def app(scope, receive, send):
+    if scope["type"] == "lifespan":
+        return await lifespan(receive, send)
+    if scope["type"] != "http":
+        if scope["type"] == "websocket":
+            await send({"type": "websocket.close"})
+        return
+    handler = NATIVE_ROUTES.get((scope["method"], scope["path"]))
+    if handler is not None:
+        return await handler(scope, receive, send)
+    await call_flask(scope, receive, send)
+
+async def lifespan(receive, send):
+    while True:
+        message = await receive()
+        if message["type"] == "lifespan.startup":
+            await asyncio.get_running_loop().run_in_executor(executor, main.warm_up)
+            await send({"type": "lifespan.startup.complete"})
+        elif message["type"] == "lifespan.shutdown":
+            await aio_db.pool.dispose()
+            executor.shutdown(wait=False)
+            await send({"type": "lifespan.shutdown.complete"})
+            return
+
+# ==================
+# NATIVE ASYNC ROUTES
+# ==================
+
+def request_headers(scope) -> dict:
+    return {name.decode("latin-1"): value.decode("latin-1") for name, value in scope["headers"]}
+
+def cors_headers(headers) -> list:
+    # what flask-cors adds for origins="*"
+    origin = headers.get("origin")
+    if origin is None:
+        return [(b"access-control-allow-origin", b"*")]
+    return [(b"access-control-allow-origin", origin.encode("latin-1")), (b"vary", b"Origin")]
+
+async def send_flask_response(send, response, headers):
+    """A werkzeug Response (errors built exactly as the Flask handlers build them)"""
+    await send({"type": "http.response.start", "status": response.status_code,
+                "headers": [(k.lower().encode("latin-1"), v.encode("latin-1"))
+                            for k, v in response.headers.to_wsgi_list()] + cors_headers(headers)})
+    await send({"type": "http.response.body", "body": response.get_data()})
+
+async def send_json(send, status, body, headers):
+    with main.app.app_context():
+        response = main.jsonify(body)
+    response.status_code = status
+    await send_flask_response(send, response, headers)
+
+async def stream_orders(scope, receive, send):
+    """main.stream_orders as a coroutine: the same auth, scope lookup and frames"""
+    route = "/api/orders/stream"
+    started = time.perf_counter()
+    status = 500
+    if metrics.ENABLED:
+        metrics.registry.request_started(route, "GET")
+    try:
+        status = await _stream_orders(scope, receive, send)
+    finally:
+        if metrics.ENABLED:
+            metrics.registry.request_finished(route, "GET", status, time.perf_counter() - started)
+
+async def _stream_orders(scope, receive, send):
+    query = parse_qs(scope["query_string"].decode("latin-1"))
+    headers = request_headers(scope)
+
+    # ?ticket= from /api/orders/stream/ticket (EventSource can't send headers), else the header;
+    # on a worker thread: tickets and uncached tokens are checked against revoked_tokens
+    ticket = query.get("ticket", [None])[0]
+    try:
+        user, error = await asyncio.get_running_loop().run_in_executor(
+            executor, main.authenticate_stream, ticket, headers.get("authorization"))
+    except auth.RevocationCheckFailed:
+        await send_json(send, 503, {"detail": "Could not verify token, please retry"}, headers)
+        return 503
+    if error:
+        await send_flask_response(send, Unauthorized(description=error).get_response(), headers)
+        return 401
+
+    if user['role'] == 'INVENTORY_STAFF':
+        match = match_scope("city", user['city_id'])
+    else:
+        scope_name, sql = main.stream_scope_query(user)
+        try:
+            async with aio_db.pool.get_cursor() as cur:
+                await cur.execute(sql, (user['user_id'],))
+                row = await cur.fetchone()
+        except db.PoolTimeout:
+            await send_json(send, 503, {"detail": "Server busy, please retry"}, headers)
+            return 503
+        if not row:
+            await send_json(send, 404, {"detail": "Profile not found"}, headers)
+            return 404
+        match = match_scope(scope_name, row[0])
+
+    last_event_id = headers.get("last-event-id") or query.get("last_event_id", [None])[0]
+    await send({"type": "http.response.start", "status": 200, "headers": [
+        (b"content-type", b"text/event-stream; charset=utf-8"),
+        (b"cache-control", b"no-cache"),
+        (b"x-accel-buffering", b"no"),
+    ] + cors_headers(headers)})
+
+    frames = sse_stream_async(order_events, match, last_event_id)
+    pump = asyncio.ensure_future(_pump(frames, send))
+    try:
+        while (await receive())["type"] != "http.disconnect":
+            pass
+    finally:
+        pump.cancel()
+        try:
+            await pump
+        except asyncio.CancelledError:
+            pass
+        await frames.aclose()
+    return 200
+
+async def _pump(frames, send):
+    async for frame in frames:
+        await send({"type": "http.response.body", "body": frame.encode(), "more_body": True})
+
+NATIVE_ROUTES = {
+    ("GET", "/api/orders/stream"): stream_orders,
+}
+
+# ==================
+# WSGI BRIDGE
+# ==================
+
+def wsgi_environ(scope, body):
+    server = scope.get("server") or ("localhost", 80)
+    client = scope.get("client")
+    environ = {
+        "REQUEST_METHOD": scope["method"],
+        "SCRIPT_NAME": scope.get("root_path", "").encode("utf-8").decode("latin-1"),
+        "PATH_INFO": scope["path"].encode("utf-8").decode("latin-1"),
+        "QUERY_STRING": scope["query_string"].decode("latin-1"),
+        "SERVER_NAME": server[0],
+        "SERVER_PORT": str(server[1]),
+        "SERVER_PROTOCOL": f"HTTP/{scope.get('http_version', '1.1')}",
+        "REMOTE_ADDR": client[0] if client else "",
+        "wsgi.version": (1, 0),
+        "wsgi.url_scheme": scope.get("scheme", "http"),
+        "wsgi.input": body,
+        "wsgi.errors": sys.stderr,
+        "wsgi.multithread": True,
+        "wsgi.multiprocess": True,
+        "wsgi.run_once": False,
+    }
+    for name, value in scope["headers"]:
+        name = name.decode("latin-1")
+        if name == "content-type":
+            key = "CONTENT_TYPE"
+        elif name == "content-length":
+            key = "CONTENT_LENGTH"
+        else:
+            key = "HTTP_" + name.upper().replace("-", "_")
+        value = value.decode("latin-1")
+        environ[key] = f"{environ[key]},{value}" if key in environ else value
+    return environ
+
+async def call_flask(scope, receive, send):
+    body = tempfile.SpooledTemporaryFile(max_size=SPOOL_BYTES)
+    more = True
+    while more:
+        message = await receive()
+        if message["type"] == "http.disconnect":
+            body.close()
+            return
+        body.write(message.get("body", b""))
+        more = message.get("more_body", False)
+    body.seek(0)
+
+    loop = asyncio.get_running_loop()
+    gone = asyncio.Event()
+
+    async def watch_disconnect():
+        while (await receive())["type"] != "http.disconnect":
+            pass
+        gone.set()
+
+    watcher = asyncio.ensure_future(watch_disconnect())
+    try:
+        await loop.run_in_executor(executor, run_flask, wsgi_environ(scope, body), loop, send, gone)
+    finally:
+        watcher.cancel()
+        body.close()
+
+async def _send_all(send, messages):
+    for message in messages:
+        await send(message)
+
+def run_flask(environ, loop, send, gone):
+    """On a worker thread: run the Flask app, handing each body chunk to the event loop"""
+    head = []
+
+    def start_response(status, headers, exc_info=None):
+        if exc_info and head and head[0] is None:
+            raise exc_info[1].with_traceback(exc_info[2])   # too late to change the status
+        head[:] = [{"type": "http.response.start", "status": int(status.split(" ", 1)[0]),
+                    "headers": [(k.lower().encode("latin-1"), v.encode("latin-1")) for k, v in headers]}]
+
+    def push(*messages):
+        if head[0] is not None:
+            messages = (head[0],) + messages
+            head[0] = None   # sent
+        asyncio.run_coroutine_threadsafe(_send_all(send, messages), loop).result()
+
+    result = main.app(environ, start_response)
+    try:
+        # hold one chunk back so a single-chunk response goes out in one hop to the loop
+        pending = None
+        for chunk in result:
+            if not chunk:
+                continue
+            if pending is not None:
+                push({"type": "http.response.body", "body": pending, "more_body": True})
+                if gone.is_set():
+                    return   # client went away mid-stream
+            pending = chunk
+        push({"type": "http.response.body", "body": pending or b""})
+    finally:
+        close = getattr(result, "close", None)
+        if close is not None:
+            close()
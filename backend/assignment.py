@@ -0,0 +1,178 @@
+import os
+import threading
+import time
+
+import numpy as np
+
+import geo
+from locations import as_int
+
+# Automatic delivery-partner assignment.
+# Keeps a per-city, in-memory index of AVAILABLE partners and their last known
+# position, kept current by the status/assignment handlers in main.py, and
+# matches pending orders to partners by distance and current load.
+
+AUTO_ASSIGN = os.getenv("AUTO_ASSIGN", "1") == "1"   # assign as soon as an order is PACKED / a partner comes online
+BATCH_SIZE = int(os.getenv("AUTO_ASSIGN_BATCH", "200"))
+REFRESH_SECONDS = float(os.getenv("ASSIGNMENT_REFRESH_SECONDS", "30"))
+MAX_ORDERS_PER_PARTNER = int(os.getenv("ASSIGNMENT_MAX_ORDERS", "1"))
+LOAD_PENALTY_KM = float(os.getenv("ASSIGNMENT_LOAD_PENALTY_KM", "2"))   # one active order "costs" this many km
+UNKNOWN_DISTANCE_KM = 50.0   # used when either side has no coordinates
+
+class AssignmentEngine:
+    def __init__(self, refresh_seconds=REFRESH_SECONDS, max_orders=MAX_ORDERS_PER_PARTNER,
+                 load_penalty_km=LOAD_PENALTY_KM):
+        self.refresh_seconds = refresh_seconds
+        self.max_orders = max_orders
+        self.load_penalty_km = load_penalty_km
+        self._lock = threading.Lock()
+        self._loaded_at = None
+        self._partners = {}   # partner_id -> {"city_id", "lat", "lon", "load", "available"}
+        self._by_city = {}    # city_id -> set(partner_id) currently able to take an order
+
+    # ---- index maintenance ----
+
+    def is_stale(self) -> bool:
+        return self._loaded_at is None or time.monotonic() - self._loaded_at > self.refresh_seconds
+
+    def refresh(self, conn):
+        cur = conn.cursor()
+        try:
+            cur.execute("""
+                SELECT dp.partner_id, u.city_id, dp.status,
+                       dp.current_location_latitude, dp.current_location_longitude,
+                       (SELECT COUNT(*) FROM orders o
+                        WHERE o.delivery_partner_id = dp.partner_id
+                          AND o.status NOT IN ('DELIVERED', 'CANCELLED')) AS active_orders
+                FROM delivery_partners dp
+                JOIN users u ON dp.user_id = u.user_id
+            """)
+            rows = cur.fetchall()
+        finally:
+            cur.close()
+
+        partners = {
+            row[0]: {"city_id": row[1], "lat": row[3], "lon": row[4], "load": row[5], "available": row[2] == 'AVAILABLE'}
+            for row in rows
+        }
+        with self._lock:
+            self._partners = partners
+            self._by_city = {}
+            for partner_id in partners:
+                self._reindex(partner_id)
+            self._loaded_at = time.monotonic()
+
+    def _reindex(self, partner_id):
+        """Caller holds the lock"""
+        partner = self._partners.get(partner_id)
+        if partner is None:
+            return
+        members = self._by_city.setdefault(partner["city_id"], set())
+        if partner["available"] and partner["load"] < self.max_orders:
+            members.add(partner_id)
+        else:
+            members.discard(partner_id)
+
+    def set_status(self, partner_id, status, city_id=None):
+        """Mirror a delivery_partners.status change (toggle, assignment, delivery)"""
+        partner_id = as_int(partner_id)
+        with self._lock:
+            partner = self._partners.get(partner_id)
+            if partner is None:
+                if city_id is None:
+                    return
+                partner = self._partners[partner_id] = {"city_id": city_id, "lat": None, "lon": None,
+                                                        "load": 0, "available": False}
+            partner["available"] = status == 'AVAILABLE'
+            self._reindex(partner_id)
+
+    def order_assigned(self, partner_id):
+        partner_id = as_int(partner_id)
+        with self._lock:
+            partner = self._partners.get(partner_id)
+            if partner is not None:
+                partner["load"] += 1
+                # the handlers mark the partner BUSY once they carry max_orders
+                partner["available"] = partner["available"] and partner["load"] < self.max_orders
+                self._reindex(partner_id)
+
+    def order_delivered(self, partner_id):
+        partner_id = as_int(partner_id)
+        with self._lock:
+            partner = self._partners.get(partner_id)
+            if partner is not None:
+                partner["load"] = max(0, partner["load"] - 1)
+                partner["available"] = True
+                self._reindex(partner_id)
+
+    def update_position(self, partner_id, lat, lon):
+        partner_id = as_int(partner_id)
+        with self._lock:
+            partner = self._partners.get(partner_id)
+            if partner is not None:
+                partner["lat"], partner["lon"] = lat, lon
+
+    def available(self, city_id):
+        with self._lock:
+            return sorted(self._by_city.get(city_id, ()))
+
+    # ---- matching ----
+
+    def plan(self, city_id, orders):
+        """
+        Match pending orders [(order_id, lat, lon)] in one city to available partners.
+        All order x partner costs (distance + load penalty) are computed in one
+        vectorized pass and pairs are taken cheapest-first, so a batch is solved
+        together instead of first-come-first-served. Chosen partners are reserved
+        (removed from the index) until release() or order_assigned().
+        Returns [(order_id, partner_id, distance_km)].
+        """
+        if not orders:
+            return []
+        with self._lock:
+            partner_ids = sorted(self._by_city.get(city_id, ()))
+            if not partner_ids:
+                return []
+            partners = [self._partners[p] for p in partner_ids]
+
+            order_lats = np.array([o[1] if o[1] is not None else np.nan for o in orders], dtype=float)
+            order_lons = np.array([o[2] if o[2] is not None else np.nan for o in orders], dtype=float)
+            partner_lats = np.array([p["lat"] if p["lat"] is not None else np.nan for p in partners], dtype=float)
+            partner_lons = np.array([p["lon"] if p["lon"] is not None else np.nan for p in partners], dtype=float)
+            loads = np.array([p["load"] for p in partners], dtype=float)
+
+            distances = geo.haversine_km(order_lats[:, None], order_lons[:, None],
+                                         partner_lats[None, :], partner_lons[None, :])
+            distances = np.where(np.isnan(distances), UNKNOWN_DISTANCE_KM, distances)
+            costs = distances + self.load_penalty_km * loads[None, :]
+
+            plan, used_orders, used_partners = [], set(), set()
+            for flat in np.argsort(costs, axis=None, kind="stable"):
+                o, p = divmod(int(flat), len(partner_ids))
+                if o in used_orders or p in used_partners:
+                    continue
+                used_orders.add(o)
+                used_partners.add(p)
+                plan.append((orders[o][0], partner_ids[p], float(distances[o, p])))
+                if len(used_orders) == len(orders) or len(used_partners) == len(partner_ids):
+                    break
+
+            for _, partner_id, _ in plan:
+                self._by_city[city_id].discard(partner_id)
+            return plan
+
+    def release(self, partner_id):
+        """Undo a reservation from plan() whose database write did not go through"""
+        partner_id = as_int(partner_id)
+        with self._lock:
+            self._reindex(partner_id)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "partners": len(self._partners),
+                "available": sum(len(members) for members in self._by_city.values()),
+                "cities": len(self._by_city),
+            }
+
+engine = AssignmentEngine()
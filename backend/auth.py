@@ -1,11 +1,33 @@
 import jwt
+import hashlib
+import heapq
+import secrets
+import threading
+import time
+from collections import OrderedDict
 from datetime import datetime, timedelta
 import os
 
-SECRET_KEY = os.getenv("SECRET_KEY", "your-secret-key-change-in-production")
+import db
+
+# Same secret main.py signs login tokens with
+SECRET_KEY = os.getenv("JWT_SECRET", "dev-secret")
 ALGORITHM = "HS256"
 EXPIRE_MINUTES = 1440  # 24 hours
 
+TOKEN_CACHE_SIZE = int(os.getenv("TOKEN_CACHE_SIZE", "10000"))
+TOKEN_CACHE_NO_EXP_TTL = 300  # seconds to trust a token that carries no exp claim
+# Revocations are shared through the revoked_tokens table: checked whenever a token is not
+# in the cache, and cached claims are re-checked this often, so a logout handled by another
+# worker takes effect everywhere within it. Off by default: turn it on once fix_revoked_tokens.sql
+# has been applied; "0" keeps revocations per process (no database).
+SHARED_REVOCATIONS = os.getenv("TOKEN_REVOCATIONS_SHARED", "0") == "1"
+REVOCATION_RECHECK_SECONDS = float(os.getenv("TOKEN_REVOCATION_RECHECK", "60"))
+# EventSource can't send an Authorization header, so the order stream takes a ticket in its
+# URL instead of the login token: valid this long, for one connection, and only for the stream
+STREAM_TICKET_SECONDS = int(os.getenv("STREAM_TICKET_SECONDS", "30"))
+STREAM_TICKET_AUDIENCE = "order-stream"
+
 def create_token(username: str, role: str):
     """Create JWT token with username and role"""
     payload = {
@@ -17,12 +39,171 @@ def create_token(username: str, role: str):
     token = jwt.encode(payload, SECRET_KEY, algorithm=ALGORITHM)
     return token
 
+class TokenCache:
+    """
+    LRU of already-verified claims keyed by the token's SHA-256 digest.
+    An entry is trusted until the expiry it was put with; revoked digests
+    are remembered until they would have expired anyway.
+    """
+
+    def __init__(self, max_entries=TOKEN_CACHE_SIZE):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()   # digest -> (claims, expires_at)
+        self._revoked = {}              # digest -> expires_at
+        self._revoked_by_expiry = []    # heap of (expires_at, digest), to prune in order
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def digest(token: str) -> bytes:
+        return hashlib.sha256(token.encode()).digest()
+
+    def get(self, key: bytes, now: float):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            if entry[1] <= now:
+                del self._entries[key]
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def put(self, key: bytes, claims: dict, expires_at: float):
+        with self._lock:
+            self._entries[key] = (claims, expires_at)
+            self._entries.move_to_end(key)
+            if len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def revoke(self, key: bytes, expires_at: float):
+        with self._lock:
+            self._revoke(key, expires_at)
+
+    def spend(self, key: bytes, expires_at: float) -> bool:
+        """Revoke a single-use token; False if it was already revoked (spent)"""
+        with self._lock:
+            if key in self._revoked:
+                return False
+            self._revoke(key, expires_at)
+            return True
+
+    def _revoke(self, key: bytes, expires_at: float):
+        """Caller holds the lock"""
+        self._entries.pop(key, None)
+        self._revoked[key] = expires_at
+        heapq.heappush(self._revoked_by_expiry, (expires_at, key))
+        # drop revocations of tokens that have expired by now
+        now = time.time()
+        while self._revoked_by_expiry and self._revoked_by_expiry[0][0] <= now:
+            exp, old = heapq.heappop(self._revoked_by_expiry)
+            if self._revoked.get(old) == exp:
+                del self._revoked[old]
+
+    def is_revoked(self, key: bytes) -> bool:
+        return key in self._revoked
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"entries": len(self._entries), "revoked": len(self._revoked),
+                    "hits": self.hits, "misses": self.misses}
+
+class RevocationCheckFailed(Exception):
+    """revoked_tokens could not be read, so the token is neither trusted nor cached (503)"""
+
+token_cache = TokenCache()
+
 def verify_token(token: str):
-    """Verify JWT token"""
+    """Verify JWT token; repeat verifications of the same token are served from the cache"""
+    now = time.time()
+    key = TokenCache.digest(token)
+    claims = token_cache.get(key, now)
+    if claims is not None:
+        return dict(claims)
+    if token_cache.is_revoked(key):
+        return None
     try:
         payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        return payload
     except jwt.ExpiredSignatureError:
         return None
     except jwt.InvalidTokenError:
-        return None
\ No newline at end of file
+        return None
+    expires_at = payload.get("exp", now + TOKEN_CACHE_NO_EXP_TTL)
+    if SHARED_REVOCATIONS:
+        if _revoked_elsewhere(key):
+            token_cache.revoke(key, expires_at)
+            return None
+        expires_at = min(expires_at, now + REVOCATION_RECHECK_SECONDS)
+    token_cache.put(key, payload, expires_at)
+    return dict(payload)
+
+def _revoked_elsewhere(key: bytes) -> bool:
+    # fail closed: a token we can't check is refused with a retryable 503, not a 401
+    # that would log the user out over a database outage
+    try:
+        with db.pool.get_cursor() as cur:
+            cur.execute("SELECT 1 FROM revoked_tokens WHERE token_hash = ?", (key.hex(),))
+            return cur.fetchone() is not None
+    except (db.Error, db.PoolTimeout) as e:
+        print(f"⚠ Token revocation check failed: {e}")
+        raise RevocationCheckFailed(str(e)) from e
+
+def revoke_token(token: str):
+    """Reject this token from now on (logout, compromised device)"""
+    try:
+        exp = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM], options={"verify_exp": False}).get("exp")
+    except jwt.InvalidTokenError:
+        return
+    key = TokenCache.digest(token)
+    expires_at = exp or time.time() + TOKEN_CACHE_NO_EXP_TTL
+    token_cache.revoke(key, expires_at)
+    if SHARED_REVOCATIONS:
+        _record_revocation(key, expires_at)
+
+def _record_revocation(key: bytes, expires_at: float) -> bool:
+    """Add to revoked_tokens; False if it was already there"""
+    with db.pool.get_cursor() as cur:
+        cur.execute("DELETE FROM revoked_tokens WHERE expires_at <= ?", (datetime.utcnow(),))
+        try:
+            cur.execute("INSERT INTO revoked_tokens (token_hash, expires_at) VALUES (?, ?)",
+                        (key.hex(), datetime.utcfromtimestamp(expires_at)))
+        except db.IntegrityError:
+            return False   # already revoked (logged out twice, ticket replayed)
+    return True
+
+def create_stream_ticket(claims: dict) -> str:
+    """Short-lived, single-use token for the order stream URL, carrying the caller's claims"""
+    payload = {k: v for k, v in claims.items() if k not in ("exp", "iat", "aud", "jti")}
+    payload.update(aud=STREAM_TICKET_AUDIENCE, exp=int(time.time()) + STREAM_TICKET_SECONDS,
+                   jti=secrets.token_urlsafe(16))
+    return jwt.encode(payload, SECRET_KEY, algorithm=ALGORITHM)
+
+def redeem_stream_ticket(ticket: str):
+    """
+    Claims of a valid stream ticket that has not been used yet, else None; it is spent
+    either way. Tickets carry an audience, so verify_token never accepts one as a login
+    token. Single use holds across workers when revocations are shared, per process otherwise.
+    """
+    try:
+        payload = jwt.decode(ticket, SECRET_KEY, algorithms=[ALGORITHM], audience=STREAM_TICKET_AUDIENCE)
+    except jwt.InvalidTokenError:
+        return None
+    key = TokenCache.digest(ticket)
+    if not token_cache.spend(key, payload["exp"]):
+        return None
+    if SHARED_REVOCATIONS:
+        try:
+            if not _record_revocation(key, payload["exp"]):
+                return None
+        except (db.Error, db.PoolTimeout) as e:
+            print(f"⚠ Stream ticket check failed: {e}")
+            raise RevocationCheckFailed(str(e)) from e
+    return payload
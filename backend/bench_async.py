@@ -0,0 +1,171 @@
+"""
+Concurrent-connection capacity: threaded WSGI server vs the ASGI server.
+
+Starts the app in a child process on the local SQLite stand-in, either on
+the threaded WSGI server (what app.run gives you, one thread per connection)
+or under uvicorn (asgi.py, one coroutine per stream), then opens idle
+/api/orders/stream connections as staff in steps of --step up to
+--connections. At every step it records how many opened, their connect
+latency, and the server's RSS and thread count. With all streams open it
+times an ordinary request (GET /api/products) and a fan-out: one order
+placed, delivered to every open stream. Reports memory per connection as
+the RSS growth over the baseline divided by the streams held.
+
+    python bench_async.py [--mode both|sync|async] [--connections 5000] [--step 1000]
+"""
+import argparse
+import asyncio
+import importlib.util
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+import bench_load
+
+PORT = 8766
+OPEN_CONCURRENCY = 50   # connects in flight at once while ramping
+REQUEST_SAMPLES = 20
+
+def raise_fd_limit():
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    resource.setrlimit(resource.RLIMIT_NOFILE, (hard, hard))
+    return hard
+
+def proc_status(pid):
+    """(RSS in KB, threads) of a process, from /proc"""
+    fields = {}
+    with open(f"/proc/{pid}/status") as f:
+        for line in f:
+            name, _, value = line.partition(":")
+            fields[name] = value.split()[0] if value.split() else ""
+    return int(fields["VmRSS"]), int(fields["Threads"])
+
+def start_server(mode, workdir):
+    path = os.path.join(workdir, "quickpick.sqlite3")
+    here = os.path.dirname(os.path.abspath(__file__))
+    if mode == "sync":
+        cmd = [sys.executable, os.path.join(here, "bench_load.py"), "--serve", path, "--port", str(PORT)]
+    else:
+        cmd = [sys.executable, "-m", "uvicorn", "asgi:app", "--port", str(PORT), "--log-level", "warning",
+               "--backlog", "4096", "--timeout-keep-alive", "60"]
+    env = dict(os.environ, DB_BACKEND="sqlite", SQLITE_PATH=path, ID_NODE_ID=os.getenv("ID_NODE_ID", "0"),
+               STOCK_LEDGER_JOURNAL=path + ".journal", STOCK_LEDGER_ID="bench-async", METRICS_ENABLED="1")
+    child = subprocess.Popen(cmd, cwd=here, env=env, preexec_fn=raise_fd_limit, stdout=subprocess.DEVNULL)
+    bench_load.wait_ready(f"http://127.0.0.1:{PORT}")
+    return child
+
+async def open_stream(request, timeout):
+    started = time.perf_counter()
+    reader, writer = await asyncio.wait_for(asyncio.open_connection("127.0.0.1", PORT), timeout)
+    writer.write(request)
+    await asyncio.wait_for(reader.readuntil(b"retry: 3000\n\n"), timeout)
+    return reader, writer, time.perf_counter() - started
+
+async def wait_for_event(reader, timeout):
+    await asyncio.wait_for(reader.readuntil(b"event: order"), timeout)
+    return time.perf_counter()
+
+def percentile(samples, p):
+    samples = sorted(samples)
+    return samples[min(len(samples) - 1, int(len(samples) * p))] if samples else float("nan")
+
+async def measure(mode, child, args, tokens):
+    loop = asyncio.get_running_loop()
+    request = (f"GET /api/orders/stream HTTP/1.1\r\nHost: 127.0.0.1:{PORT}\r\n"
+               f"Authorization: Bearer {tokens['staff']}\r\nAccept: text/event-stream\r\n\r\n").encode()
+    base_rss, base_threads = proc_status(child.pid)
+    print(f"\n[{mode}] baseline: {base_rss / 1024:.1f} MB RSS, {base_threads} threads")
+    print(f"{'streams':>8} {'opened':>8} {'failed':>7} {'connect p50':>12} {'p99 ms':>8} {'RSS MB':>8} "
+          f"{'KB/stream':>10} {'threads':>8}")
+
+    streams, failed = [], 0
+    gate = asyncio.Semaphore(OPEN_CONCURRENCY)
+
+    async def one():
+        async with gate:
+            return await open_stream(request, args.timeout)
+
+    target = 0
+    while target < args.connections and failed == 0:
+        target = min(target + args.step, args.connections)
+        results = await asyncio.gather(*(one() for _ in range(target - len(streams))), return_exceptions=True)
+        opened = [r for r in results if not isinstance(r, BaseException)]
+        failed += len(results) - len(opened)
+        streams += opened
+        await asyncio.sleep(1)   # let the server settle before sampling memory
+        rss, threads = proc_status(child.pid)
+        latencies = [r[2] * 1000 for r in opened]
+        per_stream = (rss - base_rss) / len(streams) if streams else 0
+        print(f"{target:>8,} {len(streams):>8,} {failed:>7,} {percentile(latencies, 0.5):>12.1f} "
+              f"{percentile(latencies, 0.99):>8.1f} {rss / 1024:>8.1f} {per_stream:>10.1f} {threads:>8}")
+
+    # an ordinary request while every stream is held open
+    session = bench_load.Session(f"http://127.0.0.1:{PORT}", tokens["customer"], [], mode)
+    timings = []
+    for _ in range(REQUEST_SAMPLES):
+        started = time.perf_counter()
+        status, catalog = await loop.run_in_executor(None, session.request, "products", "GET", "/api/products",
+                                                     {"location_id": bench_load.LOCATION_ID})
+        timings.append((time.perf_counter() - started) * 1000)
+    print(f"GET /api/products with {len(streams):,} streams open: p50 {percentile(timings, 0.5):.1f} ms, "
+          f"max {max(timings):.1f} ms")
+
+    # one order placed -> one event to every staff stream in the city
+    waiting = [asyncio.ensure_future(wait_for_event(reader, args.timeout)) for reader, _, _ in streams]
+    product = catalog[0]
+    placed = time.perf_counter()
+    await loop.run_in_executor(None, session.request, "create", "POST", "/api/orders/create", None, {
+        "items": [{"product_id": product["product_id"], "quantity": 1, "unit_price": float(product["price"]),
+                   "total_price": float(product["price"])}],
+        "delivery_address": "42 Load Test Lane", "city_id": bench_load.CITY_ID,
+        "delivery_latitude": None, "delivery_longitude": None,
+    })
+    arrivals = await asyncio.gather(*waiting, return_exceptions=True)
+    delivered = [(t - placed) * 1000 for t in arrivals if not isinstance(t, BaseException)]
+    print(f"fan-out of one order: {len(delivered):,}/{len(streams):,} streams got it, "
+          f"p50 {percentile(delivered, 0.5):.1f} ms, p99 {percentile(delivered, 0.99):.1f} ms, "
+          f"last {max(delivered, default=float('nan')):.1f} ms")
+
+    for _, writer, _ in streams:
+        writer.close()
+    rss, threads = proc_status(child.pid)
+    return {"held": len(streams), "failed": failed, "per_stream_kb": (rss - base_rss) / max(len(streams), 1)}
+
+def main_bench():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--mode", choices=("both", "sync", "async"), default="both")
+    parser.add_argument("--connections", type=int, default=5000)
+    parser.add_argument("--step", type=int, default=1000)
+    parser.add_argument("--timeout", type=float, default=10, help="seconds to open a stream or receive an event")
+    args = parser.parse_args()
+
+    limit = raise_fd_limit()
+    if args.connections > limit - 100:
+        raise SystemExit(f"--connections {args.connections} needs more file descriptors than the limit ({limit})")
+    # only the child process imports these; just check they are installed
+    if args.mode != "sync" and not all(importlib.util.find_spec(m) for m in ("uvicorn", "aiosqlite")):
+        raise SystemExit("--mode async needs uvicorn and aiosqlite (pip install -r requirements-async.txt)")
+
+    import auth
+    tokens = {"staff": bench_load.token(auth.SECRET_KEY, bench_load.STAFF, "INVENTORY_STAFF"),
+              "customer": bench_load.token(auth.SECRET_KEY, bench_load.CUSTOMER, "CUSTOMER")}
+    summary = {}
+    for mode in (("sync", "async") if args.mode == "both" else (args.mode,)):
+        with tempfile.TemporaryDirectory(prefix="quickpick_async_") as workdir:
+            child = start_server(mode, workdir)
+            try:
+                summary[mode] = asyncio.run(measure(mode, child, args, tokens))
+            finally:
+                child.terminate()
+                child.wait()
+
+    print()
+    for mode, result in summary.items():
+        print(f"{mode:>5}: held {result['held']:,} streams ({result['failed']:,} failed), "
+              f"{result['per_stream_kb']:.1f} KB of server RSS per stream")
+
+if __name__ == "__main__":
+    main_bench()
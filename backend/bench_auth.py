@@ -0,0 +1,56 @@
+"""
+Per-request authentication cost: full HS256 jwt.decode on every request
+(the old get_current_user) vs the verified-token cache in auth.verify_token.
+
+Runs entirely in-process, no database needed.
+
+    python bench_auth.py [--requests 100000] [--users 500]
+"""
+import argparse
+import time
+from datetime import datetime, timedelta
+
+import jwt
+
+import auth
+import main
+
+def make_tokens(users):
+    return [jwt.encode({"user_id": f"USER_{i}", "role": "CUSTOMER", "city_id": 1,
+                        "exp": datetime.utcnow() + timedelta(days=7)}, main.JWT_SECRET, algorithm="HS256")
+            for i in range(users)]
+
+def per_call_us(fn, tokens, total):
+    started = time.perf_counter()
+    for i in range(total):
+        fn(tokens[i % len(tokens)])
+    return (time.perf_counter() - started) / total * 1e6
+
+def legacy_decode(token):
+    return jwt.decode(token, main.JWT_SECRET, algorithms=["HS256"])
+
+def current_user_via_request(token):
+    with main.app.test_request_context(headers={"Authorization": f"Bearer {token}"}):
+        return main.get_current_user()
+
+def main_bench():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--requests", type=int, default=100000)
+    parser.add_argument("--users", type=int, default=500)
+    args = parser.parse_args()
+
+    tokens = make_tokens(args.users)
+    auth.SHARED_REVOCATIONS = False   # cache behaviour only, no revoked_tokens lookups
+    auth.token_cache.clear()
+
+    decode_us = per_call_us(legacy_decode, tokens, args.requests)
+    cached_us = per_call_us(auth.verify_token, tokens, args.requests)
+    request_us = per_call_us(current_user_via_request, tokens, args.requests // 10)
+
+    print(f"jwt.decode every request      {decode_us:8.2f} us/req")
+    print(f"auth.verify_token (cached)    {cached_us:8.2f} us/req   ({decode_us / cached_us:.1f}x faster)")
+    print(f"get_current_user incl. Flask  {request_us:8.2f} us/req")
+    print("cache:", auth.token_cache.stats())
+
+if __name__ == "__main__":
+    main_bench()
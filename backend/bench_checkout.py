@@ -0,0 +1,138 @@
+"""
+Concurrency benchmark for checkout on a single hot SKU.
+
+Many threads try to buy one unit of the same product at the same dark store.
+For the legacy per-item check-then-decrement sequence and for
+/api/orders/create reserving in SQL (STOCK_LEDGER=0) and through the
+in-memory stock ledger, it reports throughput and verifies that the number
+of units sold never exceeds the starting stock (no overselling).
+
+Runs against the database configured in .env and cleans up after itself.
+
+    python bench_checkout.py [--stock 200] [--attempts 400] [--threads 16] [--product PROD_021]
+"""
+import argparse
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+import jwt
+
+import db
+import main
+import stock_ledger
+
+CUSTOMER_USER_ID = "CUST_TEST_001"
+CITY_ID = 1
+
+def setup(product_id, stock):
+    with db.pool.get_cursor() as cur:
+        cur.execute("SELECT customer_id FROM customers WHERE user_id = ?", (CUSTOMER_USER_ID,))
+        customer_id = cur.fetchone()[0]
+        cur.execute("SELECT TOP 1 location_id FROM inventory_locations WHERE city_id = ?", (CITY_ID,))
+        location_id = cur.fetchone()[0]
+        cur.execute("SELECT price FROM products WHERE product_id = ?", (product_id,))
+        price = float(cur.fetchone()[0])
+        cur.execute("""
+            UPDATE inventory_stock SET quantity_available = ?, quantity_reserved = 0
+            WHERE product_id = ? AND location_id = ?
+        """, (stock, product_id, location_id))
+    stock_ledger.ledger.invalidate(location_id)
+    return customer_id, location_id, price
+
+def read_stock(product_id, location_id):
+    stock_ledger.ledger.flush()   # write-behind deltas first
+    with db.pool.get_cursor() as cur:
+        cur.execute("SELECT quantity_available, quantity_reserved FROM inventory_stock WHERE product_id = ? AND location_id = ?",
+                    (product_id, location_id))
+        return tuple(cur.fetchone())
+
+def cleanup(order_ids):
+    with db.pool.get_cursor() as cur:
+        for order_id in order_ids:
+            cur.execute("DELETE FROM order_items WHERE order_id = ?", (order_id,))
+            cur.execute("DELETE FROM orders WHERE order_id = ?", (order_id,))
+
+def legacy_checkout(customer_id, location_id, product_id, price):
+    """The pre-change create_order sequence: SELECT per item, then INSERT + UPDATE per item"""
+    conn = db.pool.connect()
+    cur = conn.cursor()
+    order_id = f"BENCH_{uuid.uuid4().hex[:16]}"
+    try:
+        cur.execute("SELECT quantity_available FROM inventory_stock WHERE product_id = ? AND location_id = ?",
+                    (product_id, location_id))
+        stock = cur.fetchone()
+        if not stock or stock[0] < 1:
+            return None
+        cur.execute("""
+            INSERT INTO orders (order_id, customer_id, location_id, total_amount, status, payment_status)
+            VALUES (?, ?, ?, ?, 'PLACED', 'PENDING')
+        """, (order_id, customer_id, location_id, price))
+        cur.execute("INSERT INTO order_items (order_id, product_id, quantity, unit_price, total_price) VALUES (?, ?, 1, ?, ?)",
+                    (order_id, product_id, price, price))
+        cur.execute("""
+            UPDATE inventory_stock
+            SET quantity_available = quantity_available - 1, quantity_reserved = quantity_reserved + 1
+            WHERE product_id = ? AND location_id = ?
+        """, (product_id, location_id))
+        conn.commit()
+        return order_id
+    finally:
+        cur.close()
+        conn.close()
+
+def current_checkout(client, token, product_id, price):
+    res = client.post("/api/orders/create", json={
+        "items": [{"product_id": product_id, "quantity": 1, "unit_price": price, "total_price": price}],
+        "delivery_address": "Bench Street",
+        "delivery_latitude": None,
+        "delivery_longitude": None,
+        "city_id": CITY_ID,
+    }, headers={"Authorization": f"Bearer {token}"})
+    if res.status_code == 201:
+        return res.get_json()["order_id"]
+    return None
+
+def run(label, fn, attempts, threads, product_id, location_id, stock):
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as ex:
+        results = list(ex.map(lambda _: fn(), range(attempts)))
+    elapsed = time.perf_counter() - started
+
+    order_ids = [r for r in results if r]
+    available, reserved = read_stock(product_id, location_id)
+    oversold = max(0, len(order_ids) - stock) + max(0, -available)
+    print(f"{label:<12} {attempts / elapsed:>9.1f} checkouts/s  sold={len(order_ids):<5} "
+          f"stock_left={available:<5} reserved={reserved:<5} oversold={oversold}")
+    return order_ids
+
+def main_bench():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--stock", type=int, default=200)
+    parser.add_argument("--attempts", type=int, default=400)
+    parser.add_argument("--threads", type=int, default=16)
+    parser.add_argument("--product", default="PROD_021")
+    args = parser.parse_args()
+
+    token = jwt.encode({"user_id": CUSTOMER_USER_ID, "role": "CUSTOMER", "city_id": CITY_ID,
+                        "exp": datetime.utcnow() + timedelta(hours=1)}, main.JWT_SECRET, algorithm="HS256")
+    client = main.app.test_client()
+    created = []
+    try:
+        customer_id, location_id, price = setup(args.product, args.stock)
+        created += run("legacy", lambda: legacy_checkout(customer_id, location_id, args.product, price),
+                       args.attempts, args.threads, args.product, location_id, args.stock)
+
+        for label, enabled in (("set-based", False), ("ledger", True)):
+            stock_ledger.ENABLED = enabled
+            stock_ledger.LEDGER_ID = stock_ledger.LEDGER_ID or "bench-checkout"
+            setup(args.product, args.stock)
+            created += run(label, lambda: current_checkout(client, token, args.product, price),
+                           args.attempts, args.threads, args.product, location_id, args.stock)
+    finally:
+        cleanup(created)
+        setup(args.product, 50)
+
+if __name__ == "__main__":
+    main_bench()
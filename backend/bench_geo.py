@@ -0,0 +1,55 @@
+"""
+Nearest-dark-store lookup cost with thousands of stores.
+
+Synthetic stores are scattered over a few metro areas; reports the cost of
+single lookups through the grid index (as create_order does) and checks them
+against a brute-force distance to every store. No database needed.
+
+    python bench_geo.py [--stores 5000] [--lookups 20000] [--radius 10]
+"""
+import argparse
+import random
+import time
+
+import geo
+
+METROS = [(28.61, 77.21), (19.08, 72.88), (12.97, 77.59), (17.39, 78.49), (18.52, 73.86), (13.08, 80.27)]
+
+def scatter(n, spread=0.25):
+    points = []
+    for _ in range(n):
+        lat, lon = random.choice(METROS)
+        points.append((lat + random.uniform(-spread, spread), lon + random.uniform(-spread, spread)))
+    return points
+
+def main_bench():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--stores", type=int, default=5000)
+    parser.add_argument("--lookups", type=int, default=20000)
+    parser.add_argument("--radius", type=float, default=10.0)
+    args = parser.parse_args()
+
+    random.seed(7)
+    stores = [(i, lat, lon) for i, (lat, lon) in enumerate(scatter(args.stores))]
+    started = time.perf_counter()
+    index = geo.StoreIndex(stores)
+    build_ms = (time.perf_counter() - started) * 1000
+    points = scatter(args.lookups)
+
+    started = time.perf_counter()
+    found = sum(1 for lat, lon in points if index.nearest(lat, lon, args.radius))
+    single_us = (time.perf_counter() - started) / args.lookups * 1e6
+
+    # sanity: the grid lookup agrees with a brute-force scan on the closest store
+    for lat, lon in points[:500]:
+        nearest = index.nearest(lat, lon, args.radius, limit=1)
+        distances = geo.haversine_km(lat, lon, index.lats, index.lons)
+        best = int(distances.argmin())
+        expected = index.ids[best] if distances[best] <= args.radius else None
+        assert (nearest[0][0] if nearest else None) == expected
+
+    print(f"{args.stores} stores, index built in {build_ms:.1f} ms")
+    print(f"single lookup (grid)     {single_us:8.1f} us   ({found}/{args.lookups} points had a store within {args.radius} km)")
+
+if __name__ == "__main__":
+    main_bench()
@@ -0,0 +1,80 @@
+"""
+Truck-unload benchmark: N stock adjustments sent one request per line to
+/api/inventory/update versus one /api/inventory/bulk-update batch.
+
+Lines are random ADD/REDUCE/SET operations over the catalog at the staff
+member's dark store. Runs against the database configured in .env and puts
+the store's stock back the way it found it.
+
+    python bench_inventory_bulk.py [--lines 10000] [--single 500]
+"""
+import argparse
+import random
+import time
+from datetime import datetime, timedelta
+
+import jwt
+
+import db
+import main
+
+STAFF_USER_ID = "INV_001"
+CITY_ID = 1
+
+def snapshot(location_id):
+    with db.pool.get_cursor() as cur:
+        cur.execute("SELECT product_id, quantity_available FROM inventory_stock WHERE location_id = ?", (location_id,))
+        return dict(cur.fetchall())
+
+def restore(location_id, before):
+    with db.pool.get_cursor() as cur:
+        cur.executemany("UPDATE inventory_stock SET quantity_available = ? WHERE product_id = ? AND location_id = ?",
+                        [(qty, pid, location_id) for pid, qty in before.items()])
+        if before:
+            cur.execute(f"DELETE FROM inventory_stock WHERE location_id = ? AND product_id NOT IN ({', '.join('?' * len(before))})",
+                        (location_id, *before))
+
+def make_lines(product_ids, count):
+    return [{"product_id": random.choice(product_ids),
+             "action": random.choice(("ADD", "ADD", "REDUCE", "SET")),
+             "quantity": random.randint(1, 20)} for _ in range(count)]
+
+def main_bench():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--lines", type=int, default=10000)
+    parser.add_argument("--single", type=int, default=500, help="lines to send one request at a time")
+    args = parser.parse_args()
+
+    token = jwt.encode({"user_id": STAFF_USER_ID, "role": "INVENTORY_STAFF", "city_id": CITY_ID,
+                        "exp": datetime.utcnow() + timedelta(hours=1)}, main.JWT_SECRET, algorithm="HS256")
+    headers = {"Authorization": f"Bearer {token}"}
+    client = main.app.test_client()
+
+    with db.pool.get_connection() as conn:
+        location_id = main.resolve_location(CITY_ID, conn)
+    with db.pool.get_cursor() as cur:
+        cur.execute("SELECT product_id FROM products WHERE is_active = 1")
+        product_ids = [row[0] for row in cur.fetchall()]
+    before = snapshot(location_id)
+    try:
+        lines = make_lines(product_ids, args.single)
+        started = time.perf_counter()
+        for line in lines:
+            client.put("/api/inventory/update", json=line, headers=headers)
+        per_line = (time.perf_counter() - started) / len(lines)
+        print(f"one request per line   {per_line * 1000:8.2f} ms/line   "
+              f"(~{per_line * args.lines:.1f} s for {args.lines} lines)")
+
+        restore(location_id, before)
+        lines = make_lines(product_ids, args.lines)
+        started = time.perf_counter()
+        response = client.post("/api/inventory/bulk-update", json=lines, headers=headers)
+        elapsed = time.perf_counter() - started
+        body = response.get_json()
+        print(f"bulk, {args.lines} lines      {elapsed * 1000:8.1f} ms total   "
+              f"status {response.status_code}, applied {body.get('applied')}, failed {body.get('failed')}")
+    finally:
+        restore(location_id, before)
+
+if __name__ == "__main__":
+    main_bench()
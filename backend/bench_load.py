@@ -0,0 +1,296 @@
+"""
+End-to-end load test: concurrent virtual users running realistic scenarios.
+
+By default starts the API in a child process on the local SQLite stand-in
+(DB_BACKEND=sqlite, a fresh database built from schema.sql with stock
+topped up so checkouts don't run dry), so it needs no SQL Server. With
+--url it drives an already running server instead (seed users from
+schema.sql and the same JWT_SECRET are assumed).
+
+Scenarios, all in city 1 / store 1:
+  browse    full catalog, category pages with cursors, typeahead search
+  checkout  place a 1-5 item order, then list my orders
+  staff     dashboard delta-sync polling; packs new orders, which auto-assigns them
+  partner   GPS ping batches; moves assigned orders out for delivery and delivers them
+
+Reports throughput, p50/p95/p99 latency and error rate per scenario and step.
+
+    python bench_load.py [--seconds 30] [--users 32] [--mix browse=50,checkout=20,staff=10,partner=20]
+                         [--think-ms 0] [--url http://127.0.0.1:8000]
+"""
+import argparse
+import http.client
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime, timedelta
+from urllib.parse import urlencode, urlsplit
+
+import jwt
+
+CITY_ID = 1
+LOCATION_ID = 1
+CUSTOMER = "CUST_TEST_001"
+STAFF = "INV_001"
+PARTNERS = ("DELIV_001", "DELIV_002", "DELIV_003", "DELIV_009")   # the city 1 partners in schema.sql
+STORE_LAT, STORE_LON = 28.6139, 77.2090
+SEARCH_WORDS = ("milk", "bread", "tea", "rice", "chips", "apple", "soap", "juice", "paneer", "oil")
+STOCK_TOP_UP = 1000000
+SCENARIOS = ("browse", "checkout", "staff", "partner")
+
+def token(secret, user_id, role):
+    return jwt.encode({"user_id": user_id, "role": role, "city_id": CITY_ID,
+                       "exp": datetime.utcnow() + timedelta(hours=6)}, secret, algorithm="HS256")
+
+class Session:
+    """One keep-alive HTTP connection; records (step, seconds, ok) for every request"""
+
+    def __init__(self, base_url, bearer, samples, scenario):
+        parts = urlsplit(base_url)
+        self._host, self._port = parts.hostname, parts.port or 80
+        self._headers = {"Authorization": f"Bearer {bearer}", "Content-Type": "application/json"}
+        self._conn = None
+        self._samples = samples
+        self._scenario = scenario
+
+    def request(self, step, method, path, params=None, body=None):
+        if params:
+            path = f"{path}?{urlencode(params)}"
+        payload = json.dumps(body) if body is not None else None
+        started = time.perf_counter()
+        status, data = 0, None
+        for attempt in (1, 2):   # the server may have closed an idle keep-alive connection
+            try:
+                if self._conn is None:
+                    self._conn = http.client.HTTPConnection(self._host, self._port, timeout=30)
+                self._conn.request(method, path, body=payload, headers=self._headers)
+                res = self._conn.getresponse()
+                status, raw = res.status, res.read()
+                if res.getheader("Connection", "").lower() == "close":
+                    self._conn.close()
+                    self._conn = None
+                data = json.loads(raw) if raw and res.getheader("Content-Type", "").startswith("application/json") else None
+                break
+            except (http.client.HTTPException, OSError):
+                if self._conn is not None:
+                    self._conn.close()
+                self._conn = None
+                if attempt == 2:
+                    status = 0
+        self._samples.append((self._scenario, step, time.perf_counter() - started, 200 <= status < 400))
+        return status, data
+
+# ---- scenarios: each runs one iteration per call ----
+
+def browse(s, rng, state):
+    s.request("products (full)", "GET", "/api/products", {"location_id": LOCATION_ID})
+    params = {"category_id": rng.randint(1, 9), "limit": 20, "location_id": LOCATION_ID, "in_stock": 1}
+    for _ in range(rng.randint(1, 3)):
+        status, page = s.request("products (page)", "GET", "/api/products", params)
+        if status != 200 or not page or not page.get("next_cursor"):
+            break
+        params["cursor"] = page["next_cursor"]
+    word = rng.choice(SEARCH_WORDS)
+    for k in range(2, len(word) + 1):   # typeahead: one request per keystroke
+        s.request("search", "GET", "/api/products/search", {"q": word[:k], "location_id": LOCATION_ID})
+
+def checkout(s, rng, state):
+    catalog = state["catalog"]
+    items = []
+    for product in rng.sample(catalog, rng.randint(1, 5)):
+        quantity = rng.randint(1, 3)
+        price = float(product["price"])
+        items.append({"product_id": product["product_id"], "quantity": quantity,
+                      "unit_price": price, "total_price": price * quantity})
+    s.request("create order", "POST", "/api/orders/create", body={
+        "items": items, "delivery_address": "42 Load Test Lane", "city_id": CITY_ID,
+        "delivery_latitude": STORE_LAT + rng.uniform(-0.02, 0.02),
+        "delivery_longitude": STORE_LON + rng.uniform(-0.02, 0.02),
+    })
+    s.request("my orders", "GET", "/api/orders", {"limit": 20})
+
+def staff(s, rng, state):
+    status, sync = s.request("dashboard sync", "GET", "/api/orders", {"since": state.get("sync_token") or ""})
+    if status != 200 or not sync:
+        return
+    state["sync_token"] = sync.get("sync_token")
+    for order in sync["orders"]:
+        if order["status"] == "PLACED":
+            s.request("pack order", "PUT", "/api/orders/status", body={"order_id": order["order_id"], "status": "PACKED"})
+    if rng.random() < 0.1:
+        s.request("partners", "GET", "/api/delivery-partners")
+
+NEXT_STATUS = {"PACKED": "OUT_FOR_DELIVERY", "OUT_FOR_DELIVERY": "DELIVERED"}
+
+def partner(s, rng, state):
+    lat, lon = state.setdefault("position", (STORE_LAT, STORE_LON))
+    points = []
+    for _ in range(rng.randint(1, 5)):
+        lat, lon = lat + rng.uniform(-0.0005, 0.0005), lon + rng.uniform(-0.0005, 0.0005)
+        points.append({"latitude": lat, "longitude": lon})
+    state["position"] = (lat, lon)
+    s.request("location ping", "POST", "/api/delivery-partners/location", body={"points": points})
+    status, page = s.request("my deliveries", "GET", "/api/orders", {"limit": 10})
+    if status != 200 or not page:
+        return
+    for order in page["orders"]:
+        if order["status"] in NEXT_STATUS:
+            s.request("advance order", "PUT", "/api/orders/status",
+                      body={"order_id": order["order_id"], "status": NEXT_STATUS[order["status"]]})
+            break
+
+RUNNERS = {"browse": browse, "checkout": checkout, "staff": staff, "partner": partner}
+
+# ---- driver ----
+
+def go_online(base_url, bearer):
+    """Toggle the partner until they are AVAILABLE (schema.sql seeds them as ACTIVE)"""
+    s = Session(base_url, bearer, [], "setup")
+    for _ in range(3):
+        status, body = s.request("toggle", "POST", "/api/delivery-partners/toggle")
+        if status != 200 or body.get("status") == "AVAILABLE":
+            return
+
+def virtual_user(scenario, base_url, bearer, shared, seed, think, started_at, warm_until, stop_at, samples):
+    rng = random.Random(seed)
+    recorded = []
+    session = Session(base_url, bearer, recorded, scenario)
+    state = {"catalog": shared["catalog"]}
+    while time.monotonic() < stop_at:
+        RUNNERS[scenario](session, rng, state)
+        if time.monotonic() < warm_until:
+            recorded.clear()
+        if think:
+            time.sleep(rng.expovariate(1 / think))
+    samples.extend(recorded)
+
+def split_users(users, mix):
+    weights = dict((name, float(w)) for name, w in (part.split("=") for part in mix.split(",")))
+    unknown = set(weights) - set(SCENARIOS)
+    if unknown:
+        raise SystemExit(f"unknown scenarios: {', '.join(sorted(unknown))}")
+    total = sum(weights.values())
+    return {name: max(1, round(users * w / total)) for name, w in weights.items() if w > 0}
+
+def percentile(samples, p):
+    return samples[min(len(samples) - 1, int(len(samples) * p))]
+
+def report(samples, seconds, counts):
+    print(f"{'scenario / step':<28} {'users':>5} {'requests':>9} {'req/s':>8} {'p50 ms':>8} {'p95 ms':>8} "
+          f"{'p99 ms':>8} {'errors':>7}")
+    def line(label, rows, users=""):
+        timings = sorted(t * 1000 for _, _, t, _ in rows)
+        errors = sum(not ok for *_, ok in rows)
+        print(f"{label:<28} {users:>5} {len(rows):>9,} {len(rows) / seconds:>8.1f} {percentile(timings, 0.5):>8.1f} "
+              f"{percentile(timings, 0.95):>8.1f} {percentile(timings, 0.99):>8.1f} {errors / len(rows):>7.1%}")
+    for scenario in SCENARIOS:
+        rows = [r for r in samples if r[0] == scenario]
+        if not rows:
+            continue
+        line(scenario, rows, counts.get(scenario, ""))
+        for step in sorted({r[1] for r in rows}):
+            line(f"  {step}", [r for r in rows if r[1] == step])
+    if samples:
+        line("all", samples, sum(counts.values()))
+
+def serve(port, path):
+    """Child process: the app on a threaded WSGI server over a fresh SQLite stand-in"""
+    os.environ.update(DB_BACKEND="sqlite", SQLITE_PATH=path, ID_NODE_ID=os.getenv("ID_NODE_ID", "0"),
+                      STOCK_LEDGER_JOURNAL=path + ".journal", STOCK_LEDGER_ID="bench-load")
+    import logging
+    from werkzeug.serving import WSGIRequestHandler, make_server
+    import db
+    import main
+
+    logging.getLogger("werkzeug").setLevel(logging.WARNING)   # no access log line per request
+
+    with db.pool.get_cursor() as cur:
+        cur.execute("UPDATE inventory_stock SET quantity_available = ?", (STOCK_TOP_UP,))
+    WSGIRequestHandler.protocol_version = "HTTP/1.1"   # keep-alive, like a real front end
+    server = make_server("127.0.0.1", port, main.app, threaded=True)
+    print(f"serving on {port}", flush=True)
+    server.serve_forever()
+
+def wait_ready(base_url, timeout=60):
+    parts = urlsplit(base_url)
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            conn = http.client.HTTPConnection(parts.hostname, parts.port or 80, timeout=5)
+            conn.request("GET", "/api/health")
+            if conn.getresponse().status == 200:
+                return
+        except OSError:
+            pass
+        time.sleep(0.2)
+    raise SystemExit(f"server at {base_url} did not become healthy")
+
+def main_bench():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--seconds", type=float, default=30)
+    parser.add_argument("--warmup", type=float, default=3)
+    parser.add_argument("--users", type=int, default=32)
+    parser.add_argument("--mix", default="browse=50,checkout=20,staff=10,partner=20")
+    parser.add_argument("--think-ms", type=float, default=0)
+    parser.add_argument("--url", help="drive a running server instead of starting one on SQLite")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--serve", metavar="SQLITE_PATH", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.serve:
+        return serve(args.port, args.serve)
+
+    import auth   # JWT_SECRET, shared with the server through .env
+    counts = split_users(args.users, args.mix)
+    child = workdir = None
+    base_url = args.url
+    if base_url is None:
+        workdir = tempfile.TemporaryDirectory(prefix="quickpick_load_")
+        base_url = f"http://127.0.0.1:{args.port}"
+        child = subprocess.Popen([sys.executable, os.path.abspath(__file__), "--serve",
+                                  os.path.join(workdir.name, "quickpick.sqlite3"), "--port", str(args.port)],
+                                 cwd=workdir.name)
+    try:
+        wait_ready(base_url)
+        tokens = {"customer": token(auth.SECRET_KEY, CUSTOMER, "CUSTOMER"),
+                  "staff": token(auth.SECRET_KEY, STAFF, "INVENTORY_STAFF"),
+                  "partners": [token(auth.SECRET_KEY, user_id, "DELIVERY_PARTNER") for user_id in PARTNERS]}
+        for bearer in tokens["partners"]:
+            go_online(base_url, bearer)
+        _, catalog = Session(base_url, tokens["customer"], [], "setup").request(
+            "catalog", "GET", "/api/products", {"location_id": LOCATION_ID})
+        shared = {"catalog": [p for p in catalog or [] if not p.get("is_out_of_stock")]}
+        if not shared["catalog"]:
+            raise SystemExit("no products in stock at the test store")
+
+        samples, threads = [], []
+        now = time.monotonic()
+        warm_until, stop_at = now + args.warmup, now + args.warmup + args.seconds
+        seed = args.seed
+        for scenario, n in counts.items():
+            for i in range(n):
+                bearer = {"browse": tokens["customer"], "checkout": tokens["customer"], "staff": tokens["staff"],
+                          "partner": tokens["partners"][i % len(PARTNERS)]}[scenario]
+                seed += 1
+                threads.append(threading.Thread(target=virtual_user, daemon=True, args=(
+                    scenario, base_url, bearer, shared, seed, args.think_ms / 1000, now, warm_until, stop_at, samples)))
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+    finally:
+        if child is not None:
+            child.terminate()
+            child.wait()
+            workdir.cleanup()
+
+    print(f"{sum(counts.values())} virtual users for {args.seconds:g}s (after {args.warmup:g}s warm-up) against {base_url}")
+    report(samples, args.seconds, counts)
+
+if __name__ == "__main__":
+    main_bench()
@@ -0,0 +1,116 @@
+"""
+Login-storm benchmark: p50/p99 latency of the credential lookup at scale.
+
+Seeds synthetic users (user_id prefix BENCHU_) into the database configured
+in .env, then fires concurrent logins and compares the old
+`WHERE u.phone = ? OR u.email = ?` lookup with the single-column seeks that
+/api/login now uses, plus the full endpoint.
+
+    python bench_login.py --seed 1000000       # one-off, takes a while
+    python bench_login.py [--logins 5000] [--threads 32]
+    python bench_login.py --cleanup
+"""
+import argparse
+import random
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import db
+import main
+
+PREFIX = "BENCHU_"
+PASSWORD = "bench-password"
+SEED_BATCH = 5000
+
+LEGACY_QUERY = main.LOGIN_QUERY.replace("u.{column} = ?", "u.phone = ? OR u.email = ?")
+
+def phone_for(i):
+    return f"7{i:09d}"
+
+def email_for(i):
+    return f"bench{i}@example.com"
+
+def seed(total):
+    password_hash = main.hash_password(PASSWORD)
+    conn = db.connect()
+    cur = conn.cursor()
+    cur.fast_executemany = True
+    try:
+        cur.execute("SELECT COUNT(*) FROM users WHERE user_id LIKE ?", (PREFIX + "%",))
+        start = cur.fetchone()[0]
+        for lo in range(start, total, SEED_BATCH):
+            hi = min(lo + SEED_BATCH, total)
+            cur.executemany(
+                "INSERT INTO users (user_id, email, phone, password_hash, role, city_id, is_active) VALUES (?, ?, ?, ?, 'CUSTOMER', 1, 1)",
+                [(f"{PREFIX}{i}", email_for(i), phone_for(i), password_hash) for i in range(lo, hi)])
+            cur.executemany(
+                "INSERT INTO user_profiles (user_id, first_name, last_name) VALUES (?, 'Bench', ?)",
+                [(f"{PREFIX}{i}", str(i)) for i in range(lo, hi)])
+            conn.commit()
+            print(f"seeded {hi}/{total}", end="\r")
+        print()
+        return max(start, total)
+    finally:
+        cur.close()
+        conn.close()
+
+def cleanup():
+    with db.pool.get_cursor() as cur:
+        cur.execute("DELETE FROM user_profiles WHERE user_id LIKE ?", (PREFIX + "%",))
+        cur.execute("DELETE FROM users WHERE user_id LIKE ?", (PREFIX + "%",))
+
+def percentile(samples, p):
+    samples = sorted(samples)
+    return samples[min(len(samples) - 1, int(len(samples) * p / 100))]
+
+def storm(label, fn, population, logins, threads):
+    picks = [random.randrange(population) for _ in range(logins)]
+
+    def timed(i):
+        started = time.perf_counter()
+        fn(i)
+        return (time.perf_counter() - started) * 1000
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as ex:
+        latencies = list(ex.map(timed, picks))
+    elapsed = time.perf_counter() - started
+    print(f"{label:<28}{logins / elapsed:>10.1f} logins/s   p50 {percentile(latencies, 50):7.2f} ms"
+          f"   p99 {percentile(latencies, 99):7.2f} ms")
+
+def query(sql, params):
+    with db.pool.get_cursor() as cur:
+        cur.execute(sql, params)
+        return cur.fetchone()
+
+def main_bench():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--seed", type=int, default=0, help="ensure this many synthetic users exist")
+    parser.add_argument("--logins", type=int, default=5000)
+    parser.add_argument("--threads", type=int, default=32)
+    parser.add_argument("--cleanup", action="store_true")
+    args = parser.parse_args()
+
+    if args.cleanup:
+        cleanup()
+        return
+    population = seed(args.seed) if args.seed else None
+    if population is None:
+        with db.pool.get_cursor() as cur:
+            cur.execute("SELECT COUNT(*) FROM users WHERE user_id LIKE ?", (PREFIX + "%",))
+            population = cur.fetchone()[0]
+    if not population:
+        print("No synthetic users found, run with --seed N first")
+        return
+    print(f"{population} synthetic users")
+
+    client = main.app.test_client()
+    storm("OR lookup (phone)", lambda i: query(LEGACY_QUERY, (phone_for(i), None)), population, args.logins, args.threads)
+    storm("OR lookup (email)", lambda i: query(LEGACY_QUERY, (None, email_for(i))), population, args.logins, args.threads)
+    storm("phone seek", lambda i: query(main.LOGIN_QUERIES["phone"], (phone_for(i),)), population, args.logins, args.threads)
+    storm("email seek", lambda i: query(main.LOGIN_QUERIES["email"], (email_for(i),)), population, args.logins, args.threads)
+    storm("POST /api/login (phone)", lambda i: client.post("/api/login", json={"phone": phone_for(i), "password": PASSWORD}),
+          population, args.logins, args.threads)
+
+if __name__ == "__main__":
+    main_bench()
@@ -0,0 +1,61 @@
+"""
+Instrumentation overhead: what the metrics hooks and timed cursors add.
+
+Runs main.py's before/after/teardown request hooks with metrics on and
+off (best of several rounds), times execute+fetchone on an
+in-memory SQLite cursor bare and wrapped in metrics.TimedCursor, and times
+a /api/metrics scrape after --routes distinct routes have been recorded.
+No database server needed.
+
+    python bench_metrics.py [--requests 5000] [--routes 40]
+"""
+import argparse
+import sqlite3
+import timeit
+
+import main
+import metrics
+
+ROUNDS = 5
+
+def best_us(fn, number):
+    return min(timeit.repeat(fn, number=number, repeat=ROUNDS)) / number * 1e6
+
+def main_bench():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--requests", type=int, default=5000)
+    parser.add_argument("--routes", type=int, default=40)
+    args = parser.parse_args()
+
+    # the three request hooks back to back, inside one request context
+    with main.app.test_request_context("/api/products"):
+        response = main.app.response_class("[]")
+        def hooks():
+            main.start_request_instrumentation()
+            main.record_response_status(response)
+            main.finish_request_instrumentation(None)
+        timings = {}
+        for enabled in (True, False):
+            metrics.ENABLED = enabled
+            timings[enabled] = best_us(hooks, args.requests)
+    metrics.ENABLED = True
+    print(f"request hooks: {timings[True]:.1f} us/request with metrics, {timings[False]:.1f} us with METRICS_ENABLED=0")
+
+    conn = sqlite3.connect(":memory:")
+    raw = conn.cursor()
+    timed = metrics.TimedCursor(conn.cursor())
+    bare = best_us(lambda: raw.execute("SELECT 1").fetchone(), 20000)
+    wrapped = best_us(lambda: timed.execute("SELECT 1").fetchone(), 20000)
+    print(f"cursor execute+fetchone: {wrapped:.2f} us timed, {bare:.2f} us bare ({wrapped - bare:+.2f} us per query)")
+
+    for i in range(args.routes):
+        for method, status in (("GET", 200), ("GET", 404), ("POST", 201)):
+            metrics.registry.request_started(f"/api/bench/{i}", method)
+            metrics.registry.request_finished(f"/api/bench/{i}", method, status, 0.004 * (i % 10))
+        metrics.registry.query_histograms(f"/api/bench/{i}")[0].observe(0.002)
+    body = metrics.registry.render()
+    scrape = best_us(metrics.registry.render, 20) / 1000
+    print(f"scrape with {args.routes} routes: {scrape:.2f} ms, {len(body) / 1024:.0f} KB, {body.count(chr(10)):,} lines")
+
+if __name__ == "__main__":
+    main_bench()
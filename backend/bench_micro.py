@@ -0,0 +1,238 @@
+"""
+Microbenchmarks for the per-request building blocks, with stored baselines.
+
+Cases, each at one or more payload sizes:
+  hash_password             main.hash_password on a typical password
+  jwt.encode / jwt.decode   the login token, signed and fully verified (HS256)
+  verify_token (cached)     auth.verify_token on a token it has already seen
+  model: login / order      models.LoginRequest / CreateOrderRequest(**body), orders of n items
+  validate_json: order      the same order body through validation.parse_body's fast path
+  row mapping               dict(zip(columns, row)) over n order rows, as get_orders does
+  jsonify products / orders jsonify of n catalog products / n order dicts (datetimes, Decimals)
+
+Each case is timed best-of-ROUNDS, with a loop count calibrated to about
+--seconds per round, in --processes fresh worker processes; the result is
+the median across processes in ns/op (timings within one process are
+steady, between processes they are not). --save writes the results to
+bench_micro_baseline.json (commit it). --compare times everything again
+and exits 1 if any case is more than --threshold slower than its baseline.
+Cases that look slower get up to RECHECKS more worker processes before
+they count, so one noisy process doesn't fail the run.
+Baselines only compare meaningfully on the machine and Python that wrote them.
+No database needed.
+
+    python bench_micro.py [--processes 3] [--only jsonify] [--save | --compare [--threshold 0.2]]
+"""
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import timeit
+from datetime import datetime, timedelta
+from decimal import Decimal
+
+os.environ.setdefault("DB_BACKEND", "sqlite")   # main imports db; nothing here connects
+os.environ.setdefault("ID_NODE_ID", "0")        # one host, and main refuses to start without it
+
+import jwt
+
+import auth
+import main
+import models
+
+ROUNDS = 5
+RECHECKS = 3
+BASELINE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "bench_micro_baseline.json")
+
+ORDER_COLUMNS = ["order_id", "customer_id", "total_amount", "status", "created_at", "updated_at",
+                 "delivery_partner_id", "customer_phone"]
+CREATED = datetime(2026, 3, 14, 9, 26, 53, 589000)
+
+def order_body(items):
+    return {
+        "items": [{"product_id": f"P{i:06d}", "quantity": 1 + i % 4, "unit_price": 49.5,
+                   "total_price": 49.5 * (1 + i % 4)} for i in range(items)],
+        "delivery_address": "221B Baker Street, Bengaluru 560001",
+        "delivery_latitude": 12.9716, "delivery_longitude": 77.5946,
+        "customer_notes": "Leave at the door", "city_id": 1,
+    }
+
+def order_rows(n):
+    """Rows as the driver returns them for the staff order list"""
+    return [(f"ORD{7400000000 + i}", 1000 + i % 97, Decimal("249.50") + i % 13, "PLACED",
+             CREATED + timedelta(seconds=i), CREATED + timedelta(seconds=i, minutes=5), None, f"98765{i:05d}")
+            for i in range(n)]
+
+def products(n):
+    """Catalog entries shaped like get_products' product_json"""
+    return [{"product_id": f"P{i:06d}", "product_name": f"Product {i}", "category_id": 1 + i % 9,
+             "price": 49.5 + i % 50, "unit": "1 pc", "description": "Fresh from the farm, packed today",
+             "image_url": f"https://cdn.example.com/p/{i}.jpg", "quantity_available": i % 40,
+             "is_out_of_stock": i % 40 == 0} for i in range(n)]
+
+def claims():
+    return {"user_id": "CUST_TEST_001", "role": "CUSTOMER", "city_id": 1,
+            "exp": datetime.utcnow() + timedelta(days=7)}
+
+# ---- cases: name -> (sizes, setup(size) -> zero-argument callable) ----
+
+def case_hash_password(_):
+    return lambda: main.hash_password("correct horse battery staple")
+
+def case_jwt_encode(_):
+    payload = claims()
+    return lambda: jwt.encode(payload, main.JWT_SECRET, algorithm="HS256")
+
+def case_jwt_decode(_):
+    token = jwt.encode(claims(), main.JWT_SECRET, algorithm="HS256")
+    return lambda: jwt.decode(token, main.JWT_SECRET, algorithms=["HS256"])
+
+def case_verify_token(_):
+    auth.SHARED_REVOCATIONS = False   # the cache hit path; no revoked_tokens lookup
+    token = jwt.encode(claims(), main.JWT_SECRET, algorithm="HS256")
+    auth.verify_token(token)
+    return lambda: auth.verify_token(token)
+
+def case_model_login(_):
+    body = {"phone": "9876543210", "password": "correct horse battery staple"}
+    return lambda: models.LoginRequest(**body)
+
+def case_model_order(items):
+    body = order_body(items)
+    return lambda: models.CreateOrderRequest(**body)
+
+def case_validate_json_order(items):
+    raw = json.dumps(order_body(items)).encode()
+    validate = models.CreateOrderRequest.__pydantic_validator__.validate_json
+    return lambda: validate(raw)
+
+def case_row_mapping(n):
+    rows = order_rows(n)
+    columns = ORDER_COLUMNS
+    return lambda: [dict(zip(columns, row)) for row in rows]
+
+def case_jsonify_products(n):
+    data = products(n)
+    return lambda: main.jsonify(data).get_data()
+
+def case_jsonify_orders(n):
+    data = [dict(zip(ORDER_COLUMNS, row)) for row in order_rows(n)]
+    return lambda: main.jsonify(data).get_data()
+
+CASES = {
+    "hash_password": ((1,), case_hash_password),
+    "jwt.encode": ((1,), case_jwt_encode),
+    "jwt.decode": ((1,), case_jwt_decode),
+    "verify_token (cached)": ((1,), case_verify_token),
+    "model: login": ((1,), case_model_login),
+    "model: order": ((1, 10, 100), case_model_order),
+    "validate_json: order": ((1, 10, 100), case_validate_json_order),
+    "row mapping": ((10, 100, 1000), case_row_mapping),
+    "jsonify products": ((10, 100, 1000), case_jsonify_products),
+    "jsonify orders": ((10, 100, 1000), case_jsonify_orders),
+}
+
+def key(name, size):
+    return f"{name} [{size}]"
+
+def time_ns(fn, seconds):
+    timer = timeit.Timer(fn)
+    number, elapsed = timer.autorange()
+    number = max(1, int(number * seconds / max(elapsed, 1e-9)))
+    return min(timer.repeat(repeat=ROUNDS, number=number)) / number * 1e9
+
+def environment():
+    return {"python": platform.python_version(), "implementation": platform.python_implementation(),
+            "machine": platform.machine(), "system": platform.system(), "processor": platform.processor()}
+
+def measure(keys, seconds):
+    """Worker process: time the given cases, print {key: ns} as JSON"""
+    results = {}
+    with main.app.app_context():   # jsonify needs one
+        for name, (sizes, setup) in CASES.items():
+            for size in sizes:
+                if key(name, size) in keys:
+                    results[key(name, size)] = time_ns(setup(size), seconds)
+    print(json.dumps(results))
+
+def spawn(keys, seconds, processes):
+    """{key: [ns per worker process]}; fresh processes so layout and hash-seed luck average out"""
+    samples = {k: [] for k in keys}
+    for _ in range(processes):
+        out = subprocess.run([sys.executable, os.path.abspath(__file__), "--worker", "--seconds", str(seconds)],
+                             input="\n".join(keys), capture_output=True, text=True, check=True).stdout
+        for k, ns in json.loads(out.splitlines()[-1]).items():
+            samples[k].append(ns)
+    return samples
+
+def select(only):
+    keys = [key(name, size) for name, (sizes, _) in CASES.items() for size in sizes]
+    return [k for k in keys if not only or only in k]
+
+def compare(results, samples, seconds, threshold):
+    with open(BASELINE_PATH, encoding="utf-8") as f:
+        baseline = json.load(f)
+    if baseline.get("environment") != environment():
+        print(f"warning: baseline was recorded on {baseline.get('environment')}, this is {environment()}")
+    for _ in range(RECHECKS):   # confirm slowdowns in more processes before reporting them
+        suspects = [k for k, ns in results.items()
+                    if k in baseline["results"] and ns > baseline["results"][k] * (1 + threshold)]
+        if not suspects:
+            break
+        for k, more in spawn(suspects, seconds, 1).items():
+            samples[k] += more
+            results[k] = statistics.median(samples[k])
+    regressions = []
+    print(f"\n{'case':<32} {'baseline ns':>14} {'now ns':>14} {'change':>8}")
+    for name, now in results.items():
+        before = baseline["results"].get(name)
+        if before is None:
+            print(f"{name:<32} {'-':>14} {now:>14,.0f}      new")
+            continue
+        change = now / before - 1
+        flag = "  REGRESSION" if change > threshold else ""
+        print(f"{name:<32} {before:>14,.0f} {now:>14,.0f} {change:>+8.1%}{flag}")
+        if flag:
+            regressions.append(name)
+    if regressions:
+        print(f"\n{len(regressions)} case(s) more than {threshold:.0%} slower than baseline: {', '.join(regressions)}")
+        sys.exit(1)
+    print(f"\nno case more than {threshold:.0%} slower than baseline")
+
+def main_bench():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--seconds", type=float, default=0.1, help="target time per round per case")
+    parser.add_argument("--processes", type=int, default=3, help="worker processes; each case reports their median")
+    parser.add_argument("--only", help="run cases whose name contains this")
+    mode = parser.add_mutually_exclusive_group()
+    mode.add_argument("--save", action="store_true", help=f"write results to {os.path.basename(BASELINE_PATH)}")
+    mode.add_argument("--compare", action="store_true", help="fail if slower than the baseline")
+    parser.add_argument("--threshold", type=float, default=0.2, help="allowed slowdown, 0.2 = 20%%")
+    parser.add_argument("--worker", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.worker:
+        return measure(set(sys.stdin.read().split("\n")), args.seconds)
+
+    samples = spawn(select(args.only), args.seconds, args.processes)
+    results = {k: statistics.median(ns) for k, ns in samples.items()}
+    for k, ns in results.items():
+        spread = (max(samples[k]) - min(samples[k])) / ns
+        print(f"{k:<32} {ns:>14,.0f} ns/op  ±{spread / 2:.0%}")
+    if args.save:
+        saved = {}
+        if args.only and os.path.exists(BASELINE_PATH):   # update just the cases that ran
+            with open(BASELINE_PATH, encoding="utf-8") as f:
+                saved = json.load(f)["results"]
+        saved.update({name: round(ns, 1) for name, ns in results.items()})
+        with open(BASELINE_PATH, "w", encoding="utf-8") as f:
+            json.dump({"environment": environment(), "results": saved}, f, indent=2)
+            f.write("\n")
+        print(f"\nbaseline written to {BASELINE_PATH}")
+    elif args.compare:
+        compare(results, samples, args.seconds, args.threshold)
+
+if __name__ == "__main__":
+    main_bench()
@@ -0,0 +1,72 @@
+"""
+Requests/sec on read endpoints that check out a connection on every request,
+with and without the connection pool.
+
+Runs the Flask app in-process (test client) against the database configured
+in .env, so the numbers include the real TLS + login handshake cost. Routes
+served from in-process caches (/api/products, /api/locations) are left out:
+they would not touch the pool. Calls are made as an inventory staff user.
+
+    python bench_pool.py [--requests 200] [--threads 8]
+"""
+import argparse
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+import jwt
+
+import db
+import main
+
+STAFF_USER_ID = "INV_001"
+CITY_ID = 1
+# each one runs at least one query on a pooled connection per request
+DB_ENDPOINTS = ["/api/health", "/api/orders?limit=20", "/api/delivery-partners"]
+
+def run(path, total, threads, headers):
+    client = main.app.test_client()
+
+    def hit(_):
+        return client.get(path, headers=headers).status_code
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as ex:
+        codes = list(ex.map(hit, range(total)))
+    elapsed = time.perf_counter() - started
+    errors = sum(1 for c in codes if c >= 500)
+    return total / elapsed, errors
+
+def unpooled():
+    # The pre-pool behaviour: a fresh pyodbc.connect() per request
+    return db.connect()
+
+def main_bench():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--threads", type=int, default=8)
+    args = parser.parse_args()
+
+    token = jwt.encode({"user_id": STAFF_USER_ID, "role": "INVENTORY_STAFF", "city_id": CITY_ID,
+                        "exp": datetime.utcnow() + timedelta(hours=1)}, main.JWT_SECRET, algorithm="HS256")
+    headers = {"Authorization": f"Bearer {token}"}
+    pooled = main.get_db_connection
+
+    print(f"{'endpoint':<24}{'unpooled req/s':>16}{'pooled req/s':>16}{'speedup':>10}")
+    for path in DB_ENDPOINTS:
+        main.get_db_connection = unpooled
+        before, before_err = run(path, args.requests, args.threads, headers)
+
+        main.get_db_connection = pooled
+        run(path, args.threads, args.threads, headers)  # warm the pool
+        after, after_err = run(path, args.requests, args.threads, headers)
+
+        print(f"{path:<24}{before:>16.1f}{after:>16.1f}{after / before:>9.1f}x"
+              + (f"  (errors: {before_err}/{after_err})" if before_err or after_err else ""))
+
+    stats = db.pool.stats()
+    print(f"\npool: {stats}")
+    print(f"checkout wait: avg {stats['wait_avg_ms']:.3f} ms, max {stats['wait_max_ms']:.3f} ms")
+
+if __name__ == "__main__":
+    main_bench()
@@ -0,0 +1,129 @@
+"""
+Product search benchmark: typeahead latency on a synthetic catalog.
+
+Builds the in-memory index for --products generated SKUs (stock comes
+from an in-memory SQLite table, no server needed), then replays
+keystroke-by-keystroke queries, including typos and multi-word queries,
+and reports p50/p99/max latency. Also times an incremental re-index of
+1% of the catalog and in-stock browse pages.
+
+    python bench_search.py [--products 100000] [--queries 20000]
+"""
+import argparse
+import random
+import sqlite3
+import statistics
+import time
+
+import search
+
+CATEGORIES = ["Fruits", "Vegetables", "Dairy", "Bakery", "Beverages", "Snacks", "Frozen", "Household",
+              "Personal Care", "Baby Care", "Meat", "Seafood", "Breakfast", "Pantry", "Pet Supplies"]
+BRANDS = ["amul", "nestle", "britannia", "tata", "haldiram", "patanjali", "mother", "dairy", "organic",
+          "fresho", "everest", "kissan", "maggi", "parle", "cadbury", "lays", "kurkure", "dabur", "surf"]
+NOUNS = ["milk", "bread", "butter", "cheese", "paneer", "yogurt", "apple", "banana", "mango", "orange",
+         "tomato", "potato", "onion", "spinach", "rice", "flour", "sugar", "salt", "tea", "coffee", "juice",
+         "chips", "biscuits", "chocolate", "noodles", "ketchup", "shampoo", "soap", "detergent", "chicken",
+         "eggs", "fish", "prawns", "oats", "cornflakes", "honey", "jam", "oil", "ghee", "almonds", "cashews"]
+ADJECTIVES = ["fresh", "organic", "toned", "full", "cream", "salted", "unsalted", "masala", "classic",
+              "premium", "lite", "spicy", "sweet", "roasted", "crunchy", "instant", "whole", "wheat", "brown"]
+SIZES = ["100g", "200g", "250g", "500g", "1kg", "2kg", "500ml", "1l", "pack of 6", "family pack"]
+
+def synthetic_catalog(n, rng):
+    for i in range(n):
+        name = f"{rng.choice(BRANDS).title()} {rng.choice(ADJECTIVES).title()} {rng.choice(NOUNS).title()} {rng.choice(SIZES)}"
+        yield {
+            "product_id": f"P{i:06d}",
+            "product_name": name,
+            "category_id": rng.randrange(len(CATEGORIES)),
+            "category_name": CATEGORIES[i % len(CATEGORIES)],
+            "price": round(rng.uniform(10, 900), 2),
+            "unit": "pc",
+            "description": f"{rng.choice(ADJECTIVES)} {rng.choice(NOUNS)} from {rng.choice(BRANDS)}, item {i}",
+            "image_url": None,
+            "is_active": True,
+        }
+
+def typo(word, rng):
+    if len(word) < 4:
+        return word
+    i = rng.randrange(len(word) - 1)
+    return word[:i] + word[i + 1] + word[i] + word[i + 2:]
+
+def keystrokes(rng, n):
+    """Queries as a user types them: every prefix of a one-to-three word query"""
+    queries = []
+    while len(queries) < n:
+        words = [rng.choice(NOUNS + BRANDS + ADJECTIVES) for _ in range(rng.choice((1, 1, 2, 3)))]
+        if rng.random() < 0.2:
+            words[-1] = typo(words[-1], rng)
+        text = " ".join(words)
+        queries.extend(text[:k] for k in range(1, len(text) + 1))
+    return queries[:n]
+
+def percentile(samples, p):
+    return samples[min(len(samples) - 1, int(len(samples) * p))]
+
+def main_bench():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--products", type=int, default=100000)
+    parser.add_argument("--queries", type=int, default=20000)
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+    rng = random.Random(args.seed)
+
+    index = search.SearchIndex()
+    catalog = list(synthetic_catalog(args.products, rng))
+    started = time.perf_counter()
+    for product in catalog:
+        index.upsert(product)
+    print(f"indexed {args.products:,} products in {time.perf_counter() - started:.2f}s: {index.stats()}")
+
+    stock_db = sqlite3.connect(":memory:")
+    stock_db.execute("CREATE TABLE inventory_stock (location_id INT, product_id TEXT, quantity_available INT)")
+    stock_db.executemany("INSERT INTO inventory_stock VALUES (1, ?, ?)",
+                         [(p["product_id"], rng.choice((0, 0, 5, 20, 100))) for p in catalog])
+    index.load_stock(1, stock_db)
+
+    queries = keystrokes(rng, args.queries)
+    for q in queries[:500]:
+        index.search(q)    # warm the ranked postings cache
+
+    for label, kwargs in (("typeahead", {}), ("in stock @ store", {"location_id": 1, "in_stock": True})):
+        timings = []
+        empty = 0
+        for q in queries:
+            t0 = time.perf_counter()
+            hits = index.search(q, 10, **kwargs)
+            timings.append((time.perf_counter() - t0) * 1000)
+            empty += not hits
+        timings.sort()
+        print(f"{label:18s} {len(queries):,} queries  p50 {percentile(timings, 0.5):.3f} ms  "
+              f"p99 {percentile(timings, 0.99):.3f} ms  max {timings[-1]:.3f} ms  "
+              f"mean {statistics.mean(timings):.3f} ms  no hits {empty / len(queries):.1%}")
+
+    for q in ("milk", "mlik", "amul tone", "choclate", "fresh paneer 2"):
+        top = index.search(q, 3)
+        print(f"  {q!r:18s} -> {[p['product_name'] for _, p, _ in top]}")
+
+    for sort in search.BROWSE_SORTS:
+        started = time.perf_counter()
+        index.browse(None, sort)
+        built = (time.perf_counter() - started) * 1000
+        timings, cursor = [], None
+        for _ in range(200):
+            t0 = time.perf_counter()
+            rows, cursor = index.browse(None, sort, cursor, 20, 1, True)
+            timings.append((time.perf_counter() - t0) * 1000)
+        timings.sort()
+        print(f"browse {sort:10s} order built in {built:.0f} ms, in-stock pages of 20: "
+              f"p50 {percentile(timings, 0.5):.3f} ms  p99 {percentile(timings, 0.99):.3f} ms")
+
+    changed = rng.sample(catalog, args.products // 100)
+    started = time.perf_counter()
+    for product in changed:
+        index.upsert(dict(product, product_name=product["product_name"] + " new"))
+    print(f"re-indexed {len(changed):,} changed products in {(time.perf_counter() - started) * 1000:.1f} ms")
+
+if __name__ == "__main__":
+    main_bench()
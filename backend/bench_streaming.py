@@ -0,0 +1,111 @@
+"""
+Full-history list endpoints: buffered jsonify vs streamed JSON.
+
+Seeds --rows synthetic orders at the bench city's dark store, then fetches
+GET /api/orders as that city's inventory staff (and GET /api/products) once
+per mode, each in a fresh process so peak RSS is not inherited from the
+other run. Reports time to first byte, total time, body size and peak RSS
+growth over the idle process. Runs against the database configured in .env
+and deletes the seeded orders afterwards.
+
+    python bench_streaming.py [--rows 200000] [--batch 1000]
+"""
+import argparse
+import json
+import resource
+import subprocess
+import sys
+import time
+from datetime import datetime, timedelta
+
+import jwt
+
+import db
+
+CUSTOMER_USER_ID = "CUST_TEST_001"
+CITY_ID = 1
+ORDER_PREFIX = "BENCH_STREAM_"
+SEED_CHUNK = 1000
+MODES = ("buffered", "streamed")
+
+def seed(rows):
+    with db.pool.get_cursor() as cur:
+        cur.execute("SELECT customer_id FROM customers WHERE user_id = ?", (CUSTOMER_USER_ID,))
+        customer_id = cur.fetchone()[0]
+        cur.execute("SELECT TOP 1 location_id FROM inventory_locations WHERE city_id = ?", (CITY_ID,))
+        location_id = cur.fetchone()[0]
+        if hasattr(cur, "fast_executemany"):
+            cur.fast_executemany = True
+        for start in range(0, rows, SEED_CHUNK):
+            cur.executemany("""
+                INSERT INTO orders (order_id, customer_id, location_id, total_amount, delivery_address, status, payment_status)
+                VALUES (?, ?, ?, ?, ?, 'DELIVERED', 'SUCCESS')
+            """, [(f"{ORDER_PREFIX}{i:09d}", customer_id, location_id, 100 + i % 900, f"{i} Bench Street")
+                  for i in range(start, min(start + SEED_CHUNK, rows))])
+
+def cleanup():
+    with db.pool.get_cursor() as cur:
+        cur.execute("DELETE FROM orders WHERE order_id LIKE ?", (ORDER_PREFIX + "%",))
+
+def peak_rss_mb():
+    # ru_maxrss is KB on Linux, bytes on macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024 if sys.platform == "darwin" else 1024)
+
+def child(mode, batch):
+    """One measured request per endpoint in this process; prints a JSON line per endpoint"""
+    import main
+    import streaming
+
+    streaming.ENABLED = mode == "streamed"
+    streaming.BATCH_ROWS = batch
+    token = jwt.encode({"user_id": "BENCH_STAFF", "role": "INVENTORY_STAFF", "city_id": CITY_ID,
+                        "exp": datetime.utcnow() + timedelta(hours=1)}, main.JWT_SECRET, algorithm="HS256")
+    client = main.app.test_client()
+    client.get("/api/health")   # warm the pool and imports before taking the baseline
+
+    for path in ("/api/orders", "/api/products"):
+        main.catalog_cache.clear()
+        idle = peak_rss_mb()
+        started = time.perf_counter()
+        res = client.get(path, headers={"Authorization": f"Bearer {token}"}, buffered=False)
+        size, first_byte = 0, None
+        for chunk in res.response:
+            if first_byte is None:
+                first_byte = time.perf_counter() - started
+            size += len(chunk)
+        res.close()
+        print(json.dumps({
+            "path": path, "mode": mode, "status": res.status_code, "bytes": size,
+            "ttfb_ms": round((first_byte or 0) * 1000, 1),
+            "total_ms": round((time.perf_counter() - started) * 1000, 1),
+            "rss_growth_mb": round(peak_rss_mb() - idle, 1),
+        }), flush=True)
+
+def main_bench():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=200000)
+    parser.add_argument("--batch", type=int, default=1000)
+    parser.add_argument("--child", choices=MODES, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.child:
+        return child(args.child, args.batch)
+
+    seed(args.rows)
+    try:
+        results = []
+        for mode in MODES:
+            out = subprocess.run([sys.executable, __file__, "--child", mode, "--batch", str(args.batch)],
+                                 capture_output=True, text=True, check=True).stdout
+            results += [json.loads(line) for line in out.splitlines() if line.startswith("{")]
+    finally:
+        cleanup()
+
+    print(f"{args.rows:,} seeded orders, batch {args.batch}")
+    print(f"{'endpoint':<15} {'mode':<9} {'status':>6} {'MB':>8} {'TTFB ms':>9} {'total ms':>9} {'peak RSS +MB':>13}")
+    for r in results:
+        print(f"{r['path']:<15} {r['mode']:<9} {r['status']:>6} {r['bytes'] / 1e6:>8.1f} {r['ttfb_ms']:>9.1f} "
+              f"{r['total_ms']:>9.1f} {r['rss_growth_mb']:>13.1f}")
+
+if __name__ == "__main__":
+    main_bench()
@@ -0,0 +1,116 @@
+"""
+Request validation microbenchmark: cost per request body, before and after.
+
+Times Model(**request.get_json()) against validation.parse_body() inside a
+Flask request context for the login, inventory update and order payloads
+(orders with 5 and 50 items), and a bulk inventory batch validated line by
+line against validation.validate_many(). Also checks that both paths return
+the same models and the same e.errors() over a corpus of bad payloads.
+No database needed.
+
+    python bench_validation.py [--seconds 0.5] [--lines 1000]
+"""
+import argparse
+import json
+import timeit
+
+from flask import Flask, request
+from pydantic import ValidationError
+from werkzeug.exceptions import HTTPException
+
+import models
+import validation
+
+app = Flask(__name__)
+ROUNDS = 5
+
+def order(items):
+    return {
+        "items": [{"product_id": f"P{i:06d}", "quantity": 1 + i % 4, "unit_price": 49.5, "total_price": 49.5 * (1 + i % 4)}
+                  for i in range(items)],
+        "delivery_address": "221B Baker Street, Bengaluru 560001",
+        "delivery_latitude": 12.9716, "delivery_longitude": 77.5946,
+        "customer_notes": "Leave at the door", "city_id": 1,
+    }
+
+PAYLOADS = {
+    "login": (models.LoginRequest, {"phone": "9876543210", "password": "correct horse battery staple"}),
+    "inventory": (models.UpdateInventoryRequest, {"product_id": "P000042", "quantity": 12, "action": "ADD"}),
+    "order (5 items)": (models.CreateOrderRequest, order(5)),
+    "order (50 items)": (models.CreateOrderRequest, order(50)),
+}
+
+BAD_PAYLOADS = [
+    (models.LoginRequest, '{"email": "a@b.c"}'),
+    (models.LoginRequest, '{"password": 5, "phone": []}'),
+    (models.LoginRequest, '{"password": '),
+    (models.LoginRequest, '[1, 2]'),
+    (models.UpdateInventoryRequest, '{"product_id": "P1", "quantity": 1.5, "action": "ADD"}'),
+    (models.UpdateInventoryRequest, '{"product_id": 1, "quantity": "x", "action": null}'),
+    (models.CreateOrderRequest, '{"items": [{"product_id": "P1"}, 5], "delivery_address": "a", "city_id": 1}'),
+    (models.CreateOrderRequest, '{"items": {}, "delivery_address": "a", "delivery_latitude": "NaN", "city_id": "x"}'),
+]
+
+def legacy(model):
+    return model(**request.get_json())
+
+def fast(model):
+    return validation.parse_body(model, request)
+
+def outcome(parse, model, body):
+    with app.test_request_context("/", method="POST", data=body, content_type="application/json"):
+        try:
+            return parse(model).model_dump()
+        except ValidationError as e:
+            return e.errors()
+        except (HTTPException, TypeError) as e:
+            return type(e).__name__
+
+def per_call_us(fn, seconds):
+    """Microseconds per call of fn(): best of several rounds filling about `seconds` in total"""
+    number = max(1, int(seconds / ROUNDS / max(timeit.timeit(fn, number=1), 1e-7)))
+    return min(timeit.repeat(fn, number=number, repeat=ROUNDS)) / number * 1e6
+
+def time_request(parse, model, body, seconds):
+    # one request context, body re-read each call: this times the parse and validation only
+    with app.test_request_context("/", method="POST", data=body, content_type="application/json"):
+        def once():
+            request._cached_json = (Ellipsis, Ellipsis)
+            parse(model)
+        return per_call_us(once, seconds)
+
+def bulk_legacy(lines):
+    for raw in lines:
+        try:
+            models.UpdateInventoryRequest(**raw)
+        except ValidationError:
+            pass
+
+def main_bench():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--seconds", type=float, default=0.5)
+    parser.add_argument("--lines", type=int, default=1000)
+    args = parser.parse_args()
+
+    mismatches = [body for model, body in BAD_PAYLOADS + [(m, json.dumps(p)) for m, p in PAYLOADS.values()]
+                  if outcome(legacy, model, body) != outcome(fast, model, body)]
+    print(f"parity: {len(BAD_PAYLOADS) + len(PAYLOADS) - len(mismatches)}/{len(BAD_PAYLOADS) + len(PAYLOADS)} payloads identical"
+          + "".join(f"\n  MISMATCH {body}" for body in mismatches))
+
+    print(f"{'payload':<18} {'bytes':>6} {'get_json+init us':>17} {'parse_body us':>14} {'speedup':>8}")
+    for name, (model, payload) in PAYLOADS.items():
+        body = json.dumps(payload).encode()
+        before = time_request(legacy, model, body, args.seconds)
+        after = time_request(fast, model, body, args.seconds)
+        print(f"{name:<18} {len(body):>6} {before:>17.2f} {after:>14.2f} {before / after:>7.1f}x")
+
+    lines = [{"product_id": f"P{i:06d}", "quantity": i % 50, "action": ("ADD", "reduce", "SET")[i % 3]}
+             for i in range(args.lines)]
+    lines[::97] = [{"product_id": "P1", "quantity": "lots"}] * len(lines[::97])   # ~1% bad lines
+    before = per_call_us(lambda: bulk_legacy(lines), args.seconds)
+    after = per_call_us(lambda: validation.validate_many(models.UpdateInventoryRequest, lines), args.seconds)
+    print(f"bulk {args.lines:,} lines: one model per line {before / 1000:.2f} ms, "
+          f"validate_many {after / 1000:.2f} ms ({before / after:.1f}x)")
+
+if __name__ == "__main__":
+    main_bench()
@@ -0,0 +1,90 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+
+# In-process cache of the serialized /api/products payload, keyed by location.
+# The catalog only changes when inventory_stock is written, so the write paths
+# in main.py invalidate the affected entries; the TTL is a safety net for
+# writes made by other worker processes.
+
+MAX_ENTRIES = int(os.getenv("CATALOG_CACHE_SIZE", "64"))
+MAX_BYTES = int(os.getenv("CATALOG_CACHE_MAX_BYTES", str(32 * 1024 * 1024)))
+TTL_SECONDS = float(os.getenv("CATALOG_CACHE_TTL", "60"))
+
+ALL_LOCATIONS = "*"
+
+def cache_key(location_id) -> str:
+    """Normalise ?location_id= so '3', 3 and ' 3' share an entry; None means all locations"""
+    if location_id is None or str(location_id).strip() == "":
+        return ALL_LOCATIONS
+    return str(location_id).strip()
+
+class CatalogCache:
+    def __init__(self, max_entries=MAX_ENTRIES, max_bytes=MAX_BYTES, ttl=TTL_SECONDS):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self._entries = OrderedDict()   # key -> (payload bytes, stored_at)
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, location_id):
+        key = cache_key(location_id)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or time.monotonic() - entry[1] > self.ttl:
+                if entry is not None:
+                    self._drop(key)
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def put(self, location_id, payload: bytes):
+        key = cache_key(location_id)
+        if len(payload) > self.max_bytes:
+            return
+        with self._lock:
+            if key in self._entries:
+                self._drop(key)
+            self._entries[key] = (payload, time.monotonic())
+            self._bytes += len(payload)
+            while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+                oldest = next(iter(self._entries))
+                self._drop(oldest)
+                self.evictions += 1
+
+    def invalidate(self, location_id):
+        """Drop a location's entry and the all-locations aggregate that includes it"""
+        with self._lock:
+            for key in (cache_key(location_id), ALL_LOCATIONS):
+                if key in self._entries:
+                    self._drop(key)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def _drop(self, key):
+        payload, _ = self._entries.pop(key)
+        self._bytes -= len(payload)
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            }
+
+catalog_cache = CatalogCache()
@@ -0,0 +1,213 @@
+"""
+Streaming catalog importer.
+
+Reads products from CSV or JSONL one row at a time, validates each row
+against models.Product, diffs it against the products table by product_id
+and sku, and writes only new or changed rows in batched upserts. New SKUs
+get a zero-stock inventory_stock row at every location. Only one batch is
+held in memory, so a file of any size runs in flat memory. sku is optional;
+databases created before fix_product_sku.sql allow only one product without it.
+
+    python catalog_import.py products.csv [--format csv|jsonl] [--batch 500] [--dry-run]
+"""
+import argparse
+import csv
+import io
+import json
+import sys
+from itertools import islice
+
+from pydantic import ValidationError
+
+import models
+
+BATCH_SIZE = 500
+WRITE_CHUNK = 200    # 9 parameters per product row, under SQL Server's 2100 limit
+MAX_ERRORS = 100     # rejected rows reported back in detail; the rest are only counted
+
+FIELDS = ("product_id", "product_name", "category_id", "price", "unit", "description", "image_url", "sku", "is_active")
+OPTIONAL_FIELDS = ("description", "image_url", "sku")
+
+# ==================
+# READERS
+# ==================
+
+def read_csv(stream):
+    """Yield (line_no, dict) from a text stream with a header row"""
+    for line_no, row in enumerate(csv.DictReader(stream), start=2):
+        yield line_no, row
+
+def read_jsonl(stream):
+    """Yield (line_no, dict) from a text stream of one JSON object per line"""
+    for line_no, line in enumerate(stream, start=1):
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            yield line_no, json.loads(line)
+        except json.JSONDecodeError as e:
+            yield line_no, e
+
+READERS = {"csv": read_csv, "jsonl": read_jsonl}
+
+def validate(raw):
+    """Returns (row tuple in FIELDS order, None) or (None, error)"""
+    if isinstance(raw, Exception):
+        return None, f"Invalid JSON: {raw}"
+    if not isinstance(raw, dict):
+        return None, "Expected an object"
+    raw = {k.strip(): (v.strip() if isinstance(v, str) else v) for k, v in raw.items() if k}
+    for field in OPTIONAL_FIELDS:
+        if raw.get(field) == "":
+            raw[field] = None
+        raw.setdefault(field, None)
+    if raw.get("is_active") in (None, ""):
+        raw["is_active"] = True
+    try:
+        product = models.Product(**raw)
+    except ValidationError as e:
+        return None, "; ".join(f"{'.'.join(map(str, err['loc']))}: {err['msg']}" for err in e.errors())
+    return (product.product_id, product.product_name, product.category_id, round(product.price, 2),
+            product.unit, product.description, product.image_url, product.sku, product.is_active), None
+
+# ==================
+# IMPORT
+# ==================
+
+def _existing(cur, rows):
+    """Current products matching the batch by product_id or sku, as {product_id: row tuple}"""
+    ids = [row[0] for row in rows]
+    skus = [row[7] for row in rows if row[7] is not None]
+    cur.execute(f"""
+        SELECT product_id, product_name, category_id, price, unit, description, image_url, sku, is_active
+        FROM products
+        WHERE product_id IN ({", ".join("?" * len(ids))})
+        {f"OR sku IN ({', '.join('?' * len(skus))})" if skus else ""}
+    """, (*ids, *skus))
+    return {
+        r[0]: (r[0], r[1], r[2], round(float(r[3]), 2), r[4], r[5], r[6], r[7], bool(r[8]))
+        for r in cur.fetchall()
+    }
+
+def _upsert_rows_sql(n: int) -> str:
+    columns = ", ".join(f"? AS {field}" for field in FIELDS)
+    return " UNION ALL ".join([f"SELECT {columns}"] + ["SELECT " + ", ".join("?" * len(FIELDS))] * (n - 1))
+
+def _apply(cur, inserts, updates):
+    for i in range(0, len(inserts), WRITE_CHUNK):
+        chunk = inserts[i:i + WRITE_CHUNK]
+        cur.execute(
+            f"INSERT INTO products ({', '.join(FIELDS)}) VALUES "
+            + ", ".join(["(" + ", ".join("?" * len(FIELDS)) + ")"] * len(chunk)),
+            [v for row in chunk for v in row])
+        # initialize_inventory for every store at once: a zero-stock row per new SKU
+        cur.execute(f"""
+            INSERT INTO inventory_stock (location_id, product_id, quantity_available, quantity_reserved, reorder_level)
+            SELECT l.location_id, p.product_id, 0, 0, 10
+            FROM inventory_locations l
+            CROSS JOIN products p
+            WHERE p.product_id IN ({", ".join("?" * len(chunk))})
+              AND NOT EXISTS (
+                  SELECT 1 FROM inventory_stock s WHERE s.location_id = l.location_id AND s.product_id = p.product_id
+              )
+        """, [row[0] for row in chunk])
+    for i in range(0, len(updates), WRITE_CHUNK):
+        chunk = updates[i:i + WRITE_CHUNK]
+        cur.execute(f"""
+            UPDATE products
+            SET product_name = c.product_name, category_id = c.category_id, price = c.price, unit = c.unit,
+                description = c.description, image_url = c.image_url, sku = c.sku, is_active = c.is_active,
+                updated_at = GETDATE()
+            FROM ({_upsert_rows_sql(len(chunk))}) c
+            WHERE products.product_id = c.product_id
+        """, [v for row in chunk for v in row])
+
+def new_summary() -> dict:
+    return {"read": 0, "inserted": 0, "updated": 0, "unchanged": 0, "rejected": 0, "errors": []}
+
+def import_catalog(rows, conn, batch_size=BATCH_SIZE, dry_run=False, summary=None):
+    """
+    rows: iterable of (line_no, dict) from one of the READERS.
+    Each batch is diffed and written in its own transaction. Returns a summary dict;
+    pass one in (new_summary()) to still have the committed counts if a later batch raises.
+    """
+    summary = new_summary() if summary is None else summary
+
+    def reject(line_no, error):
+        summary["rejected"] += 1
+        if len(summary["errors"]) < MAX_ERRORS:
+            summary["errors"].append({"line": line_no, "detail": error})
+
+    cur = conn.cursor()
+    try:
+        cur.execute("SELECT category_id FROM product_categories")
+        categories = {row[0] for row in cur.fetchall()}
+
+        rows = iter(rows)
+        while True:
+            batch = list(islice(rows, batch_size))
+            if not batch:
+                break
+            summary["read"] += len(batch)
+
+            valid = {}   # product_id -> (line_no, row); a later line for the same product wins
+            for line_no, raw in batch:
+                row, error = validate(raw)
+                if error is None and row[2] not in categories:
+                    error = f"Unknown category_id {row[2]}"
+                if error:
+                    reject(line_no, error)
+                else:
+                    valid[row[0]] = (line_no, row)
+            if not valid:
+                continue
+
+            existing = _existing(cur, [row for _, row in valid.values()])
+            sku_owner = {row[7]: pid for pid, row in existing.items() if row[7] is not None}
+            inserts, updates = [], []
+            for pid, (line_no, row) in valid.items():
+                owner = sku_owner.get(row[7])
+                if owner is not None and owner != pid:
+                    reject(line_no, f"sku {row[7]} already belongs to {owner}")
+                    continue
+                if row[7] is not None:
+                    sku_owner[row[7]] = pid   # two new rows can't claim one sku either
+                if pid not in existing:
+                    inserts.append(row)
+                elif existing[pid] != row:
+                    updates.append(row)
+                else:
+                    summary["unchanged"] += 1
+
+            if not dry_run:
+                try:
+                    _apply(cur, inserts, updates)
+                    conn.commit()
+                except Exception:
+                    conn.rollback()
+                    raise
+            summary["inserted"] += len(inserts)
+            summary["updated"] += len(updates)
+    finally:
+        cur.close()
+    return summary
+
+def main():
+    parser = argparse.ArgumentParser(description="Import products from CSV or JSONL")
+    parser.add_argument("path", help="file to import, - for stdin")
+    parser.add_argument("--format", choices=sorted(READERS), help="default: from the file extension")
+    parser.add_argument("--batch", type=int, default=BATCH_SIZE)
+    parser.add_argument("--dry-run", action="store_true", help="report the diff without writing")
+    args = parser.parse_args()
+
+    fmt = args.format or ("jsonl" if args.path.endswith((".jsonl", ".ndjson")) else "csv")
+    import db
+
+    stream = io.TextIOWrapper(sys.stdin.buffer, encoding="utf-8-sig", newline="") if args.path == "-" \
+        else open(args.path, encoding="utf-8-sig", newline="")
+    with stream, db.pool.get_connection() as conn:
+        summary = import_catalog(READERS[fmt](stream), conn, args.batch, args.dry_run)
+    print(json.dumps(summary, indent=2))
+
+if __name__ == "__main__":
+    main()
@@ -1,44 +1,283 @@
-import pyodbc
+import os
+import threading
+import time
+from collections import deque
 from contextlib import contextmanager
-from config import settings
 import logging
 
+from dotenv import load_dotenv
+
+load_dotenv()   # before the imports below: metrics and profiler read their settings at import
+
+import metrics
+import profiler
+
+BACKEND = os.getenv("DB_BACKEND", "mssql")   # "sqlite": local stand-in built from schema.sql (sqlite_backend.py)
+
+if BACKEND == "sqlite":
+    import sqlite_backend as driver
+else:
+    import pyodbc as driver
+
+# The active driver's exceptions, for handlers that catch database errors
+Error = driver.Error
+IntegrityError = driver.IntegrityError
+
 logger = logging.getLogger(__name__)
 
-class Database:
-    def __init__(self):
-        self.connection_string = (
-            f"Driver={{{settings.db_driver}}};"
-            f"Server={settings.db_server};"
-            f"Database={settings.db_name};"
-            f"UID={settings.db_user};"
-            f"PWD={settings.db_password};"
-            f"Port={settings.db_port};"
-            f"Encrypt=yes;"
-            f"TrustServerCertificate=no;"
-            f"Connection Timeout=30;"
-        )
-    
+# ==================
+# CONFIG
+# ==================
+
+DATABASE_CONFIG = {
+    "driver": os.getenv("DB_DRIVER", "ODBC Driver 17 for SQL Server"),
+    "server": os.getenv("DB_SERVER"),
+    "database": os.getenv("DB_NAME"),
+    "uid": os.getenv("DB_USER"),
+    "pwd": os.getenv("DB_PASSWORD"),
+}
+
+POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "10"))
+POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "10"))          # seconds to wait for a free connection
+POOL_RECYCLE = float(os.getenv("DB_POOL_RECYCLE", "1800"))        # max connection age in seconds
+POOL_PING_AFTER = float(os.getenv("DB_POOL_PING_AFTER", "30"))    # validate if idle longer than this
+
+def connection_string() -> str:
+    return (
+        f"DRIVER={{{DATABASE_CONFIG['driver']}}};"
+        f"SERVER={DATABASE_CONFIG['server']};"
+        f"DATABASE={DATABASE_CONFIG['database']};"
+        f"UID={DATABASE_CONFIG['uid']};"
+        f"PWD={DATABASE_CONFIG['pwd']}"
+    )
+
+def connect():
+    """Open a new, unpooled connection (full TLS + login handshake)"""
+    if BACKEND == "sqlite":
+        return driver.connect()
+    return driver.connect(connection_string())
+
+# ==================
+# POOL
+# ==================
+
+class PoolTimeout(Exception):
+    """Raised when no connection could be checked out within the pool timeout"""
+
+class _PoolEntry:
+    __slots__ = ("raw", "created_at", "last_used")
+
+    def __init__(self, raw):
+        self.raw = raw
+        self.created_at = time.monotonic()
+        self.last_used = self.created_at
+
+class PooledConnection:
+    """
+    Thin proxy around a driver connection checked out from the pool.
+    Behaves like the raw connection, except close() hands it back to the
+    pool (rolling back anything left uncommitted) instead of disconnecting.
+    """
+
+    def __init__(self, pool, entry):
+        self._pool = pool
+        self._entry = entry
+
+    def __getattr__(self, name):
+        if name.startswith("_"):
+            raise AttributeError(name)
+        if self._entry is None:
+            raise driver.ProgrammingError("Connection already returned to the pool")
+        return getattr(self._entry.raw, name)
+
+    def cursor(self):
+        cur = self._entry.raw.cursor()
+        if metrics.ENABLED or profiler.SLOW_LOG or profiler.current.get() is not None:
+            return metrics.TimedCursor(cur)
+        return cur
+
+    def commit(self):
+        self._entry.raw.commit()
+
+    def rollback(self):
+        self._entry.raw.rollback()
+
+    def close(self):
+        if self._entry is not None:
+            entry, self._entry = self._entry, None
+            self._pool._release(entry)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def __del__(self):
+        # Safety net for handlers that bail out without closing
+        try:
+            self.close()
+        except Exception:
+            pass
+
+class ConnectionPool:
+    """
+    Bounded, thread-safe pool of driver connections.
+
+    - at most `size` connections exist at once; checkout blocks up to
+      `timeout` seconds and then raises PoolTimeout
+    - connections idle longer than `ping_after` are validated with SELECT 1
+      before being handed out; dead ones are replaced transparently
+    - connections older than `recycle` seconds are closed and reopened
+    """
+
+    def __init__(self, creator, size=POOL_SIZE, timeout=POOL_TIMEOUT,
+                 recycle=POOL_RECYCLE, ping_after=POOL_PING_AFTER):
+        self._creator = creator
+        self.size = max(1, size)
+        self.timeout = timeout
+        self.recycle = recycle
+        self.ping_after = ping_after
+
+        self._idle = deque()
+        self._lock = threading.Lock()
+        self._available = threading.Condition(self._lock)
+        self._open = 0          # connections that exist (idle + in use)
+        self._in_use = 0
+
+        # metrics
+        self._checkouts = 0
+        self._created = 0
+        self._recycled = 0
+        self._invalidated = 0
+        self._timeouts = 0
+        self._wait_total = 0.0
+        self._wait_max = 0.0
+
+    # ---- checkout / release ----
+
+    def connect(self) -> PooledConnection:
+        """Check out a connection. Call close() on it to return it."""
+        started = time.monotonic()
+        deadline = started + self.timeout
+        entry = None
+
+        with self._lock:
+            while True:
+                if self._idle:
+                    entry = self._idle.pop()   # LIFO keeps the hot connections warm
+                    break
+                if self._open < self.size:
+                    self._open += 1            # reserve a slot, open it outside the lock
+                    break
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self._timeouts += 1
+                    raise PoolTimeout(f"No database connection available within {self.timeout}s")
+                self._available.wait(remaining)
+            self._in_use += 1
+            self._checkouts += 1
+            waited = time.monotonic() - started
+            self._wait_total += waited
+            self._wait_max = max(self._wait_max, waited)
+
+        try:
+            entry = self._prepare(entry)
+        except Exception:
+            with self._lock:
+                self._open -= 1
+                self._in_use -= 1
+                self._available.notify()
+            raise
+        return PooledConnection(self, entry)
+
+    def _prepare(self, entry):
+        """Return a live entry: recycle stale ones, ping long-idle ones, open new ones"""
+        now = time.monotonic()
+        if entry is not None and now - entry.created_at > self.recycle:
+            self._close_raw(entry.raw)
+            entry = None
+            with self._lock:
+                self._recycled += 1
+        elif entry is not None and now - entry.last_used > self.ping_after:
+            if not self._ping(entry.raw):
+                self._close_raw(entry.raw)
+                entry = None
+                with self._lock:
+                    self._invalidated += 1
+
+        if entry is None:
+            entry = _PoolEntry(self._creator())
+            with self._lock:
+                self._created += 1
+        return entry
+
+    def _release(self, entry):
+        healthy = True
+        try:
+            entry.raw.rollback()   # never leak an open transaction to the next request
+        except Exception:
+            healthy = False
+
+        with self._lock:
+            self._in_use -= 1
+            if healthy:
+                entry.last_used = time.monotonic()
+                self._idle.append(entry)
+            else:
+                self._open -= 1
+                self._invalidated += 1
+            self._available.notify()
+
+        if not healthy:
+            self._close_raw(entry.raw)
+
+    @staticmethod
+    def _ping(raw) -> bool:
+        try:
+            cur = raw.cursor()
+            try:
+                cur.execute("SELECT 1")
+                cur.fetchone()
+            finally:
+                cur.close()
+            return True
+        except Exception:
+            return False
+
+    @staticmethod
+    def _close_raw(raw):
+        try:
+            raw.close()
+        except Exception:
+            pass
+
+    def dispose(self):
+        """Close every idle connection, e.g. after a failover"""
+        with self._lock:
+            entries = list(self._idle)
+            self._idle.clear()
+            self._open -= len(entries)
+        for entry in entries:
+            self._close_raw(entry.raw)
+
+    # ---- helpers ----
+
     @contextmanager
     def get_connection(self):
-        """Get database connection"""
-        conn = None
+        """Checked-out connection that commits on success and rolls back on error"""
+        conn = self.connect()
         try:
-            conn = pyodbc.connect(self.connection_string)
             yield conn
             conn.commit()
         except Exception as e:
-            if conn:
-                conn.rollback()
             logger.error(f"Database error: {str(e)}")
             raise
         finally:
-            if conn:
-                conn.close()
-    
+            conn.close()
+
     @contextmanager
     def get_cursor(self):
-        """Get database cursor"""
         with self.get_connection() as conn:
             cursor = conn.cursor()
             try:
@@ -46,17 +285,33 @@ class Database:
             finally:
                 cursor.close()
 
-# Global database instance
-db = Database()
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "size": self.size,
+                "open": self._open,
+                "in_use": self._in_use,
+                "idle": len(self._idle),
+                "checkouts": self._checkouts,
+                "created": self._created,
+                "recycled": self._recycled,
+                "invalidated": self._invalidated,
+                "timeouts": self._timeouts,
+                "wait_avg_ms": round(self._wait_total / self._checkouts * 1000, 3) if self._checkouts else 0.0,
+                "wait_max_ms": round(self._wait_max * 1000, 3),
+            }
+
+# Global pool shared by every request handler
+pool = ConnectionPool(connect)
 
 # Test connection
 def test_connection():
     try:
-        with db.get_cursor() as cursor:
+        with pool.get_cursor() as cursor:
             cursor.execute("SELECT COUNT(*) FROM cities")
             result = cursor.fetchone()
             logger.info(f"Database connection successful. Cities count: {result}")
             return True
     except Exception as e:
         logger.error(f"Database connection failed: {str(e)}")
-        return False
\ No newline at end of file
+        return False
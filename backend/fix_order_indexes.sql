@@ -0,0 +1,50 @@
+-- ============================================
+-- QUICKPICK - ORDER PAGINATION INDEXES
+-- ============================================
+
+-- Run this on an existing database to support keyset pagination and
+-- delta sync on GET /api/orders (?cursor= and ?since=).
+-- Safe to run more than once.
+
+IF NOT EXISTS (SELECT * FROM sys.indexes WHERE name = 'idx_orders_customer_created' AND object_id = OBJECT_ID('orders'))
+BEGIN
+    CREATE INDEX idx_orders_customer_created ON orders(customer_id, created_at DESC, order_id DESC);
+    PRINT 'Created index: idx_orders_customer_created';
+END
+
+IF NOT EXISTS (SELECT * FROM sys.indexes WHERE name = 'idx_orders_partner_created' AND object_id = OBJECT_ID('orders'))
+BEGIN
+    CREATE INDEX idx_orders_partner_created ON orders(delivery_partner_id, created_at DESC, order_id DESC);
+    PRINT 'Created index: idx_orders_partner_created';
+END
+
+IF NOT EXISTS (SELECT * FROM sys.indexes WHERE name = 'idx_orders_location_created' AND object_id = OBJECT_ID('orders'))
+BEGIN
+    CREATE INDEX idx_orders_location_created ON orders(location_id, created_at DESC, order_id DESC);
+    PRINT 'Created index: idx_orders_location_created';
+END
+
+IF NOT EXISTS (SELECT * FROM sys.indexes WHERE name = 'idx_orders_updated' AND object_id = OBJECT_ID('orders'))
+BEGIN
+    CREATE INDEX idx_orders_updated ON orders(updated_at, order_id);
+    PRINT 'Created index: idx_orders_updated';
+END
+
+-- Delta sync pages on row_version: stamped on every insert/update, and rows still
+-- behind an open transaction sort at or above MIN_ACTIVE_ROWVERSION()
+IF COL_LENGTH('orders', 'row_version') IS NULL
+BEGIN
+    ALTER TABLE orders ADD row_version ROWVERSION;
+    PRINT 'Added column: orders.row_version';
+END
+
+IF NOT EXISTS (SELECT * FROM sys.indexes WHERE name = 'idx_orders_row_version' AND object_id = OBJECT_ID('orders'))
+BEGIN
+    CREATE INDEX idx_orders_row_version ON orders(row_version);
+    PRINT 'Created index: idx_orders_row_version';
+END
+
+-- Rows written before updated_at was maintained
+UPDATE orders SET updated_at = created_at WHERE updated_at IS NULL;
+
+PRINT 'Order pagination indexes applied.';
@@ -0,0 +1,29 @@
+-- ============================================
+-- QUICKPICK - OPTIONAL PRODUCT SKUS
+-- ============================================
+
+-- Run this on an existing database before importing catalogs with rows that
+-- have no sku. products.sku was a UNIQUE column, and SQL Server lets a UNIQUE
+-- constraint hold only one NULL; this swaps it for a unique index filtered to
+-- rows that have a sku. Safe to run more than once.
+
+DECLARE @constraint SYSNAME;
+SELECT @constraint = kc.name
+FROM sys.key_constraints kc
+JOIN sys.index_columns ic ON ic.object_id = kc.parent_object_id AND ic.index_id = kc.unique_index_id
+JOIN sys.columns c ON c.object_id = ic.object_id AND c.column_id = ic.column_id
+WHERE kc.parent_object_id = OBJECT_ID('products') AND kc.type = 'UQ' AND c.name = 'sku';
+
+IF @constraint IS NOT NULL
+BEGIN
+    EXEC('ALTER TABLE products DROP CONSTRAINT ' + @constraint);
+    PRINT 'Dropped constraint: ' + @constraint;
+END
+
+IF NOT EXISTS (SELECT * FROM sys.indexes WHERE name = 'idx_products_sku' AND object_id = OBJECT_ID('products'))
+BEGIN
+    CREATE UNIQUE INDEX idx_products_sku ON products(sku) WHERE sku IS NOT NULL;
+    PRINT 'Created index: idx_products_sku';
+END
+
+PRINT 'Optional product skus applied.';
@@ -0,0 +1,21 @@
+-- ============================================
+-- QUICKPICK - SHARED TOKEN REVOCATIONS
+-- ============================================
+
+-- Run this on an existing database before turning on shared logout
+-- (TOKEN_REVOCATIONS_SHARED=1). Every worker checks a token
+-- against this table before trusting it, so a logout handled by one worker
+-- is honoured by all of them. Rows are deleted once the token has expired.
+-- Safe to run more than once.
+
+IF OBJECT_ID('revoked_tokens', 'U') IS NULL
+BEGIN
+    CREATE TABLE revoked_tokens (
+        token_hash CHAR(64) PRIMARY KEY,
+        expires_at DATETIME NOT NULL
+    );
+    CREATE INDEX idx_revoked_tokens_expires ON revoked_tokens(expires_at);
+    PRINT 'Created table: revoked_tokens';
+END
+
+PRINT 'Shared token revocations applied.';
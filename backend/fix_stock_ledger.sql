@@ -0,0 +1,21 @@
+-- ============================================
+-- QUICKPICK - STOCK LEDGER STATE
+-- ============================================
+
+-- Run this on an existing database before enabling the in-memory stock
+-- ledger (STOCK_LEDGER=1). The ledger records the last journal seq it has
+-- written to inventory_stock here, in the same transaction as the stock
+-- deltas, so crash recovery never applies a reservation twice.
+-- Safe to run more than once.
+
+IF OBJECT_ID('stock_ledger_state', 'U') IS NULL
+BEGIN
+    CREATE TABLE stock_ledger_state (
+        ledger_id NVARCHAR(50) PRIMARY KEY,
+        last_seq BIGINT NOT NULL DEFAULT 0,
+        updated_at DATETIME DEFAULT GETDATE()
+    );
+    PRINT 'Created table: stock_ledger_state';
+END
+
+PRINT 'Stock ledger state applied.';
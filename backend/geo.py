@@ -0,0 +1,67 @@
+import math
+
+import numpy as np
+
+# Spatial index over dark stores for nearest-store routing.
+# Stores are bucketed into a fixed lat/lon grid; a lookup only visits the
+# cells that can contain a store within the radius and computes the
+# haversine distances for those candidates in one vectorized pass.
+
+EARTH_RADIUS_KM = 6371.0088
+CELL_DEGREES = 0.05   # ~5.5 km of latitude per cell
+
+def haversine_km(lat, lon, lats, lons):
+    """Distance from one point (or an array of points) to arrays of points, in km"""
+    lat, lon, lats, lons = map(np.radians, (lat, lon, lats, lons))
+    a = np.sin((lats - lat) / 2) ** 2 + np.cos(lat) * np.cos(lats) * np.sin((lons - lon) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.minimum(a, 1.0)))
+
+class StoreIndex:
+    def __init__(self, stores, cell_degrees=CELL_DEGREES):
+        """stores: iterable of (location_id, latitude, longitude)"""
+        self.cell = cell_degrees
+        stores = [s for s in stores if s[1] is not None and s[2] is not None]
+        self.ids = np.array([s[0] for s in stores], dtype=object)
+        self.lats = np.array([s[1] for s in stores], dtype=float)
+        self.lons = np.array([s[2] for s in stores], dtype=float)
+
+        buckets = {}
+        for pos, (lat, lon) in enumerate(zip(self.lats, self.lons)):
+            buckets.setdefault(self._cell_of(lat, lon), []).append(pos)
+        # (row, col) -> positions into ids/lats/lons
+        self._cells = {key: np.array(positions) for key, positions in buckets.items()}
+
+    def __len__(self):
+        return len(self.ids)
+
+    def _cell_of(self, lat, lon):
+        return (math.floor(lat / self.cell), math.floor(lon / self.cell))
+
+    def _candidates(self, row, col, radius_km):
+        """Positions of every store in the cells that can hold a store within radius_km of any point in (row, col)"""
+        lat_span = math.ceil(radius_km / 111.0 / self.cell)
+        # a degree of longitude shrinks with latitude: size the span for the cell's poleward edge
+        edge = max(abs(row * self.cell), abs((row + 1) * self.cell))
+        lon_span = math.ceil(radius_km / (111.0 * max(math.cos(math.radians(edge)), 0.01)) / self.cell)
+        if (2 * lat_span + 1) * (2 * lon_span + 1) >= len(self._cells):
+            return np.arange(len(self.ids))   # radius covers most of the grid anyway
+        found = [self._cells[(r, c)]
+                 for r in range(row - lat_span, row + lat_span + 1)
+                 for c in range(col - lon_span, col + lon_span + 1)
+                 if (r, c) in self._cells]
+        return np.concatenate(found) if found else np.empty(0, dtype=int)
+
+    def nearest(self, lat, lon, radius_km, limit=None):
+        """[(location_id, distance_km)] within radius_km, closest first"""
+        if not len(self.ids):
+            return []
+        positions = self._candidates(*self._cell_of(lat, lon), radius_km)
+        if not len(positions):
+            return []
+        distances = haversine_km(lat, lon, self.lats[positions], self.lons[positions])
+        inside = distances <= radius_km
+        positions, distances = positions[inside], distances[inside]
+        order = np.argsort(distances, kind="stable")
+        if limit is not None:
+            order = order[:limit]
+        return [(self.ids[positions[i]], float(distances[i])) for i in order]
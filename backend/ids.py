@@ -0,0 +1,120 @@
+import os
+import tempfile
+import threading
+import time
+
+# Snowflake-style IDs for orders and users.
+# 64-bit integers: 41 bits of milliseconds since EPOCH_MS, 10 bits of worker
+# id (5 bits node, 5 bits process slot) and a 12-bit per-millisecond sequence.
+# IDs from one process are strictly increasing; IDs from different workers
+# can't collide as long as every node has its own ID_NODE_ID, which is
+# required (check_config() refuses to start without it). They are rendered zero-padded so string order (the
+# NVARCHAR primary keys) matches time order and inserts stay append-friendly.
+
+EPOCH_MS = 1704067200000   # 2024-01-01T00:00:00Z
+WORKER_BITS = 10
+NODE_BITS = 5
+SEQUENCE_BITS = 12
+MAX_SEQUENCE = (1 << SEQUENCE_BITS) - 1
+SLOTS_PER_NODE = 1 << (WORKER_BITS - NODE_BITS)
+ID_DIGITS = 19             # 2**63 - 1 has 19 digits
+
+LOCK_DIR = os.getenv("ID_LOCK_DIR", os.path.join(tempfile.gettempdir(), "quickpick-ids"))
+
+def node_id() -> int:
+    """ID_NODE_ID (0-31), distinct per node; never guessed, two nodes sharing one would collide"""
+    configured = os.getenv("ID_NODE_ID", "").strip()
+    if not configured:
+        raise RuntimeError("ID_NODE_ID is not set: give every node a distinct ID_NODE_ID (0-31), "
+                           "or every process a distinct ID_WORKER_ID (0-1023)")
+    node = int(configured)
+    if not 0 <= node < (1 << NODE_BITS):
+        raise RuntimeError(f"ID_NODE_ID must be 0-{(1 << NODE_BITS) - 1}, got {node}")
+    return node
+
+def check_config():
+    """Raise at startup, rather than on the first insert, if IDs can't be generated safely"""
+    if os.getenv("ID_WORKER_ID") is None:
+        node_id()
+
+class IdGenerator:
+    def __init__(self, worker_id=None):
+        self._configured_worker = worker_id
+        self._worker = None
+        self._slot_lock = None    # open file whose flock reserves our slot on this host
+        self._last_ms = 0
+        self._sequence = 0
+        self._lock = threading.Lock()
+
+    @property
+    def worker_id(self) -> int:
+        with self._lock:
+            if self._worker is None:
+                self._worker = self._claim_worker()
+            return self._worker
+
+    def _claim_worker(self) -> int:
+        configured = self._configured_worker if self._configured_worker is not None else os.getenv("ID_WORKER_ID")
+        if configured is not None:
+            return int(configured) % (1 << WORKER_BITS)
+        # Each process on a host holds an exclusive lock on one slot file for its lifetime
+        try:
+            import fcntl
+            os.makedirs(LOCK_DIR, exist_ok=True)
+            for slot in range(SLOTS_PER_NODE):
+                f = open(os.path.join(LOCK_DIR, f"slot-{slot}.lock"), "a")
+                try:
+                    fcntl.flock(f, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                except OSError:
+                    f.close()
+                    continue
+                self._slot_lock = f
+                return (node_id() << (WORKER_BITS - NODE_BITS)) | slot
+            raise RuntimeError(f"All {SLOTS_PER_NODE} ID worker slots on this host are taken; set ID_WORKER_ID")
+        except ImportError:
+            # No flock (Windows): best effort from the pid; set ID_WORKER_ID per process there
+            return (node_id() << (WORKER_BITS - NODE_BITS)) | (os.getpid() % SLOTS_PER_NODE)
+
+    def _after_fork(self):
+        """A forked child must not reuse the parent's worker slot or lock"""
+        self._lock = threading.Lock()
+        if self._configured_worker is None and os.getenv("ID_WORKER_ID") is None:
+            self._worker = None
+            self._slot_lock = None   # the parent still holds the flock
+
+    def next_id(self) -> int:
+        with self._lock:
+            if self._worker is None:
+                self._worker = self._claim_worker()
+            now = time.time_ns() // 1000000 - EPOCH_MS
+            if now > self._last_ms:
+                self._last_ms, self._sequence = now, 0
+            else:
+                # same millisecond, or the clock stepped back: keep counting from the last one
+                self._sequence += 1
+                if self._sequence > MAX_SEQUENCE:
+                    self._last_ms, self._sequence = self._last_ms + 1, 0
+            return (self._last_ms << (WORKER_BITS + SEQUENCE_BITS)) | (self._worker << SEQUENCE_BITS) | self._sequence
+
+def parse(value) -> dict:
+    """Split an ID (int or prefixed string) into its timestamp, worker and sequence"""
+    if isinstance(value, str):
+        value = int(value.rsplit("_", 1)[-1])
+    return {
+        "timestamp_ms": (value >> (WORKER_BITS + SEQUENCE_BITS)) + EPOCH_MS,
+        "worker_id": (value >> SEQUENCE_BITS) & ((1 << WORKER_BITS) - 1),
+        "sequence": value & MAX_SEQUENCE,
+    }
+
+generator = IdGenerator()
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=generator._after_fork)
+
+def new_id(prefix: str) -> str:
+    return f"{prefix}_{generator.next_id():0{ID_DIGITS}d}"
+
+def order_id() -> str:
+    return new_id("ORD")
+
+def user_id() -> str:
+    return new_id("USER")
@@ -0,0 +1,115 @@
+import csv
+import io
+
+import models
+import validation
+
+# Bulk stock adjustments (scanner batches, truck unloads).
+# Lines are validated and replayed in order against a snapshot of the
+# store's stock, so each line sees the effect of the lines before it exactly
+# as if they had been sent to /api/inventory/update one by one. What comes
+# out is one net change per product, which main.py writes set-based.
+
+ACTIONS = ("ADD", "REDUCE", "SET")
+MAX_LINES = 20000
+CSV_FIELDS = ("product_id", "action", "quantity")
+
+class BulkInputError(ValueError):
+    pass
+
+def parse_json(payload):
+    """A JSON array of operations, or {"operations": [...]}"""
+    if isinstance(payload, dict):
+        payload = payload.get("operations")
+    if not isinstance(payload, list):
+        raise BulkInputError("Expected a JSON array of operations")
+    return payload
+
+def parse_csv(text: str):
+    """CSV with a product_id,action,quantity header (extra columns are ignored)"""
+    reader = csv.DictReader(io.StringIO(text))
+    if reader.fieldnames is None:
+        raise BulkInputError("Empty CSV")
+    missing = [f for f in CSV_FIELDS if f not in [name.strip() for name in reader.fieldnames]]
+    if missing:
+        raise BulkInputError(f"CSV is missing columns: {', '.join(missing)}")
+    return [{k.strip(): (v.strip() if isinstance(v, str) else v) for k, v in row.items() if k} for row in reader]
+
+def validate(lines):
+    """
+    Returns (operations, errors): operations are (line_no, UpdateInventoryRequest)
+    and errors map line_no -> detail for lines that can't be applied at all.
+    """
+    if len(lines) > MAX_LINES:
+        raise BulkInputError(f"At most {MAX_LINES} lines per batch")
+    operations, errors = [], {}
+    # one validator call for the whole batch; per-line errors match UpdateInventoryRequest(**raw)
+    objects = [raw for raw in lines if isinstance(raw, dict)]
+    ops, failed = validation.validate_many(models.UpdateInventoryRequest, objects)
+    i = -1
+    for line_no, raw in enumerate(lines, start=1):
+        if not isinstance(raw, dict):
+            errors[line_no] = "Expected an object with product_id, action and quantity"
+            continue
+        i += 1
+        if i in failed:
+            errors[line_no] = "; ".join(f"{'.'.join(map(str, err['loc']))}: {err['msg']}" for err in failed[i])
+            continue
+        op = ops[i]
+        op.action = op.action.upper()
+        if op.action not in ACTIONS:
+            errors[line_no] = f"Unknown action {op.action}"
+        elif op.quantity < 0:
+            errors[line_no] = "Quantity must not be negative"
+        else:
+            operations.append((line_no, op))
+    return operations, errors
+
+def plan(operations, current, known_products):
+    """
+    Replay operations against current stock.
+
+    current: product_id -> quantity_available for rows that exist at this store
+    known_products: product ids that exist in the catalog
+
+    Returns (results, updates, inserts):
+      results  line_no -> (new_quantity, None) or (None, error)
+      updates  product_id -> ("delta", n) or ("set", n) for existing stock rows;
+               a product that saw a SET is written absolutely, otherwise as a
+               delta so concurrent checkouts are not overwritten
+      inserts  product_id -> quantity for stock rows to create
+    """
+    state = dict(current)
+    absolute = set()
+    results = {}
+    for line_no, op in operations:
+        pid = op.product_id
+        if pid not in known_products:
+            results[line_no] = (None, "Unknown product")
+            continue
+        qty = state.get(pid)
+        if op.action == 'SET':
+            new_qty = op.quantity
+            absolute.add(pid)
+        elif qty is None:
+            if op.action == 'REDUCE':
+                results[line_no] = (None, "Cannot reduce stock for new item")
+                continue
+            new_qty = op.quantity
+        else:
+            new_qty = qty + op.quantity if op.action == 'ADD' else qty - op.quantity
+            if new_qty < 0:
+                results[line_no] = (None, "Insufficient stock")
+                continue
+        state[pid] = new_qty
+        results[line_no] = (new_qty, None)
+
+    updates, inserts = {}, {}
+    for pid, qty in state.items():
+        if pid not in current:
+            inserts[pid] = qty
+        elif pid in absolute:
+            updates[pid] = ("set", qty)
+        elif qty != current[pid]:
+            updates[pid] = ("delta", qty - current[pid])
+    return results, updates, inserts
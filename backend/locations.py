@@ -0,0 +1,109 @@
+import os
+import threading
+import time
+
+import geo
+
+# In-memory registry of cities and dark stores (inventory_locations).
+# The table is tiny and changes only when signup() creates a store, so every
+# request resolves city -> store from here instead of running
+# SELECT TOP 1 location_id FROM inventory_locations WHERE city_id = ?.
+
+REFRESH_SECONDS = float(os.getenv("LOCATIONS_REFRESH_SECONDS", "300"))
+MISS_REFRESH_SECONDS = 5.0   # at most one refresh per this interval for unknown cities
+
+class LocationRegistry:
+    def __init__(self, refresh_seconds=REFRESH_SECONDS):
+        self.refresh_seconds = refresh_seconds
+        self._lock = threading.Lock()
+        self._loaded_at = None
+        self._miss_refresh_at = 0.0
+        self.cities = {}            # city_id -> row dict
+        self.stores = {}            # location_id -> row dict
+        self.stores_by_city = {}    # city_id -> [row dict] ordered by location_id
+        self.spatial = geo.StoreIndex([])   # active stores with coordinates
+
+    @property
+    def loaded(self) -> bool:
+        return self._loaded_at is not None
+
+    def is_stale(self) -> bool:
+        return self._loaded_at is None or time.monotonic() - self._loaded_at > self.refresh_seconds
+
+    def refresh(self, conn):
+        """Reload both tables; readers keep seeing the previous snapshot until the swap"""
+        cur = conn.cursor()
+        try:
+            cur.execute("SELECT city_id, city_name, state, is_active FROM cities")
+            cities = {
+                row[0]: {"city_id": row[0], "city_name": row[1], "state": row[2], "is_active": row[3] != 0}
+                for row in cur.fetchall()
+            }
+            cur.execute("""
+                SELECT location_id, city_id, location_name, address, latitude, longitude, is_active
+                FROM inventory_locations
+                ORDER BY location_id
+            """)
+            stores, by_city = {}, {}
+            for row in cur.fetchall():
+                store = {
+                    "location_id": row[0],
+                    "city_id": row[1],
+                    "location_name": row[2],
+                    "address": row[3],
+                    "latitude": row[4],
+                    "longitude": row[5],
+                    "is_active": row[6] != 0,
+                }
+                stores[store["location_id"]] = store
+                by_city.setdefault(store["city_id"], []).append(store)
+        finally:
+            cur.close()
+
+        spatial = geo.StoreIndex(
+            (s["location_id"], s["latitude"], s["longitude"]) for s in stores.values() if s["is_active"]
+        )
+
+        with self._lock:
+            self.cities, self.stores, self.stores_by_city = cities, stores, by_city
+            self.spatial = spatial
+            self._loaded_at = time.monotonic()
+
+    def should_refresh_on_miss(self) -> bool:
+        """A store created by another worker shows up as a miss; refresh for it, but rate-limited"""
+        with self._lock:
+            now = time.monotonic()
+            if now - self._miss_refresh_at < MISS_REFRESH_SECONDS:
+                return False
+            self._miss_refresh_at = now
+            return True
+
+    def primary_location(self, city_id):
+        """The store that serves a city: its first active store, else its first store"""
+        stores = self.stores_by_city.get(as_int(city_id))
+        if not stores:
+            return None
+        for store in stores:
+            if store["is_active"]:
+                return store["location_id"]
+        return stores[0]["location_id"]
+
+    def nearest_stores(self, latitude, longitude, radius_km):
+        """Active stores within radius_km of a point as [(location_id, distance_km)], closest first"""
+        return self.spatial.nearest(latitude, longitude, radius_km)
+
+    def city_of(self, location_id):
+        store = self.stores.get(as_int(location_id))
+        return store["city_id"] if store else None
+
+    def all_stores(self):
+        return list(self.stores.values())
+
+def as_int(value):
+    """int(value) when it parses (ids arrive as query-string text), else value unchanged"""
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return value
+
+registry = LocationRegistry()
@@ -1,16 +1,36 @@
+import base64
+import io
 import hashlib
 from datetime import datetime, timedelta
 import os
 import json
+import time
+from contextlib import nullcontext
 
-from flask import Flask, request, jsonify, abort
+from flask import Flask, Response, request, jsonify, abort, g
 from flask_cors import CORS
 from pydantic import ValidationError
-import pyodbc
 import jwt
 from dotenv import load_dotenv
 
 import models  # Assuming models.py is in the same directory
+import db
+import auth
+from catalog_cache import catalog_cache
+from order_events import order_events, match_scope, sse_stream
+import realtime_service
+import locations
+import assignment
+from tracking import tracker
+import inventory_bulk
+import catalog_import
+import stock_ledger
+import ids
+import search
+import streaming
+import validation
+import metrics
+import profiler
 
 load_dotenv()
 
@@ -18,24 +38,12 @@ load_dotenv()
 # CONFIG & DATABASE
 # ==================
 
-DATABASE_CONFIG = {
-    "server": os.getenv("DB_SERVER"),
-    "database": os.getenv("DB_NAME"),
-    "uid": os.getenv("DB_USER"),
-    "pwd": os.getenv("DB_PASSWORD"),
-}
-
-JWT_SECRET = os.getenv("JWT_SECRET", "dev-secret")
+JWT_SECRET = auth.SECRET_KEY  # JWT_SECRET env var, shared with auth.verify_token
+ids.check_config()   # no ID_NODE_ID: refuse to start rather than mint colliding order/user ids
 
 def get_db_connection():
-    conn_str = (
-        "DRIVER={ODBC Driver 17 for SQL Server};"
-        f"SERVER={DATABASE_CONFIG['server']};"
-        f"DATABASE={DATABASE_CONFIG['database']};"
-        f"UID={DATABASE_CONFIG['uid']};"
-        f"PWD={DATABASE_CONFIG['pwd']}"
-    )
-    return pyodbc.connect(conn_str)
+    # Checked out from the shared pool; conn.close() returns it instead of disconnecting
+    return db.pool.connect()
 
 # ==================
 # APP SETUP
@@ -44,44 +52,117 @@ def get_db_connection():
 app = Flask(__name__)
 CORS(app, resources={r"/api/*": {"origins": "*"}}) # Allow all origins for now, restrict in prod
 
+@app.errorhandler(db.PoolTimeout)
+def pool_exhausted(e):
+    return jsonify({"detail": "Server busy, please retry"}), 503
+
+@app.errorhandler(auth.RevocationCheckFailed)
+def revocation_check_failed(e):
+    return jsonify({"detail": "Could not verify token, please retry"}), 503
+
+@app.before_request
+def start_request_instrumentation():
+    # label by route template so /api/orders/<id> is one series, not one per order
+    route = request.url_rule.rule if request.url_rule is not None else metrics.UNMATCHED
+    g.instrumented = (route, time.perf_counter(), metrics.current_route.set(route), metrics.ENABLED)
+    if metrics.ENABLED:
+        metrics.registry.request_started(route, request.method)
+    asked = profiler.requested(request.headers)
+    if asked or profiler.sampled():
+        g.profile = profiler.Profile(route, request.method, asked)
+        g.profile_token = profiler.current.set(g.profile)
+
+@app.after_request
+def record_response_status(response):
+    g.status = response.status_code
+    profile = g.get("profile")
+    if profile is not None and profile.requested:
+        count, db_ms = profile.summary()
+        response.headers["Server-Timing"] = f'db;dur={db_ms:.1f};desc="{count} queries"'
+        response.headers["X-Query-Count"] = str(count)
+        response.headers["X-Query-N-Plus-One"] = str(len(profile.n_plus_one()))
+    return response
+
+@app.teardown_request
+def finish_request_instrumentation(exc):
+    started = g.pop("instrumented", None)
+    if started is None:
+        return
+    route, t0, route_token, counted = started
+    metrics.current_route.reset(route_token)
+    seconds = time.perf_counter() - t0
+    status = g.get("status", 500)   # no status means the handler raised and Flask answered 500
+    if counted:
+        metrics.registry.request_finished(route, request.method, status, seconds)
+    profile = g.pop("profile", None)
+    if profile is not None:
+        profiler.current.reset(g.pop("profile_token"))
+        profile.write(status, seconds)
+
 # ==================
 # UTILS
 # ==================
 
+def location_registry(conn):
+    """The in-memory location registry, reloaded over conn when stale"""
+    registry = locations.registry
+    if registry.is_stale():
+        registry.refresh(conn)
+    return registry
+
+def resolve_location(city_id, conn):
+    """Dark store serving a city, from the in-memory registry (reloaded over conn when stale or on a miss)"""
+    registry = location_registry(conn)
+    location_id = registry.primary_location(city_id)
+    if location_id is None and registry.should_refresh_on_miss():
+        registry.refresh(conn)
+        location_id = registry.primary_location(city_id)
+    return location_id
+
 @app.route("/api/locations", methods=['GET'])
 def get_locations():
-    conn = get_db_connection()
-    cur = conn.cursor()
-    try:
-        cur.execute("SELECT location_id, city_id, address FROM inventory_locations")
-        locations = []
-        for row in cur.fetchall():
-            locations.append({
-                "location_id": row[0],
-                "city_id": row[1],
-                "address": row[2]
-            })
-        return jsonify(locations)
-    finally:
-        cur.close()
-        conn.close()
+    if locations.registry.is_stale():
+        conn = get_db_connection()
+        try:
+            locations.registry.refresh(conn)
+        finally:
+            conn.close()
+    return jsonify([
+        {"location_id": store["location_id"], "city_id": store["city_id"], "address": store["address"]}
+        for store in locations.registry.all_stores()
+    ])
 
 def hash_password(password: str) -> str:
     return hashlib.sha256(password.encode()).hexdigest()
 
-def get_current_user():
-    auth_header = request.headers.get('Authorization')
-    # print(f"DEBUG: Auth Header: {auth_header}")
+def authenticate(auth_header):
+    """(claims, None) for a valid 'Bearer <token>' header value, else (None, reason)"""
     if not auth_header:
-        abort(401, description="Missing token")
+        return None, "Missing token"
     try:
         token = auth_header.split(" ")[1]
-        decoded = jwt.decode(token, JWT_SECRET, algorithms=["HS256"])
-        # print(f"DEBUG: Decoded Token User: {decoded.get('user_id')}")
-        return decoded
-    except Exception as e:
-        print(f"DEBUG: Token Decode Error: {e}")
-        abort(401, description="Invalid token")
+    except IndexError:
+        return None, "Invalid token"
+    decoded = auth.verify_token(token)   # cached: a full HS256 decode only on first sight
+    if decoded is None:
+        return None, "Invalid token"
+    return decoded, None
+
+def authenticate_stream(ticket, auth_header):
+    """authenticate() for the order stream: a ?ticket= from /api/orders/stream/ticket, else the header"""
+    if ticket:
+        claims = auth.redeem_stream_ticket(ticket)
+        return (claims, None) if claims else (None, "Invalid or expired ticket")
+    return authenticate(auth_header)
+
+def get_current_user():
+    auth_header = request.headers.get('Authorization')
+    # print(f"DEBUG: Auth Header: {auth_header}")
+    decoded, error = authenticate(auth_header)
+    if error:
+        abort(401, description=error)
+    # print(f"DEBUG: Decoded Token User: {decoded.get('user_id')}")
+    return decoded
 
 # ==================
 # AUTH
@@ -91,42 +172,47 @@ def get_current_user():
 def read_root():
     return jsonify({"message": "Welcome to QuickPick API (Flask)"})
 
+LOGIN_QUERY = """
+    SELECT 
+        u.user_id,
+        u.phone,
+        u.email,
+        u.password_hash,
+        u.role,
+        u.is_active,
+        u.city_id,
+        up.first_name,
+        up.last_name
+    FROM users u
+    LEFT JOIN user_profiles up ON u.user_id = up.user_id
+    WHERE u.{column} = ?
+"""
+LOGIN_QUERIES = {column: LOGIN_QUERY.format(column=column) for column in ("phone", "email")}
+
 @app.route("/api/login", methods=['POST'])
 def login():
     try:
-        req_data = models.LoginRequest(**request.get_json())
+        req_data = validation.parse_body(models.LoginRequest, request)
     except ValidationError as e:
         return jsonify(e.errors()), 400
 
+    # Pick a single-column lookup so the optimizer seeks idx_users_phone / idx_users_email
+    # (an OR across both columns turns into a scan once users is large). Phone wins if both are sent.
+    if req_data.phone:
+        lookup_column, identifier = "phone", req_data.phone
+    elif req_data.email:
+        lookup_column, identifier = "email", req_data.email
+    else:
+        return jsonify({"detail": "Phone or email is required"}), 400
+
     conn = get_db_connection()
     cur = conn.cursor()
 
     try:
-        # Check both email and phone for login flexibility if needed, but prompt said phone for customer
-        # and schema has phone unique. The original code used phone.
-        phone_val = req_data.phone if req_data.phone else ""
-        if not phone_val and req_data.email:
-             # Logic to handle email login if needed, but keeping simple for now
-             pass
-
         password_hash = hash_password(req_data.password)
 
-        # Login query needs to handle finding user by phone OR email
-        cur.execute("""
-            SELECT 
-                u.user_id,
-                u.phone,
-                u.email,
-                u.password_hash,
-                u.role,
-                u.is_active,
-                u.city_id,
-                up.first_name,
-                up.last_name
-            FROM users u
-            LEFT JOIN user_profiles up ON u.user_id = up.user_id
-            WHERE u.phone = ? OR u.email = ?
-        """, (req_data.phone, req_data.email))
+        # User + profile in the same round trip
+        cur.execute(LOGIN_QUERIES[lookup_column], (identifier,))
 
         row = cur.fetchone()
 
@@ -168,6 +254,15 @@ def login():
         cur.close()
         conn.close()
 
+@app.route("/api/logout", methods=['POST'])
+def logout():
+    get_current_user()
+    try:
+        auth.revoke_token(request.headers.get('Authorization').split(" ")[1])
+    except db.Error as e:
+        return jsonify({"detail": str(e)}), 500
+    return jsonify({"message": "Logged out"})
+
 @app.route("/api/signup", methods=['POST'])
 def signup():
     try:
@@ -188,10 +283,11 @@ def signup():
     cur = conn.cursor()
 
     try:
-        user_id = f"USER_{int(datetime.utcnow().timestamp())}_{hashlib.md5(req_data.phone.encode()).hexdigest()[:4]}"
+        user_id = ids.user_id()
         password_hash = hash_password(req_data.password)
         
         assigned_city_id = req_data.city_id
+        store_created = False
         
         # LOGIC: Create New Location if requested
         if req_data.role == 'INVENTORY_STAFF' and create_store and store_city and store_address:
@@ -219,7 +315,7 @@ def signup():
                      try:
                         cur.execute("INSERT INTO cities (city_id, city_name) VALUES (?, ?)", (assigned_city_id, store_city))
                         city_created_or_found = True
-                     except pyodbc.Error:
+                     except db.Error:
                         # Method B: Maybe Identity Column? Try without ID.
                         try:
                             cur.execute("INSERT INTO cities (city_name) VALUES (?)", (store_city,))
@@ -249,12 +345,13 @@ def signup():
             try:
                 cur.execute("INSERT INTO inventory_locations (city_id, address, location_name) VALUES (?, ?, ?)",
                             (assigned_city_id, f"{store_address}, {store_city}", loc_name))
-            except pyodbc.Error as e:
+            except db.Error as e:
                 # If this fails, it might be that assigned_city_id is still invalid (FK mismatch)
                 # Ensure the city actually exists if the previous INSERT failed silently
                 # Force insert city with IDENTITY if the table supports it?
                 # Let's return the specific error
                  raise Exception(f"Location Insert Failed: {str(e)} (City ID: {assigned_city_id})")
+            store_created = True
             
             # Override the user's city_id to match this new store
             req_data.city_id = assigned_city_id
@@ -281,8 +378,15 @@ def signup():
              cur.execute("INSERT INTO delivery_partners (user_id, status) VALUES (?, 'INACTIVE')", (user_id,))
 
         conn.commit()
+        if store_created:
+            # The account exists now; a failed refresh only delays the new store until the
+            # registry reloads (on its next miss or when stale), so don't fail the signup over it
+            try:
+                locations.registry.refresh(conn)
+            except Exception as e:
+                print(f"⚠ Location registry refresh after signup failed: {e}")
         return jsonify({"message": "User created successfully", "user_id": user_id, "city_id": assigned_city_id}), 201
-    except pyodbc.IntegrityError as e:
+    except db.IntegrityError as e:
         # Check if it's users table or something else
         err_msg = str(e)
         if "users" in err_msg and "PRIMARY KEY" in err_msg:
@@ -306,16 +410,136 @@ def signup():
 # PRODUCTS
 # ==================
 
+def stock_changed(location_id=None, levels=None):
+    """
+    Staff changed stock outside checkout: drop every in-memory copy for the location (None = all).
+    levels ({product_id: new quantity_available}), when known, update the search/browse snapshot
+    and its facet counts in place instead of reloading it.
+    """
+    if location_id is None:
+        catalog_cache.clear()
+    else:
+        catalog_cache.invalidate(location_id)
+    stock_ledger.ledger.invalidate(location_id)
+    if levels is not None and location_id is not None:
+        search.index.set_stock(location_id, levels)
+    else:
+        search.index.invalidate_stock(location_id)
+
+def ledger_flushed(levels):
+    """The stock ledger wrote reservations back to inventory_stock: refresh the stores' cached stock"""
+    for location_id, products in levels.items():
+        catalog_cache.invalidate(location_id)
+        if products:
+            search.index.set_stock(location_id, products)
+        else:
+            search.index.invalidate_stock(location_id)
+
+stock_ledger.ledger.on_flushed = ledger_flushed
+
+def staff_stock_write(conn):
+    """
+    Around a staff read-modify-write of inventory_stock: with the ledger on, its
+    reservations not yet written back are committed over conn first and new ones
+    wait until the block ends, so what the handler reads is the real stock.
+    """
+    return stock_ledger.ledger.hold(conn) if stock_ledger.ENABLED else nullcontext()
+
+def catalog_index(location_id=None):
+    """The in-memory search/browse index, refreshed (and the store's stock loaded) when stale"""
+    index = search.index
+    if index.needs_refresh() or (location_id is not None and index.needs_stock(location_id)):
+        conn = get_db_connection()
+        try:
+            if index.needs_refresh():
+                index.refresh(conn)
+            if location_id is not None and index.needs_stock(location_id):
+                index.load_stock(location_id, conn)
+        finally:
+            conn.close()
+    return index
+
+def catalog_product(product, quantity=None) -> dict:
+    result = {k: product[k] for k in ("product_id", "product_name", "category_id", "category_name",
+                                      "price", "unit", "description", "image_url")}
+    if quantity is not None:
+        result["quantity_available"] = quantity
+        result["is_out_of_stock"] = quantity <= 0
+    return result
+
+BROWSE_PAGE_DEFAULT = 20
+BROWSE_PAGE_MAX = 100
+
+def encode_browse_cursor(key) -> str:
+    """Opaque keyset position: the last row's sort key as url-safe base64 JSON"""
+    return base64.urlsafe_b64encode(json.dumps(list(key)).encode()).decode()
+
+def decode_browse_cursor(token: str):
+    key = json.loads(base64.urlsafe_b64decode(token.encode()))
+    if not isinstance(key, list) or len(key) != 2:
+        raise ValueError
+    return key
+
+def browse_products():
+    """
+    ?category_id=&sort=name|price_asc|price_desc&limit=&cursor=&in_stock=1&location_id=
+    -> {products, next_cursor, facets}; facets count every category (total, and in stock at
+    location_id) so filters can show their sizes without another request.
+    """
+    sort = request.args.get('sort', 'name')
+    if sort not in search.BROWSE_SORTS:
+        return jsonify({"detail": f"sort must be one of {', '.join(search.BROWSE_SORTS)}"}), 400
+    try:
+        limit = min(int(request.args.get('limit', BROWSE_PAGE_DEFAULT)), BROWSE_PAGE_MAX)
+        category_id = request.args.get('category_id')
+        category_id = int(category_id) if category_id else None
+        location_id = request.args.get('location_id')
+        location_id = int(location_id) if location_id else None
+        if limit < 1:
+            raise ValueError
+    except ValueError:
+        return jsonify({"detail": "limit, category_id and location_id must be positive integers"}), 400
+    in_stock = request.args.get('in_stock', '').lower() in ('1', 'true')
+    if in_stock and location_id is None:
+        return jsonify({"detail": "in_stock needs a location_id"}), 400
+
+    index = catalog_index(location_id)
+    try:
+        cursor = request.args.get('cursor')
+        after = decode_browse_cursor(cursor) if cursor else None
+        rows, last_key = index.browse(category_id, sort, after, limit, location_id, in_stock)
+    except (ValueError, TypeError):
+        return jsonify({"detail": "Invalid cursor"}), 400
+
+    return jsonify({
+        "products": [catalog_product(product, quantity) for product, quantity in rows],
+        "next_cursor": encode_browse_cursor(last_key) if last_key else None,
+        "facets": index.facets(location_id),
+    })
+
 @app.route("/api/products", methods=['GET'])
 def get_products():
+    """
+    Without paging params: every active product sorted by name (a JSON array).
+    With any of category_id, sort, limit, cursor or in_stock: one page, see browse_products.
+    """
+    if any(k in request.args for k in ('category_id', 'sort', 'limit', 'cursor', 'in_stock')):
+        return browse_products()
+
+    # For simplicity, we aggregate stock across all locations or filter by ?location_id=
+    location_id = request.args.get('location_id')
+
+    # Steady state: served from the prebuilt JSON without touching the DB
+    cached = catalog_cache.get(location_id)
+    if cached is not None:
+        return app.response_class(cached, mimetype="application/json")
+
     conn = get_db_connection()
     cur = conn.cursor()
+    streamed = False
 
     try:
         # Fetch products with stock info. 
-        # For simplicity, we aggregate stock across all locations or filter by ?location_id=
-        location_id = request.args.get('location_id')
-        
         query = """
             SELECT
                 p.product_id,
@@ -343,9 +567,8 @@ def get_products():
 
         cur.execute(query, tuple(params))
 
-        products = []
-        for row in cur.fetchall():
-            products.append({
+        def product_json(row):
+            return {
                 "product_id": row[0],
                 "product_name": row[1],
                 "category_id": row[2],
@@ -355,13 +578,86 @@ def get_products():
                 "image_url": row[6],
                 "quantity_available": row[7],
                 "is_out_of_stock": row[7] <= 0
-            })
+            }
+
+        if streaming.ENABLED:
+            # Rows go out as they are read; the finished body is what the cache keeps
+            streamed = True
+            body = streaming.RowStream(conn, cur, product_json, app.json.default,
+                                       on_complete=lambda payload: catalog_cache.put(location_id, payload))
+            return app.response_class(body, mimetype="application/json")
 
-        return jsonify(products)
+        products = [product_json(row) for row in cur.fetchall()]
+        payload = app.json.dumps(products).encode()
+        catalog_cache.put(location_id, payload)
+        return app.response_class(payload, mimetype="application/json")
 
     finally:
-        cur.close()
+        if not streamed:
+            cur.close()
+            conn.close()
+
+SEARCH_LIMIT_DEFAULT = 10
+SEARCH_LIMIT_MAX = 50
+
+@app.route("/api/products/search", methods=['GET'])
+def search_products():
+    """
+    Typeahead over product name, description and category.
+    ?q=  words match exactly, by prefix (the last word) or with one typo
+    ?location_id=&in_stock=1  stock at that store, optionally only what's on the shelf
+    """
+    q = request.args.get('q', '')
+    try:
+        limit = min(int(request.args.get('limit', SEARCH_LIMIT_DEFAULT)), SEARCH_LIMIT_MAX)
+        location_id = request.args.get('location_id')
+        location_id = int(location_id) if location_id else None
+        if limit < 1:
+            raise ValueError
+    except ValueError:
+        return jsonify({"detail": "limit and location_id must be positive integers"}), 400
+    in_stock = request.args.get('in_stock', '').lower() in ('1', 'true')
+
+    results = []
+    for score, product, quantity in catalog_index(location_id).search(q, limit, location_id, in_stock):
+        result = catalog_product(product, quantity)
+        result["score"] = round(score, 3)
+        results.append(result)
+    return jsonify(results)
+
+CATALOG_IMPORT_FORMATS = {
+    "text/csv": "csv",
+    "application/csv": "csv",
+    "application/x-ndjson": "jsonl",
+    "application/jsonl": "jsonl",
+}
+
+@app.route("/api/catalog/import", methods=['POST'])
+def import_products():
+    # Streamed straight from the request body; only one batch is held in memory
+    user = get_current_user()
+    if user['role'] not in ('ADMIN', 'INVENTORY_STAFF'):
+        return jsonify({"detail": "Unauthorized"}), 403
+
+    fmt = CATALOG_IMPORT_FORMATS.get(request.mimetype)
+    if fmt is None:
+        return jsonify({"detail": "Send text/csv or application/x-ndjson"}), 415
+    dry_run = request.args.get('dry_run', '').lower() in ('1', 'true')
+
+    stream = io.TextIOWrapper(request.stream, encoding="utf-8-sig", newline="")
+    conn = get_db_connection()
+    summary = catalog_import.new_summary()
+    try:
+        catalog_import.import_catalog(catalog_import.READERS[fmt](stream), conn, dry_run=dry_run, summary=summary)
+    except Exception as e:
+        # batches before the failing one stay committed; inserted/updated count only those
+        return jsonify({"detail": str(e), **summary}), 500
+    finally:
         conn.close()
+        if not dry_run and (summary["inserted"] or summary["updated"]):
+            stock_changed()
+            search.index.mark_dirty()
+    return jsonify(summary)
 
 @app.route("/api/inventory/update", methods=['PUT'])
 def update_inventory():
@@ -370,7 +666,7 @@ def update_inventory():
         return jsonify({"detail": "Unauthorized"}), 403
     
     try:
-        req_data = models.UpdateInventoryRequest(**request.get_json())
+        req_data = validation.parse_body(models.UpdateInventoryRequest, request)
     except ValidationError as e:
         return jsonify(e.errors()), 400
         
@@ -387,41 +683,41 @@ def update_inventory():
         # But `InventoryDashboard` says `user?.city_id ? 'Active Store' : ...`
         # Let's find the location ID based on city_id.
         
-        cur.execute("SELECT TOP 1 location_id FROM inventory_locations WHERE city_id = ?", (user['city_id'],))
-        loc_row = cur.fetchone()
-        if not loc_row:
+        location_id = resolve_location(user['city_id'], conn)
+        if location_id is None:
              return jsonify({"detail": "No location found for this user"}), 404
-        location_id = loc_row[0]
         
-        # Check if record exists
-        cur.execute("SELECT quantity_available FROM inventory_stock WHERE product_id = ? AND location_id = ?", 
-                    (req_data.product_id, location_id))
-        row = cur.fetchone()
+        with staff_stock_write(conn):
+            # Check if record exists
+            cur.execute("SELECT quantity_available FROM inventory_stock WHERE product_id = ? AND location_id = ?", 
+                        (req_data.product_id, location_id))
+            row = cur.fetchone()
         
-        if not row:
-            # Create record if not exists
-            if req_data.action == 'REDUCE':
-                 return jsonify({"detail": "Cannot reduce stock for new item"}), 400
+            if not row:
+                # Create record if not exists
+                if req_data.action == 'REDUCE':
+                     return jsonify({"detail": "Cannot reduce stock for new item"}), 400
             
-            new_qty = req_data.quantity
-            cur.execute("""
-                INSERT INTO inventory_stock (location_id, product_id, quantity_available, quantity_reserved, reorder_level)
-                VALUES (?, ?, ?, 0, 10)
-            """, (location_id, req_data.product_id, new_qty))
-        else:
-            current_qty = row[0]
-            new_qty = current_qty + req_data.quantity if req_data.action == 'ADD' else current_qty - req_data.quantity
+                new_qty = req_data.quantity
+                cur.execute("""
+                    INSERT INTO inventory_stock (location_id, product_id, quantity_available, quantity_reserved, reorder_level)
+                    VALUES (?, ?, ?, 0, 10)
+                """, (location_id, req_data.product_id, new_qty))
+            else:
+                current_qty = row[0]
+                new_qty = current_qty + req_data.quantity if req_data.action == 'ADD' else current_qty - req_data.quantity
             
-            if new_qty < 0:
-                return jsonify({"detail": "Insufficient stock"}), 400
-
-            cur.execute("""
-                UPDATE inventory_stock
-                SET quantity_available = ?
-                WHERE product_id = ? AND location_id = ?
-            """, (new_qty, req_data.product_id, location_id))
+                if new_qty < 0:
+                    return jsonify({"detail": "Insufficient stock"}), 400
+
+                cur.execute("""
+                    UPDATE inventory_stock
+                    SET quantity_available = ?
+                    WHERE product_id = ? AND location_id = ?
+                """, (new_qty, req_data.product_id, location_id))
             
-        conn.commit()
+            conn.commit()
+            stock_changed(location_id, {req_data.product_id: new_qty})
         return jsonify({"message": "Stock updated", "new_quantity": new_qty})
         
     except Exception as e:
@@ -431,6 +727,116 @@ def update_inventory():
         cur.close()
         conn.close()
 
+# Chunk sizes for bulk statements under SQL Server's 2100-parameter limit
+BULK_LOOKUP_CHUNK = 2000
+BULK_WRITE_CHUNK = 500    # (product_id, quantity) pairs; also SQLite's compound-SELECT limit
+BULK_INSERT_CHUNK = 500   # 4 parameters per inserted row
+
+@app.route("/api/inventory/bulk-update", methods=['POST'])
+def bulk_update_inventory():
+    # Many ADD/REDUCE/SET lines (JSON array or CSV) applied in one transaction
+    user = get_current_user()
+    if user['role'] != 'INVENTORY_STAFF':
+        return jsonify({"detail": "Unauthorized"}), 403
+
+    atomic = request.args.get('atomic', '').lower() in ('1', 'true')
+    try:
+        if request.mimetype in ('text/csv', 'application/csv'):
+            lines = inventory_bulk.parse_csv(request.get_data(as_text=True))
+        else:
+            lines = inventory_bulk.parse_json(validation.json_or_none(request))
+        operations, errors = inventory_bulk.validate(lines)
+    except inventory_bulk.BulkInputError as e:
+        return jsonify({"detail": str(e)}), 400
+
+    conn = get_db_connection()
+    cur = conn.cursor()
+    try:
+        location_id = resolve_location(user['city_id'], conn)
+        if location_id is None:
+            return jsonify({"detail": "No location found for this user"}), 404
+
+        with staff_stock_write(conn):
+            # Snapshot the touched products: catalog membership and current stock in one pass
+            product_ids = list({op.product_id for _, op in operations})
+            known, current = set(), {}
+            for i in range(0, len(product_ids), BULK_LOOKUP_CHUNK):
+                chunk = product_ids[i:i + BULK_LOOKUP_CHUNK]
+                cur.execute(f"""
+                    SELECT p.product_id, s.quantity_available
+                    FROM products p
+                    LEFT JOIN inventory_stock s ON s.product_id = p.product_id AND s.location_id = ?
+                    WHERE p.product_id IN ({", ".join("?" * len(chunk))})
+                """, (location_id, *chunk))
+                for row in cur.fetchall():
+                    known.add(row[0])
+                    if row[1] is not None:
+                        current[row[0]] = row[1]
+
+            results, updates, inserts = inventory_bulk.plan(operations, current, known)
+            failed = len(errors) + sum(1 for _, error in results.values() if error)
+            response = {
+                "location_id": location_id,
+                "applied": len(results) - sum(1 for _, error in results.values() if error),
+                "failed": failed,
+                "results": [
+                    {"line": line_no, "status": "error", "detail": errors[line_no]} if line_no in errors
+                    else {"line": line_no, "status": "error", "detail": results[line_no][1]} if results[line_no][1]
+                    else {"line": line_no, "status": "ok", "new_quantity": results[line_no][0]}
+                    for line_no in range(1, len(lines) + 1)
+                ],
+            }
+            if atomic and failed:
+                response["applied"] = 0
+                return jsonify(response), 400
+
+            deltas = [(pid, n) for pid, (kind, n) in updates.items() if kind == "delta"]
+            sets = [(pid, n) for pid, (kind, n) in updates.items() if kind == "set"]
+            for i in range(0, len(deltas), BULK_WRITE_CHUNK):
+                chunk = deltas[i:i + BULK_WRITE_CHUNK]
+                cur.execute(f"""
+                    UPDATE inventory_stock
+                    SET quantity_available = inventory_stock.quantity_available + c.quantity,
+                        last_updated = GETDATE(), updated_by = ?
+                    FROM ({cart_rows_sql(len(chunk))}) c
+                    WHERE inventory_stock.product_id = c.product_id
+                      AND inventory_stock.location_id = ?
+                      AND inventory_stock.quantity_available + c.quantity >= 0
+                """, (user['user_id'], *[v for row in chunk for v in row], location_id))
+                if cur.rowcount != len(chunk):
+                    # stock moved under us (a checkout) far enough to fail a REDUCE
+                    conn.rollback()
+                    return jsonify({"detail": "Stock changed while applying the batch, please retry"}), 409
+            for i in range(0, len(sets), BULK_WRITE_CHUNK):
+                chunk = sets[i:i + BULK_WRITE_CHUNK]
+                cur.execute(f"""
+                    UPDATE inventory_stock
+                    SET quantity_available = c.quantity, last_updated = GETDATE(), updated_by = ?
+                    FROM ({cart_rows_sql(len(chunk))}) c
+                    WHERE inventory_stock.product_id = c.product_id
+                      AND inventory_stock.location_id = ?
+                """, (user['user_id'], *[v for row in chunk for v in row], location_id))
+            new_rows = list(inserts.items())
+            for i in range(0, len(new_rows), BULK_INSERT_CHUNK):
+                chunk = new_rows[i:i + BULK_INSERT_CHUNK]
+                cur.execute(
+                    "INSERT INTO inventory_stock (location_id, product_id, quantity_available, quantity_reserved, reorder_level, updated_by) VALUES "
+                    + ", ".join(["(?, ?, ?, 0, 10, ?)"] * len(chunk)),
+                    [v for pid, qty in chunk for v in (location_id, pid, qty, user['user_id'])])
+
+            conn.commit()
+            if updates or inserts:
+                levels = {pid: current[pid] + n if kind == "delta" else n for pid, (kind, n) in updates.items()}
+                levels.update(inserts)
+                stock_changed(location_id, levels)
+        return jsonify(response)
+    except Exception as e:
+        conn.rollback()
+        return jsonify({"detail": str(e)}), 500
+    finally:
+        cur.close()
+        conn.close()
+
 @app.route("/api/inventory/initialize", methods=['POST'])
 def initialize_inventory():
     user = get_current_user()
@@ -441,11 +847,9 @@ def initialize_inventory():
     cur = conn.cursor()
     try:
         # Find location
-        cur.execute("SELECT TOP 1 location_id FROM inventory_locations WHERE city_id = ?", (user['city_id'],))
-        loc_row = cur.fetchone()
-        if not loc_row:
+        location_id = resolve_location(user['city_id'], conn)
+        if location_id is None:
              return jsonify({"detail": "Location not found"}), 404
-        location_id = loc_row[0]
 
         # Bulk insert missing products with 0 stock
         cur.execute("""
@@ -459,6 +863,7 @@ def initialize_inventory():
         """, (location_id, location_id))
         
         conn.commit()
+        stock_changed(location_id)
         return jsonify({"message": "Inventory Initialized"})
     except Exception as e:
         conn.rollback()
@@ -471,17 +876,69 @@ def initialize_inventory():
 # ORDERS
 # ==================
 
+# SQL Server allows 2100 parameters per statement; 5 per order_items row
+ORDER_ITEMS_BATCH = 400
+
+def cart_rows_sql(n: int) -> str:
+    """Derived table of n (product_id, quantity) parameter pairs, usable in FROM/JOIN"""
+    return " UNION ALL ".join(["SELECT ? AS product_id, ? AS quantity"] + ["SELECT ?, ?"] * (n - 1))
+
+ROUTING_RADIUS_KM = float(os.getenv("ROUTING_RADIUS_KM", "10"))
+ROUTING_MAX_CANDIDATES = 10
+
+def route_order(req_data, cart_sql, cart_params, cart_size, conn, cur):
+    """
+    Pick the dark store for an order: among active stores within ROUTING_RADIUS_KM
+    of the delivery point, the closest one that can fulfil the entire cart (checked
+    for all candidates in one query). Falls back to the closest candidate, and to
+    the city's primary store when there are no coordinates or no store in range.
+    """
+    if req_data.delivery_latitude is not None and req_data.delivery_longitude is not None:
+        registry = location_registry(conn)
+        nearby = registry.nearest_stores(req_data.delivery_latitude, req_data.delivery_longitude, ROUTING_RADIUS_KM)
+        nearby = [location_id for location_id, _ in nearby[:ROUTING_MAX_CANDIDATES]]
+        if nearby:
+            cur.execute(f"""
+                SELECT s.location_id
+                FROM inventory_stock s
+                JOIN ({cart_sql}) c ON s.product_id = c.product_id
+                WHERE s.location_id IN ({", ".join("?" * len(nearby))})
+                  AND s.quantity_available >= c.quantity
+                GROUP BY s.location_id
+                HAVING COUNT(*) = ?
+            """, (*cart_params, *nearby, cart_size))
+            can_fulfil = {row[0] for row in cur.fetchall()}
+            return next((location_id for location_id in nearby if location_id in can_fulfil), nearby[0])
+    return resolve_location(req_data.city_id, conn)
+
+def reserve_stock_sql(cart_sql, cart_params, location_id, cur):
+    """
+    Reserve the cart in inventory_stock (STOCK_LEDGER=0). The WHERE re-checks
+    availability under the row locks, so a concurrent checkout that got there
+    first leaves cur.rowcount short of the cart size.
+    """
+    cur.execute(f"""
+        UPDATE inventory_stock
+        SET quantity_available = inventory_stock.quantity_available - c.quantity,
+            quantity_reserved = inventory_stock.quantity_reserved + c.quantity
+        FROM ({cart_sql}) c
+        WHERE inventory_stock.product_id = c.product_id
+          AND inventory_stock.location_id = ?
+          AND inventory_stock.quantity_available >= c.quantity
+    """, (*cart_params, location_id))
+
 @app.route("/api/orders/create", methods=['POST'])
 def create_order():
     user = get_current_user() # Auth check
     
     try:
-        req_data = models.CreateOrderRequest(**request.get_json())
+        req_data = validation.parse_body(models.CreateOrderRequest, request)
     except ValidationError as e:
         return jsonify(e.errors()), 400
 
     conn = get_db_connection()
     cur = conn.cursor()
+    reserved = False
 
     try:
         # Get Customer ID
@@ -491,41 +948,46 @@ def create_order():
             return jsonify({"detail": "Customer profile not found"}), 400
 
         customer_id = customer[0]
-        order_id = f"ORD_{int(datetime.utcnow().timestamp())}"
+        order_id = ids.order_id()
         
-        # We need to determine which location to fulfill from. 
-        # For now, using the city_id from request or finding nearest store.
-        # Assuming request has logic or we pick first available store in city.
-        # Simplified: The request should probably include location_id or we derive it.
-        # The prompt says "inventory dark store... we have only tier 1 cities". 
-        # Let's assume the frontend passes the chosen location or city.
-        # Using a simple default location for the city if not passed is better logic for real app, 
-        # but here we might need `location_id` in request. 
-        # Check models.py: CreateOrderRequest has `city_id`.
-        
-        # Find a location in this city
-        cur.execute("SELECT TOP 1 location_id FROM inventory_locations WHERE city_id = ?", (req_data.city_id,))
-        loc_row = cur.fetchone()
-        if not loc_row:
+        if not req_data.items:
+            return jsonify({"detail": "Cart is empty"}), 400
+
+        # Collapse repeated lines so each SKU is checked and decremented once
+        cart = {}
+        for item in req_data.items:
+            cart[item.product_id] = cart.get(item.product_id, 0) + item.quantity
+        cart_sql = cart_rows_sql(len(cart))
+        cart_params = [v for pair in cart.items() for v in pair]
+
+        # Fulfil from the nearest store that has the whole cart, else the city's store
+        location_id = route_order(req_data, cart_sql, cart_params, len(cart), conn, cur)
+        if location_id is None:
              return jsonify({"detail": "No service in this area"}), 400
-        location_id = loc_row[0]
 
-        total_amount = 0
+        total_amount = sum(item.quantity * item.unit_price for item in req_data.items)
 
-        # Validate Stock & Calculate Total
-        for item in req_data.items:
-            # Check stock at specific location
-            cur.execute("""
-                SELECT quantity_available 
-                FROM inventory_stock 
-                WHERE product_id = ? AND location_id = ?
-            """, (item.product_id, location_id))
-            
-            stock = cur.fetchone()
-            if not stock or stock[0] < item.quantity:
-                return jsonify({"detail": f"Insufficient stock for product {item.product_id}"}), 400
-            
-            total_amount += item.quantity * item.unit_price
+        if stock_ledger.ENABLED:
+            # Reserve in memory (journaled); inventory_stock catches up via write-behind
+            short = stock_ledger.ledger.reserve(location_id, cart, conn)
+            if short:
+                return jsonify({"detail": f"Insufficient stock for product {short}"}), 400
+            reserved = True
+        else:
+            # Validate Stock: one set-based check for the whole cart
+            cur.execute(f"""
+                SELECT c.product_id
+                FROM ({cart_sql}) c
+                LEFT JOIN inventory_stock s ON s.product_id = c.product_id AND s.location_id = ?
+                WHERE s.quantity_available IS NULL OR s.quantity_available < c.quantity
+            """, (*cart_params, location_id))
+            short = cur.fetchone()
+            if short:
+                return jsonify({"detail": f"Insufficient stock for product {short[0]}"}), 400
+            reserve_stock_sql(cart_sql, cart_params, location_id, cur)
+            if cur.rowcount != len(cart):
+                conn.rollback()
+                return jsonify({"detail": "Insufficient stock for one or more items, please review your cart"}), 400
 
         # Create Order
         cur.execute("""
@@ -540,35 +1002,85 @@ def create_order():
             req_data.delivery_address, req_data.delivery_latitude, req_data.delivery_longitude, req_data.customer_notes
         ))
 
-        # Insert Items & Update Inventory
-        for item in req_data.items:
-            cur.execute("""
-                INSERT INTO order_items (order_id, product_id, quantity, unit_price, total_price)
-                VALUES (?, ?, ?, ?, ?)
-            """, (order_id, item.product_id, item.quantity, item.unit_price, item.quantity * item.unit_price))
-
-            cur.execute("""
-                UPDATE inventory_stock
-                SET quantity_available = quantity_available - ?,
-                    quantity_reserved = quantity_reserved + ?
-                WHERE product_id = ? AND location_id = ?
-            """, (item.quantity, item.quantity, item.product_id, location_id))
+        # Insert Items: multi-row VALUES, one statement per ORDER_ITEMS_BATCH lines
+        for i in range(0, len(req_data.items), ORDER_ITEMS_BATCH):
+            batch = req_data.items[i:i + ORDER_ITEMS_BATCH]
+            cur.execute(
+                "INSERT INTO order_items (order_id, product_id, quantity, unit_price, total_price) VALUES "
+                + ", ".join(["(?, ?, ?, ?, ?)"] * len(batch)),
+                [v for item in batch
+                   for v in (order_id, item.product_id, item.quantity, item.unit_price, item.quantity * item.unit_price)]
+            )
 
         conn.commit()
+        catalog_cache.invalidate(location_id)
+        search.index.adjust_stock(location_id, cart)
+        order_events.publish(order_id, 'PLACED', customer_id=customer_id,
+                             city_id=locations.registry.city_of(location_id) or req_data.city_id, location_id=location_id)
+        realtime_service.send_inventory_update(order_id, 'PLACED')
         return jsonify({"order_id": order_id, "total_amount": total_amount}), 201
 
     except Exception as e:
         conn.rollback()
+        if reserved:
+            stock_ledger.ledger.release(location_id, cart)
         return jsonify({"detail": str(e)}), 500
     finally:
         cur.close()
         conn.close()
 
+ORDERS_PAGE_DEFAULT = 50
+ORDERS_PAGE_MAX = 200
+
+def encode_cursor(ts, order_id) -> str:
+    """Opaque keyset position: (timestamp, order_id) as url-safe base64 JSON"""
+    raw = json.dumps([ts.isoformat() if ts else None, order_id])
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+def decode_cursor(token: str):
+    ts, order_id = json.loads(base64.urlsafe_b64decode(token.encode()))
+    return (datetime.fromisoformat(ts) if ts else None), order_id
+
+def encode_sync_token(change_seq: int) -> str:
+    """Opaque delta-sync position: the orders.row_version of the last change returned"""
+    return base64.urlsafe_b64encode(json.dumps({"seq": change_seq}).encode()).decode()
+
+def decode_sync_token(token: str) -> int:
+    return int(json.loads(base64.urlsafe_b64decode(token.encode()))["seq"])
+
 @app.route("/api/orders", methods=['GET'])
 def get_orders():
+    """
+    Without query params: the full history, newest first (legacy shape, a JSON array).
+    ?limit=&cursor=  keyset pages on (created_at, order_id) newest first -> {orders, next_cursor}
+    ?since=<token>   orders created or changed after the token, oldest change first
+                     -> {orders, sync_token, has_more}; pass since= (empty) for the initial sync.
+                     Pages on orders.row_version below MIN_ACTIVE_ROWVERSION(), so a write still
+                     uncommitted at this read is returned by a later sync, never skipped
+    """
     user = get_current_user()
+
+    paged = any(k in request.args for k in ('limit', 'cursor', 'since'))
+    try:
+        limit = min(int(request.args.get('limit', ORDERS_PAGE_DEFAULT)), ORDERS_PAGE_MAX)
+        if limit < 1:
+            raise ValueError
+    except ValueError:
+        return jsonify({"detail": "limit must be a positive integer"}), 400
+    try:
+        since = request.args.get('since')
+        since_seq = decode_sync_token(since) if since else None
+        cursor = request.args.get('cursor')
+        cursor_pos = decode_cursor(cursor) if cursor else None
+    except (ValueError, TypeError, KeyError):
+        return jsonify({"detail": "Invalid cursor"}), 400
+
+    empty = {"orders": [], "sync_token": since or None, "has_more": False} if since is not None \
+        else {"orders": [], "next_cursor": None}
+
     conn = get_db_connection()
     cur = conn.cursor()
+    streamed = False
 
     try:
         # Filter logic based on role
@@ -576,17 +1088,18 @@ def get_orders():
             # Get orders for their location (mocking location by city_id logic or implicit)
             # For this demo, let's fetch orders for the user's city or location
             # Ideally user token has location_id. We'll use city_id.
-            cur.execute("""
-                SELECT 
-                    o.order_id, o.customer_id, o.total_amount, o.status, o.created_at,
-                    o.delivery_partner_id, u.phone as customer_phone
+            columns = """
+                o.order_id, o.customer_id, o.total_amount, o.status, o.created_at, o.updated_at,
+                o.delivery_partner_id, u.phone as customer_phone
+            """
+            source = """
                 FROM orders o
                 JOIN inventory_locations l ON o.location_id = l.location_id
                 JOIN customers c ON o.customer_id = c.customer_id
                 JOIN users u ON c.user_id = u.user_id
                 WHERE l.city_id = ?
-                ORDER BY o.created_at DESC
-            """, (user['city_id'],))
+            """
+            params = [user['city_id']]
             
         elif user['role'] == 'DELIVERY_PARTNER':
             # Get orders assigned to this partner
@@ -594,38 +1107,238 @@ def get_orders():
             cur.execute("SELECT partner_id FROM delivery_partners WHERE user_id = ?", (user['user_id'],))
             partner = cur.fetchone()
             if not partner:
-                return jsonify([])
+                return jsonify(empty if paged else [])
             
-            cur.execute("""
-                SELECT 
-                    o.order_id, o.customer_id, o.total_amount, o.status, o.created_at,
-                    o.delivery_partner_id, u.phone as customer_phone, o.delivery_address
+            columns = """
+                o.order_id, o.customer_id, o.total_amount, o.status, o.created_at, o.updated_at,
+                o.delivery_partner_id, u.phone as customer_phone, o.delivery_address
+            """
+            source = """
                 FROM orders o
                 JOIN customers c ON o.customer_id = c.customer_id
                 JOIN users u ON c.user_id = u.user_id
                 WHERE o.delivery_partner_id = ?
-                ORDER BY o.created_at DESC
-            """, (partner[0],))
+            """
+            params = [partner[0]]
             
         else: # Customer
              cur.execute("SELECT customer_id FROM customers WHERE user_id = ?", (user['user_id'],))
              customer = cur.fetchone()
-             if not customer: return jsonify([])
+             if not customer: return jsonify(empty if paged else [])
              
-             cur.execute("""
-                SELECT order_id, total_amount, status, created_at, delivery_partner_id 
-                FROM orders WHERE customer_id = ? ORDER BY created_at DESC
-             """, (customer[0],))
+             columns = "o.order_id, o.total_amount, o.status, o.created_at, o.updated_at, o.delivery_partner_id"
+             source = "FROM orders o WHERE o.customer_id = ?"
+             params = [customer[0]]
+
+        top = ""
+        order_by = "o.created_at DESC"
+        if paged:
+            top = f"TOP {limit + 1} "   # one extra row tells us whether there is another page
+            if since is not None:
+                # row_version is stamped at write time; rows at or above MIN_ACTIVE_ROWVERSION()
+                # may sit behind an open transaction, so stop short of them until it commits
+                columns += ", CAST(o.row_version AS BIGINT) AS change_seq"
+                source += " AND o.row_version < MIN_ACTIVE_ROWVERSION()"
+                order_by = "o.row_version"
+                if since_seq is not None:
+                    source += " AND o.row_version > CAST(CAST(? AS BIGINT) AS BINARY(8))"
+                    params.append(since_seq)
+            else:
+                order_by = "o.created_at DESC, o.order_id DESC"
+                if cursor_pos:
+                    source += " AND (o.created_at < ? OR (o.created_at = ? AND o.order_id < ?))"
+                    params += [cursor_pos[0], cursor_pos[0], cursor_pos[1]]
+
+        cur.execute(f"SELECT {top}{columns} {source} ORDER BY {order_by}", tuple(params))
+        columns = [column[0] for column in cur.description]
+
+        if not paged and streaming.ENABLED:
+            # Full history: stream it BATCH_ROWS at a time instead of building the whole list
+            streamed = True
+            body = streaming.RowStream(conn, cur, lambda row: dict(zip(columns, row)), app.json.default)
+            return Response(body, mimetype="application/json")
 
         orders = []
-        columns = [column[0] for column in cur.description]
         for row in cur.fetchall():
             orders.append(dict(zip(columns, row)))
 
-        return jsonify(orders)
+        if not paged:
+            return jsonify(orders)
+
+        has_more = len(orders) > limit
+        orders = orders[:limit]
+        if since is not None:
+            sync_token = encode_sync_token(orders[-1]['change_seq']) if orders else (since or None)
+            for order in orders:
+                del order['change_seq']
+            return jsonify({"orders": orders, "sync_token": sync_token, "has_more": has_more})
+        last = orders[-1] if has_more else None
+        return jsonify({
+            "orders": orders,
+            "next_cursor": encode_cursor(last['created_at'], last['order_id']) if last else None,
+        })
+    finally:
+        if not streamed:
+            cur.close()
+            conn.close()
+
+def order_routing(cur, order_id):
+    """Who should hear about a change to this order (customer, partner, staff city)"""
+    cur.execute("""
+        SELECT o.customer_id, o.delivery_partner_id, o.location_id, l.city_id
+        FROM orders o
+        JOIN inventory_locations l ON o.location_id = l.location_id
+        WHERE o.order_id = ?
+    """, (order_id,))
+    row = cur.fetchone()
+    if not row:
+        return None
+    return {"customer_id": row[0], "partner_id": row[1], "location_id": row[2], "city_id": row[3]}
+
+def assignment_index(conn):
+    """The in-memory partner availability index, reloaded over conn when stale"""
+    engine = assignment.engine
+    if engine.is_stale():
+        engine.refresh(conn)
+    return engine
+
+# Orders a partner is carrying; they stay AVAILABLE until this reaches assignment.MAX_ORDERS_PER_PARTNER
+PARTNER_ACTIVE_ORDERS_SQL = """(SELECT COUNT(*) FROM orders o
+    WHERE o.delivery_partner_id = delivery_partners.partner_id AND o.status NOT IN ('DELIVERED', 'CANCELLED'))"""
+
+def auto_assign(city_id, conn, limit=assignment.BATCH_SIZE):
+    """
+    Assign the city's PACKED orders that have no partner yet, solved as one batch.
+    Partners are scored by distance to the order's dark store plus current load.
+    Returns [(order_id, partner_id, distance_km)] for the assignments that were committed.
+    """
+    engine = assignment_index(conn)
+    if not engine.available(city_id):
+        return []
+
+    registry = location_registry(conn)
+    cur = conn.cursor()
+    try:
+        cur.execute(f"""
+            SELECT TOP {int(limit)} o.order_id, o.location_id, o.delivery_latitude, o.delivery_longitude, o.customer_id
+            FROM orders o
+            JOIN inventory_locations l ON o.location_id = l.location_id
+            WHERE l.city_id = ? AND o.status = 'PACKED' AND o.delivery_partner_id IS NULL
+            ORDER BY o.created_at
+        """, (city_id,))
+        pending, routing = [], {}
+        for row in cur.fetchall():
+            # Partners pick up at the store; fall back to the drop point if the store has no coordinates
+            store = registry.stores.get(row[1]) or {}
+            lat = store.get("latitude") if store.get("latitude") is not None else row[2]
+            lon = store.get("longitude") if store.get("longitude") is not None else row[3]
+            pending.append((row[0], lat, lon))
+            routing[row[0]] = {"customer_id": row[4], "location_id": row[1], "city_id": city_id}
+
+        plan = engine.plan(city_id, pending)
+        if not plan:
+            return []
+
+        committed = []
+        settled = set()   # partners whose reservation from plan() has been resolved
+        try:
+            for order_id, partner_id, distance in plan:
+                # Guard both rows so another worker (or a manual assign) can't book past the cap
+                cur.execute(f"""
+                    UPDATE delivery_partners
+                    SET status = CASE WHEN {PARTNER_ACTIVE_ORDERS_SQL} + 1 < ? THEN 'AVAILABLE' ELSE 'BUSY' END
+                    WHERE partner_id = ? AND status = 'AVAILABLE' AND {PARTNER_ACTIVE_ORDERS_SQL} < ?
+                """, (assignment.MAX_ORDERS_PER_PARTNER, partner_id, assignment.MAX_ORDERS_PER_PARTNER))
+                if cur.rowcount != 1:
+                    engine.set_status(partner_id, 'BUSY')
+                    settled.add(partner_id)
+                    continue
+                cur.execute("""
+                    UPDATE orders SET delivery_partner_id = ?, updated_at = GETDATE()
+                    WHERE order_id = ? AND status = 'PACKED' AND delivery_partner_id IS NULL
+                """, (partner_id, order_id))
+                if cur.rowcount != 1:
+                    cur.execute("UPDATE delivery_partners SET status = 'AVAILABLE' WHERE partner_id = ?", (partner_id,))
+                    engine.release(partner_id)
+                    settled.add(partner_id)
+                    continue
+                committed.append((order_id, partner_id, distance))
+            conn.commit()
+            settled.update(partner_id for _, partner_id, _ in committed)
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            # a failed write or commit leaves the rest of the plan reserved: hand it back
+            for _, partner_id, _ in plan:
+                if partner_id not in settled:
+                    engine.release(partner_id)
     finally:
         cur.close()
-        conn.close()
+
+    for order_id, partner_id, _ in committed:
+        engine.order_assigned(partner_id)
+        tracker.set_active_order(partner_id, order_id, 'PACKED')
+        order_events.publish(order_id, 'PACKED', partner_id=partner_id, **routing[order_id])
+        realtime_service.send_delivery_update(order_id, 'PACKED')
+    return committed
+
+def try_auto_assign(city_id, conn):
+    """Best-effort auto-assignment after a status change; never fails the triggering request"""
+    if not assignment.AUTO_ASSIGN or city_id is None:
+        return
+    try:
+        auto_assign(city_id, conn)
+    except Exception as e:
+        print(f"Auto-assign failed for city {city_id}: {e}")
+
+def stream_scope_query(user):
+    """
+    (scope, sql) for an order-stream subscriber other than staff: sql takes the
+    user_id and returns the one id match_scope(scope, id) filters on.
+    Shared with the async server's stream (asgi.py).
+    """
+    if user['role'] == 'DELIVERY_PARTNER':
+        return "partner", "SELECT partner_id FROM delivery_partners WHERE user_id = ?"
+    return "customer", "SELECT customer_id FROM customers WHERE user_id = ?"
+
+@app.route("/api/orders/stream/ticket", methods=['POST'])
+def stream_ticket():
+    # EventSource can't send an Authorization header; the login token must not go in a URL,
+    # where access and proxy logs would keep it, so the stream URL carries this instead
+    user = get_current_user()
+    return jsonify({"ticket": auth.create_stream_ticket(user), "expires_in": auth.STREAM_TICKET_SECONDS})
+
+@app.route("/api/orders/stream", methods=['GET'])
+def stream_orders():
+    # ?ticket= (single use, see stream_ticket) or an Authorization header; never ?token=
+    user, error = authenticate_stream(request.args.get('ticket'), request.headers.get('Authorization'))
+    if error:
+        abort(401, description=error)
+
+    # Resolve the subscriber's scope up front so no connection is held while streaming
+    if user['role'] == 'INVENTORY_STAFF':
+        match = match_scope("city", user['city_id'])
+    else:
+        scope, sql = stream_scope_query(user)
+        conn = get_db_connection()
+        cur = conn.cursor()
+        try:
+            cur.execute(sql, (user['user_id'],))
+            row = cur.fetchone()
+        finally:
+            cur.close()
+            conn.close()
+        if not row:
+            return jsonify({"detail": "Profile not found"}), 404
+        match = match_scope(scope, row[0])
+
+    last_event_id = request.headers.get('Last-Event-ID') or request.args.get('last_event_id')
+    return Response(
+        sse_stream(order_events, match, last_event_id),
+        mimetype="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
 
 @app.route("/api/delivery-partners", methods=['GET'])
 def get_delivery_partners():
@@ -674,9 +1387,19 @@ def assign_order():
     conn = get_db_connection()
     cur = conn.cursor()
     try:
-        cur.execute("UPDATE orders SET delivery_partner_id = ?, status = 'PACKED' WHERE order_id = ?", (partner_id, order_id))
-        cur.execute("UPDATE delivery_partners SET status = 'BUSY' WHERE partner_id = ?", (partner_id,))
+        cur.execute("UPDATE orders SET delivery_partner_id = ?, status = 'PACKED', updated_at = GETDATE() WHERE order_id = ?", (partner_id, order_id))
+        cur.execute(f"""
+            UPDATE delivery_partners
+            SET status = CASE WHEN status = 'AVAILABLE' AND {PARTNER_ACTIVE_ORDERS_SQL} < ? THEN 'AVAILABLE' ELSE 'BUSY' END
+            WHERE partner_id = ?
+        """, (assignment.MAX_ORDERS_PER_PARTNER, partner_id))
+        routing = order_routing(cur, order_id)
         conn.commit()
+        assignment.engine.order_assigned(partner_id)
+        if routing:
+            tracker.set_active_order(routing['partner_id'], order_id, 'PACKED')
+            order_events.publish(order_id, 'PACKED', **routing)
+        realtime_service.send_delivery_update(order_id, 'PACKED')
         return jsonify({"message": "Assigned successfully"})
     except Exception as e:
         conn.rollback()
@@ -685,9 +1408,37 @@ def assign_order():
         cur.close()
         conn.close()
 
+@app.route("/api/orders/auto-assign", methods=['POST'])
+def auto_assign_orders():
+    # Batch mode: assign every pending PACKED order in the staff member's city at once
+    user = get_current_user()
+    if user['role'] != 'INVENTORY_STAFF':
+        return jsonify({"detail": "Unauthorized"}), 403
+
+    data = request.get_json(silent=True) or {}
+    try:
+        limit = min(max(int(data.get('limit', assignment.BATCH_SIZE)), 1), assignment.BATCH_SIZE)
+    except (TypeError, ValueError):
+        return jsonify({"detail": "Invalid limit"}), 400
+
+    conn = get_db_connection()
+    try:
+        committed = auto_assign(user['city_id'], conn, limit)
+        return jsonify({
+            "assigned": [
+                {"order_id": order_id, "partner_id": partner_id, "distance_km": round(distance, 2)}
+                for order_id, partner_id, distance in committed
+            ],
+            "available_partners": len(assignment.engine.available(user['city_id'])),
+        })
+    except Exception as e:
+        return jsonify({"detail": str(e)}), 500
+    finally:
+        conn.close()
+
 @app.route("/api/orders/status", methods=['PUT'])
 def update_order_status():
-    user = get_current_user()
+    get_current_user()   # any signed-in user; aborts with 401 otherwise
     data = request.get_json()
     order_id = data.get('order_id')
     new_status = data.get('status')
@@ -698,7 +1449,7 @@ def update_order_status():
     conn = get_db_connection()
     cur = conn.cursor()
     try:
-        cur.execute("UPDATE orders SET status = ? WHERE order_id = ?", (new_status, order_id))
+        cur.execute("UPDATE orders SET status = ?, updated_at = GETDATE() WHERE order_id = ?", (new_status, order_id))
         
         # If delivered, free up the partner
         if new_status == 'DELIVERED':
@@ -708,7 +1459,19 @@ def update_order_status():
                 WHERE partner_id = (SELECT delivery_partner_id FROM orders WHERE order_id = ?)
             """, (order_id,))
             
+        routing = order_routing(cur, order_id)
         conn.commit()
+        if routing:
+            order_events.publish(order_id, new_status, **routing)
+            if routing['partner_id'] is not None:
+                active = new_status not in ('DELIVERED', 'CANCELLED')
+                tracker.set_active_order(routing['partner_id'], order_id if active else None, new_status if active else None)
+            if new_status == 'DELIVERED' and routing['partner_id'] is not None:
+                assignment.engine.order_delivered(routing['partner_id'])
+                try_auto_assign(routing['city_id'], conn)
+            elif new_status == 'PACKED' and routing['partner_id'] is None:
+                try_auto_assign(routing['city_id'], conn)
+        realtime_service.send_order_update(order_id, new_status)
         return jsonify({"message": "Status updated"})
     finally:
         cur.close()
@@ -724,12 +1487,12 @@ def toggle_partner_status():
     cur = conn.cursor()
     try:
         # Get current status
-        cur.execute("SELECT status FROM delivery_partners WHERE user_id = ?", (user['user_id'],))
+        cur.execute("SELECT partner_id, status FROM delivery_partners WHERE user_id = ?", (user['user_id'],))
         row = cur.fetchone()
         if not row:
             return jsonify({"detail": "Partner profile not found"}), 404
         
-        current_status = row[0]
+        partner_id, current_status = row[0], row[1]
         # Toggle logic: If INACTIVE -> AVAILABLE. If AVAILABLE -> INACTIVE. If BUSY -> Warning?
         # User wants to go online/offline.
         
@@ -740,26 +1503,99 @@ def toggle_partner_status():
 
         cur.execute("UPDATE delivery_partners SET status = ? WHERE user_id = ?", (new_status, user['user_id']))
         conn.commit()
+        assignment.engine.set_status(partner_id, new_status, city_id=user['city_id'])
+        if new_status == 'AVAILABLE':
+            try_auto_assign(user['city_id'], conn)
         return jsonify({"status": new_status})
     finally:
         cur.close()
         conn.close()
 
+@app.route("/api/delivery-partners/location", methods=['POST'])
+def ingest_location():
+    # Batched GPS pings from the partner app; buffered in memory and flushed in bulk
+    user = get_current_user()
+    if user['role'] != 'DELIVERY_PARTNER':
+        return jsonify({"detail": "Unauthorized"}), 403
+
+    try:
+        batch = validation.parse_body(models.LocationBatch, request)
+    except ValidationError as e:
+        return jsonify(e.errors()), 400
+
+    partner_id = tracker.partner_ids.get(user['user_id'])
+    if partner_id is None or tracker.needs_order(partner_id):
+        conn = get_db_connection()
+        cur = conn.cursor()
+        try:
+            cur.execute("""
+                SELECT dp.partner_id, o.order_id, o.status
+                FROM delivery_partners dp
+                LEFT JOIN orders o ON o.delivery_partner_id = dp.partner_id
+                    AND o.status NOT IN ('DELIVERED', 'CANCELLED')
+                WHERE dp.user_id = ?
+                ORDER BY o.created_at DESC
+            """, (user['user_id'],))
+            row = cur.fetchone()
+        finally:
+            cur.close()
+            conn.close()
+        if not row:
+            return jsonify({"detail": "Partner profile not found"}), 404
+        partner_id = tracker.partner_ids[user['user_id']] = row[0]
+        tracker.set_active_order(partner_id, row[1], row[2])
+
+    now = time.time()
+    points = [(min(p.timestamp or now, now), p.latitude, p.longitude) for p in batch.points]
+    latest = tracker.ingest(partner_id, points)
+    if latest:
+        assignment.engine.update_position(partner_id, *latest)
+    return jsonify({"received": len(points)}), 202
+
 @app.route("/api/health")
 def health():
     status = {"status": "ok", "db": "unknown"}
     try:
         conn = get_db_connection()
-        cur = conn.cursor()
-        cur.execute("SELECT 1")
-        status["db"] = "connected"
-        cur.close()
-        conn.close()
+        try:
+            cur = conn.cursor()
+            cur.execute("SELECT 1")
+            cur.fetchone()
+            cur.close()
+            status["db"] = "connected"
+        finally:
+            conn.close()
     except Exception as e:
         status["db"] = "error"
         status["error"] = str(e)
+    status["pool"] = db.pool.stats()
+    status["catalog_cache"] = catalog_cache.stats()
+    status["realtime"] = realtime_service.stats()
+    status["token_cache"] = auth.token_cache.stats()
+    status["assignment"] = assignment.engine.stats()
+    status["tracking"] = tracker.stats()
+    status["stock_ledger"] = stock_ledger.ledger.stats()
+    status["search"] = search.index.stats()
     return jsonify(status)
 
+def pool_metrics():
+    stats = db.pool.stats()
+    return [
+        ("quickpick_db_pool_connections", "gauge", "Pooled database connections by state",
+         [({"state": state}, stats[state]) for state in ("in_use", "idle")]),
+        ("quickpick_db_pool_checkouts_total", "counter", "Connections checked out of the pool", [({}, stats["checkouts"])]),
+        ("quickpick_db_pool_timeouts_total", "counter", "Checkouts that gave up waiting (503s)", [({}, stats["timeouts"])]),
+        ("quickpick_db_pool_wait_seconds", "gauge", "Time spent waiting to check out a connection",
+         [({"stat": stat}, stats[f"wait_{stat}_ms"] / 1000) for stat in ("avg", "max")]),
+    ]
+
+metrics.registry.add_collector(pool_metrics)
+
+@app.route("/api/metrics")
+def get_metrics():
+    # Prometheus scrape target
+    return Response(metrics.registry.render(), mimetype="text/plain; version=0.0.4")
+
 @app.route("/api/debug/schema", methods=['GET'])
 def debug_schema():
     conn = get_db_connection()
@@ -779,5 +1615,27 @@ def debug_schema():
         cur.close()
         conn.close()
 
+def warm_up():
+    """Startup work shared by app.run below and the ASGI server's lifespan (asgi.py)"""
+    # Warm the location registry; handlers load it lazily if this fails
+    try:
+        conn = get_db_connection()
+        try:
+            locations.registry.refresh(conn)
+        finally:
+            conn.close()
+    except Exception as e:
+        print(f"Location registry not loaded at startup: {e}")
+    # Replay stock reservations a previous run journaled but never wrote back
+    if stock_ledger.ENABLED:
+        try:
+            with db.pool.get_connection() as conn:
+                stock_ledger.ledger.recover(conn)
+        except Exception as e:
+            print(f"Stock ledger recovery deferred to first checkout: {e}")
+
 if __name__ == "__main__":
+    # Threaded dev server; for many long-lived connections serve asgi.py instead (uvicorn asgi:app)
+    if os.environ.get("WERKZEUG_RUN_MAIN") == "true":
+        warm_up()   # in the reloader's serving child only, which is what holds the ledger journal
     app.run(debug=True, port=8000)
\ No newline at end of file
@@ -0,0 +1,224 @@
+import os
+import threading
+from time import perf_counter
+from bisect import bisect_left
+from contextvars import ContextVar
+
+import profiler
+
+# Request and query instrumentation, exported in Prometheus text format.
+# main.py's request hooks time every request against its route template
+# (/api/orders/<order_id>, not the raw path, so series stay bounded) and db.py
+# hands out TimedCursor wrappers that time execute/fetch calls against the
+# route that opened the cursor (and feed profiler.py's per-request profiles
+# and slow-query log). Work outside a request (dispatcher, ledger
+# write-behind) is recorded under route="background".
+
+ENABLED = os.getenv("METRICS_ENABLED", "1") == "1"
+
+# seconds; roughly x2.5 steps from a cache hit to a stuck query
+REQUEST_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+
+BACKGROUND = "background"
+UNMATCHED = "<unmatched>"
+
+current_route = ContextVar("current_route", default=BACKGROUND)
+
+class Histogram:
+    """Bucket counts (made cumulative on export), sum and count for one label set"""
+    __slots__ = ("bounds", "counts", "total", "count", "_lock")
+
+    def __init__(self, bounds, lock):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)   # last slot is +Inf
+        self.total = 0.0
+        self.count = 0
+        self._lock = lock                       # the registry's, so a scrape sees consistent series
+
+    def observe(self, value):
+        bucket = bisect_left(self.bounds, value)
+        with self._lock:
+            self.counts[bucket] += 1
+            self.total += value
+            self.count += 1
+
+class Registry:
+    """
+    Per-route request latency, status counts and in-flight requests, plus
+    per-route query timings. One lock, held only to bump a few integers.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._requests = {}     # (route, method) -> Histogram
+        self._statuses = {}     # (route, method, status) -> count
+        self._in_flight = {}    # (route, method) -> gauge
+        self._queries = {}      # (route, operation) -> Histogram
+        self._collectors = []   # callables returning extra (name, type, help, [(labels, value)])
+
+    def request_started(self, route, method):
+        key = (route, method)
+        with self._lock:
+            self._in_flight[key] = self._in_flight.get(key, 0) + 1
+
+    def request_finished(self, route, method, status, seconds):
+        key = (route, method)
+        with self._lock:
+            self._in_flight[key] -= 1
+            histogram = self._requests.get(key)
+            if histogram is None:
+                histogram = self._requests[key] = Histogram(REQUEST_BUCKETS, self._lock)
+            status_key = (route, method, status)
+            self._statuses[status_key] = self._statuses.get(status_key, 0) + 1
+        histogram.observe(seconds)
+
+    def query_histograms(self, route):
+        """(execute, fetch) histograms for a route; cursors look them up once, not per call"""
+        with self._lock:
+            pair = []
+            for operation in ("execute", "fetch"):
+                histogram = self._queries.get((route, operation))
+                if histogram is None:
+                    histogram = self._queries[(route, operation)] = Histogram(QUERY_BUCKETS, self._lock)
+                pair.append(histogram)
+        return pair
+
+    def add_collector(self, collect):
+        """collect() -> [(name, type, help, [(labels dict, value)])], read at scrape time"""
+        self._collectors.append(collect)
+
+    def reset(self):
+        with self._lock:
+            self._requests.clear()
+            self._statuses.clear()
+            self._queries.clear()
+
+    def render(self) -> str:
+        """Everything in Prometheus text exposition format (version 0.0.4)"""
+        with self._lock:
+            requests = {key: (list(h.counts), h.total, h.count) for key, h in self._requests.items()}
+            queries = {key: (list(h.counts), h.total, h.count) for key, h in self._queries.items()}
+            statuses = dict(self._statuses)
+            in_flight = dict(self._in_flight)
+
+        lines = []
+        _histogram(lines, "quickpick_http_request_duration_seconds", "Request latency by route template",
+                   REQUEST_BUCKETS, (({"route": route, "method": method}, data) for (route, method), data in requests.items()))
+        _family(lines, "quickpick_http_requests_total", "counter", "Finished requests by route and status",
+                (({"route": route, "method": method, "status": status}, n) for (route, method, status), n in statuses.items()))
+        _family(lines, "quickpick_http_requests_in_flight", "gauge", "Requests being handled right now",
+                (({"route": route, "method": method}, n) for (route, method), n in in_flight.items()))
+        _histogram(lines, "quickpick_db_query_duration_seconds", "Time in cursor execute/fetch calls by route",
+                   QUERY_BUCKETS, (({"route": route, "operation": op}, data) for (route, op), data in queries.items()))
+        for collect in self._collectors:
+            for name, kind, help_text, samples in collect():
+                _family(lines, name, kind, help_text, samples)
+        return "\n".join(lines) + "\n"
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+def _labels(labels):
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{key}="{_escape(value)}"' for key, value in labels.items()) + "}"
+
+def _family(lines, name, kind, help_text, samples):
+    lines.append(f"# HELP {name} {help_text}")
+    lines.append(f"# TYPE {name} {kind}")
+    for labels, value in samples:
+        lines.append(f"{name}{_labels(labels)} {value}")
+
+def _histogram(lines, name, help_text, bounds, series):
+    lines.append(f"# HELP {name} {help_text}")
+    lines.append(f"# TYPE {name} histogram")
+    for labels, (counts, total, count) in series:
+        cumulative = 0
+        for bound, n in zip(bounds + ("+Inf",), counts):
+            cumulative += n
+            lines.append(f"{name}_bucket{_labels({**labels, 'le': bound})} {cumulative}")
+        lines.append(f"{name}_sum{_labels(labels)} {total!r}")
+        lines.append(f"{name}_count{_labels(labels)} {count}")
+
+class TimedCursor:
+    """
+    Driver cursor proxy that times execute*/fetch* calls. The route is taken when
+    the cursor is opened, so rows fetched after the handler returns (streamed
+    responses) still count against the route that ran the query. With metrics
+    off it only feeds the profiler and the slow-query log.
+    """
+    __slots__ = ("_cur", "_route", "_executes", "_fetches", "_statement")
+
+    def __init__(self, cur):
+        route = current_route.get()
+        object.__setattr__(self, "_cur", cur)
+        object.__setattr__(self, "_route", route)
+        executes, fetches = registry.query_histograms(route) if ENABLED else (None, None)
+        object.__setattr__(self, "_executes", executes)
+        object.__setattr__(self, "_fetches", fetches)
+        object.__setattr__(self, "_statement", None)   # profiler entry that fetched rows are added to
+
+    def __getattr__(self, name):
+        return getattr(self._cur, name)
+
+    def __setattr__(self, name, value):
+        setattr(self._cur, name, value)    # e.g. cur.fast_executemany = True
+
+    def __iter__(self):
+        return iter(self._cur)
+
+    def _executed(self, args, seconds, many):
+        if self._executes is not None:
+            self._executes.observe(seconds)
+        profile = profiler.current.get()
+        if profile is not None:
+            object.__setattr__(self, "_statement", profile.executed(args[0], args[1:], seconds, self._cur.rowcount, many))
+        if profiler.SLOW_LOG and seconds * 1000 >= profiler.SLOW_QUERY_MS:
+            profiler.slow_query(self._route, args[0], args[1:], seconds, self._cur.rowcount, many)
+
+    def _fetched(self, seconds, rows):
+        if self._fetches is not None:
+            self._fetches.observe(seconds)
+        if self._statement is not None:
+            self._statement.rows += rows
+
+    def execute(self, *args):
+        started = perf_counter()
+        try:
+            self._cur.execute(*args)
+        finally:
+            self._executed(args, perf_counter() - started, False)
+        return self    # pyodbc returns the cursor so calls can be chained
+
+    def executemany(self, *args):
+        started = perf_counter()
+        try:
+            self._cur.executemany(*args)
+        finally:
+            self._executed(args, perf_counter() - started, True)
+        return self
+
+    def fetchone(self):
+        started = perf_counter()
+        row = self._cur.fetchone()
+        self._fetched(perf_counter() - started, row is not None)
+        return row
+
+    def fetchmany(self, *args):
+        started = perf_counter()
+        rows = self._cur.fetchmany(*args)
+        self._fetched(perf_counter() - started, len(rows))
+        return rows
+
+    def fetchall(self):
+        started = perf_counter()
+        rows = self._cur.fetchall()
+        self._fetched(perf_counter() - started, len(rows))
+        return rows
+
+    def close(self):
+        self._cur.close()
+
+# Global registry shared by the request hooks, cursors and /api/metrics
+registry = Registry()
@@ -49,6 +49,7 @@ class Product(BaseModel):
     description: Optional[str]
     image_url: Optional[str]
     is_active: bool
+    sku: Optional[str] = None
 
 class ProductWithStock(Product):
     quantity_available: int
@@ -115,6 +116,14 @@ class AssignDeliveryRequest(BaseModel):
     order_id: str
     delivery_partner_id: int
 
+class LocationPing(BaseModel):
+    latitude: float = Field(ge=-90, le=90)
+    longitude: float = Field(ge=-180, le=180)
+    timestamp: Optional[float] = None  # epoch seconds on the device; server time if missing
+
+class LocationBatch(BaseModel):
+    points: List[LocationPing] = Field(min_length=1, max_length=500)
+
 class DeliveryPartnerInfo(BaseModel):
     partner_id: int
     user_id: str
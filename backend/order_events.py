@@ -0,0 +1,163 @@
+import asyncio
+import os
+import json
+import threading
+import time
+import uuid
+from collections import deque
+from datetime import datetime
+
+# In-process fan-out of order status changes to Server-Sent Events streams.
+# Every change gets a sequence id; a bounded history lets a reconnecting
+# EventSource resume from its Last-Event-ID. If the history no longer reaches
+# back that far, or the id came from another process (ids carry the bus's
+# epoch), the client is told to reset and refetch /api/orders once. Threaded
+# servers block a thread per stream in wait(); the ASGI server (asgi.py)
+# parks a coroutine in wait_async().
+#
+# Single-process only: a stream hears the changes made in its own process.
+# Behind several workers the frontend's slow poll (frontend/src/api/orderStream.js)
+# picks up the rest; run one worker for strictly live updates.
+
+HISTORY_SIZE = int(os.getenv("ORDER_EVENTS_HISTORY", "5000"))
+HEARTBEAT_SECONDS = float(os.getenv("ORDER_EVENTS_HEARTBEAT", "15"))
+
+class OrderEventBus:
+    def __init__(self, history=HISTORY_SIZE):
+        self._events = deque(maxlen=history)
+        self._cond = threading.Condition()
+        self._seq = 0
+        self.epoch = uuid.uuid4().hex[:8]   # prefixes event ids, so another process's ids are never replayed here
+        self._loop_waiters = {}   # event loop -> futures of coroutines parked in wait_async
+
+    @property
+    def last_id(self) -> int:
+        return self._seq
+
+    def publish(self, order_id, status, customer_id=None, partner_id=None, city_id=None, location_id=None):
+        with self._cond:
+            self._seq += 1
+            self._events.append({
+                "id": self._seq,
+                "order_id": order_id,
+                "status": status,
+                "customer_id": customer_id,
+                "delivery_partner_id": partner_id,
+                "city_id": city_id,
+                "location_id": location_id,
+                "timestamp": datetime.utcnow().isoformat(),
+            })
+            self._cond.notify_all()
+            parked, self._loop_waiters = self._loop_waiters, {}
+        for loop, waiters in parked.items():
+            # one wake-up per loop, not per coroutine; publish runs on handler threads
+            try:
+                loop.call_soon_threadsafe(_wake, waiters)
+            except RuntimeError:
+                pass   # loop already closed: the server is shutting down
+
+    def _since(self, last_id, match):
+        """(matching events after last_id, reset flag). Caller holds the lock."""
+        if last_id > self._seq or (self._events and self._events[0]["id"] > last_id + 1):
+            return [], True
+        newer = []
+        for event in reversed(self._events):
+            if event["id"] <= last_id:
+                break
+            newer.append(event)
+        newer.reverse()
+        return [e for e in newer if match(e)], False
+
+    def wait(self, last_id, match, timeout=HEARTBEAT_SECONDS):
+        """
+        Block until there are matching events after last_id (or timeout).
+        Returns (events, new_last_id, reset).
+        """
+        deadline = time.monotonic() + timeout
+        with self._cond:
+            while True:
+                events, reset = self._since(last_id, match)
+                last_id = self._seq
+                if events or reset:
+                    return events, last_id, reset
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return [], last_id, False
+                self._cond.wait(remaining)
+
+    async def wait_async(self, last_id, match, timeout=HEARTBEAT_SECONDS):
+        """wait() for coroutines: parks on a future instead of blocking a thread"""
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + timeout
+        while True:
+            with self._cond:
+                events, reset = self._since(last_id, match)
+                last_id = self._seq
+                if events or reset:
+                    return events, last_id, reset
+                waiter = loop.create_future()
+                self._loop_waiters.setdefault(loop, set()).add(waiter)
+            remaining = deadline - loop.time()
+            try:
+                if remaining <= 0:
+                    return [], last_id, False
+                await asyncio.wait_for(waiter, remaining)
+            except asyncio.TimeoutError:
+                return [], last_id, False
+            finally:
+                with self._cond:
+                    self._loop_waiters.get(loop, set()).discard(waiter)
+
+def _wake(waiters):
+    for waiter in waiters:
+        if not waiter.done():
+            waiter.set_result(None)
+
+def match_scope(scope: str, value):
+    """Filter for one subscriber: ('customer', customer_id), ('partner', partner_id) or ('city', city_id)"""
+    key = {"customer": "customer_id", "partner": "delivery_partner_id", "city": "city_id"}[scope]
+    return lambda event: event[key] == value
+
+def _opening(bus, last_event_id):
+    """(first frames, last_id) for a new subscriber resuming from last_event_id"""
+    frames = ["retry: 3000\n\n"]
+    last_id = bus.last_id
+    if last_event_id is not None:
+        epoch, _, seq = last_event_id.partition(":")
+        if epoch == bus.epoch and seq.isdigit():
+            last_id = int(seq)
+        else:
+            # another worker's id, or this process restarted: nothing to replay from
+            frames.append(f"id: {bus.epoch}:{last_id}\nevent: reset\ndata: {{}}\n\n")
+    return frames, last_id
+
+def _frames(bus, events, last_id, reset):
+    if reset:
+        yield f"id: {bus.epoch}:{last_id}\nevent: reset\ndata: {{}}\n\n"
+        return
+    if not events:
+        yield ": keep-alive\n\n"
+        return
+    for event in events:
+        data = {k: v for k, v in event.items() if k not in ("id", "customer_id", "city_id")}
+        yield f"id: {bus.epoch}:{event['id']}\nevent: order\ndata: {json.dumps(data)}\n\n"
+
+def sse_stream(bus, match, last_event_id=None, heartbeat=HEARTBEAT_SECONDS):
+    """Generator of text/event-stream frames for one subscriber"""
+    frames, last_id = _opening(bus, last_event_id)
+    yield from frames
+    while True:
+        events, last_id, reset = bus.wait(last_id, match, heartbeat)
+        yield from _frames(bus, events, last_id, reset)
+
+async def sse_stream_async(bus, match, last_event_id=None, heartbeat=HEARTBEAT_SECONDS):
+    """sse_stream for the ASGI server: the same frames, waiting in a coroutine"""
+    frames, last_id = _opening(bus, last_event_id)
+    for frame in frames:
+        yield frame
+    while True:
+        events, last_id, reset = await bus.wait_async(last_id, match, heartbeat)
+        for frame in _frames(bus, events, last_id, reset):
+            yield frame
+
+order_events = OrderEventBus()
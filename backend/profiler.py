@@ -0,0 +1,139 @@
+import json
+import logging
+import os
+import random
+import re
+from contextvars import ContextVar
+from datetime import datetime, timezone
+from functools import lru_cache
+
+# Per-request SQL profiler and slow-query log.
+# A profiled request collects every statement its cursors run (normalized
+# text, parameter types, rows, time), flags statements repeated within the
+# request as likely N+1 loops, and is written to the query log as one JSON
+# line. Profiling is opt-in per request: send PROFILE_HEADER with the value
+# of PROFILE_TOKEN, or set PROFILE_SAMPLE_RATE to profile a fraction of all
+# requests. Independently, any statement slower than SLOW_QUERY_MS is logged
+# on its own, profiled or not, and whether or not metrics are enabled
+# (SLOW_QUERY_MS=0 turns this off). Parameter values are never logged, only
+# their types.
+
+PROFILE_HEADER = "X-Profile-Queries"
+PROFILE_TOKEN = os.getenv("PROFILE_TOKEN", "")          # header is ignored unless this is set
+SAMPLE_RATE = float(os.getenv("PROFILE_SAMPLE_RATE", "0"))
+N_PLUS_ONE_MIN = int(os.getenv("PROFILE_N_PLUS_ONE_MIN", "5"))   # executions of one statement in a request
+SLOW_QUERY_MS = float(os.getenv("SLOW_QUERY_MS", "250"))
+SLOW_LOG = SLOW_QUERY_MS > 0                            # every cursor is timed while this is on
+QUERY_LOG = os.getenv("QUERY_LOG", "")                  # JSON lines file; empty logs to stderr
+MAX_STATEMENTS = 1000                                   # per profile; the rest are only counted
+MAX_PARAM_TYPES = 20                                    # longer parameter lists are truncated in the log
+
+current = ContextVar("current_profile", default=None)
+
+log = logging.getLogger("quickpick.queries")
+log.propagate = False
+if not log.handlers:
+    _handler = logging.FileHandler(QUERY_LOG) if QUERY_LOG else logging.StreamHandler()
+    _handler.setFormatter(logging.Formatter("%(message)s"))
+    log.addHandler(_handler)
+    log.setLevel(logging.INFO)
+
+_LITERALS = re.compile(r"'(?:[^']|'')*'|\b\d+(?:\.\d+)?\b")
+_WHITESPACE = re.compile(r"\s+")
+# generated parameter lists: IN (?, ?, ?), multi-row VALUES and cart_rows_sql's UNION ALL table
+_PARAM_LIST = re.compile(r"\(\?(?:, \?)+\)(?:, \(\?(?:, \?)+\))+")
+_IN_LIST = re.compile(r"\(\?(?:, \?){2,}\)")
+_UNION_ROWS = re.compile(r"(SELECT \?(?: AS \w+)?(?:, \?(?: AS \w+)?)*)(?: UNION ALL SELECT \?(?:, \?)*)+")
+
+@lru_cache(maxsize=2048)
+def normalize(sql: str) -> str:
+    """Statement text with literals as ? and generated parameter lists collapsed to one '...' entry"""
+    text = _WHITESPACE.sub(" ", sql).strip()
+    text = _LITERALS.sub("?", text)
+    text = text.replace(" ,", ",").replace("( ", "(").replace(" )", ")")
+    text = _PARAM_LIST.sub(lambda m: m.group(0).split("), ")[0] + "), ...", text)
+    text = _IN_LIST.sub("(?, ...)", text)
+    text = _UNION_ROWS.sub(r"\1 UNION ALL ...", text)
+    return text
+
+def param_shape(params, many=False):
+    """
+    Parameter types, never values. params are what followed the SQL in the
+    execute call: (a, b) or ((a, b),) -> ['str', 'int']; executemany's row
+    list -> {'rows': n, 'row': [...]} from the first row.
+    """
+    if len(params) == 1 and isinstance(params[0], (list, tuple)):
+        params = params[0]
+    if many:
+        return {"rows": len(params), "row": param_shape(params[:1]) if params else []}
+    shape = [type(p).__name__ for p in params[:MAX_PARAM_TYPES]]
+    if len(params) > MAX_PARAM_TYPES:
+        shape.append(f"... {len(params)} in all")
+    return shape
+
+def requested(headers) -> bool:
+    """The caller asked for a profile (and gets the summary back in response headers)"""
+    return bool(PROFILE_TOKEN) and headers.get(PROFILE_HEADER) == PROFILE_TOKEN
+
+def sampled() -> bool:
+    return SAMPLE_RATE > 0 and random.random() < SAMPLE_RATE
+
+class Statement:
+    __slots__ = ("sql", "params", "ms", "rows")
+
+    def __init__(self, sql, params, ms, rows):
+        self.sql = sql
+        self.params = params
+        self.ms = ms
+        self.rows = rows
+
+class Profile:
+    """Statements run during one request, in order"""
+
+    def __init__(self, route, method, requested):
+        self.route = route
+        self.method = method
+        self.requested = requested     # asked for by header, not sampled
+        self.statements = []
+        self.dropped = 0
+
+    def executed(self, sql, params, seconds, rowcount, many=False):
+        """Record a statement; returns it so fetches can add the rows they read"""
+        if len(self.statements) >= MAX_STATEMENTS:
+            self.dropped += 1
+            return None
+        statement = Statement(normalize(sql), param_shape(params, many), seconds * 1000, max(rowcount, 0))
+        self.statements.append(statement)
+        return statement
+
+    def n_plus_one(self):
+        """[(normalized sql, executions, total ms)] for statements run N_PLUS_ONE_MIN+ times"""
+        groups = {}
+        for s in self.statements:
+            count, ms = groups.get(s.sql, (0, 0.0))
+            groups[s.sql] = (count + 1, ms + s.ms)
+        return sorted(((sql, count, ms) for sql, (count, ms) in groups.items() if count >= N_PLUS_ONE_MIN),
+                      key=lambda g: -g[1])
+
+    def summary(self):
+        return len(self.statements) + self.dropped, sum(s.ms for s in self.statements)
+
+    def write(self, status, seconds):
+        count, db_ms = self.summary()
+        log.info(json.dumps({
+            "event": "request_profile",
+            "at": datetime.now(timezone.utc).isoformat(),
+            "route": self.route, "method": self.method, "status": status,
+            "ms": round(seconds * 1000, 3), "db_ms": round(db_ms, 3), "statements": count,
+            "n_plus_one": [{"sql": sql, "executions": n, "ms": round(ms, 3)} for sql, n, ms in self.n_plus_one()],
+            "queries": [{"sql": s.sql, "params": s.params, "rows": s.rows, "ms": round(s.ms, 3)}
+                        for s in self.statements],
+        }, default=str))
+
+def slow_query(route, sql, params, seconds, rowcount, many=False):
+    log.warning(json.dumps({
+        "event": "slow_query",
+        "at": datetime.now(timezone.utc).isoformat(),
+        "route": route, "ms": round(seconds * 1000, 3),
+        "sql": normalize(sql), "params": param_shape(params, many), "rows": rowcount if rowcount >= 0 else None,
+    }))
@@ -1,49 +1,221 @@
 import os
 import json
-from azure.messaging.webpubsubservice import WebPubSubServiceClient
+import time
+import atexit
+import threading
+from collections import OrderedDict, deque
+from datetime import datetime
+
+# Real-time notifications are handed to a background dispatcher so the
+# request thread never waits on the network. Repeated updates for the same
+# order inside the coalescing window collapse into the latest one, and the
+# dispatcher drains them in batches. On the wire each update is still its own
+# {order_id, status, timestamp} message, the format subscribers already parse.
+
+QUEUE_SIZE = int(os.getenv("REALTIME_QUEUE_SIZE", "10000"))
+BATCH_SIZE = int(os.getenv("REALTIME_BATCH_SIZE", "100"))
+COALESCE_SECONDS = float(os.getenv("REALTIME_COALESCE_MS", "200")) / 1000
+BACKPRESSURE = os.getenv("REALTIME_BACKPRESSURE", "drop_oldest")   # drop_oldest | block
+BLOCK_TIMEOUT = float(os.getenv("REALTIME_BLOCK_TIMEOUT_MS", "50")) / 1000
+
+# ==================
+# PUBLISHERS
+# ==================
+
+class WebPubSubPublisher:
+    """Azure Web PubSub: one JSON object per update, as subscribers expect"""
+
+    def __init__(self, client):
+        self.client = client
+
+    def send(self, batch):
+        for message in batch:
+            self.client.send_to_all(message=json.dumps(message), content_type="application/json")
+
+class LocalPublisher:
+    """In-process stand-in used when Azure is not configured (dev, tests, benchmarks)"""
+
+    def __init__(self, keep=1000):
+        self.sent = deque(maxlen=keep)
+        self.listeners = []
+
+    def subscribe(self, callback):
+        self.listeners.append(callback)
+
+    def send(self, batch):
+        self.sent.extend(batch)
+        for callback in self.listeners:
+            callback(batch)
 
 # Optional: Azure Web PubSub for real-time updates
 try:
     PUBSUB_CONNECTION_STRING = os.getenv("PUBSUB_CONNECTION_STRING", "")
     if PUBSUB_CONNECTION_STRING:
+        from azure.messaging.webpubsubservice import WebPubSubServiceClient
         client = WebPubSubServiceClient.from_connection_string(PUBSUB_CONNECTION_STRING)
     else:
         client = None
-except:
+except Exception:
     client = None
 
+# ==================
+# DISPATCHER
+# ==================
+
+class Dispatcher:
+    def __init__(self, publisher, queue_size=QUEUE_SIZE, batch_size=BATCH_SIZE,
+                 coalesce=COALESCE_SECONDS, backpressure=BACKPRESSURE, block_timeout=BLOCK_TIMEOUT):
+        if backpressure not in ("drop_oldest", "block"):
+            raise ValueError(f"Unknown backpressure policy: {backpressure}")
+        self.publisher = publisher
+        self.queue_size = queue_size
+        self.batch_size = batch_size
+        self.coalesce = coalesce
+        self.backpressure = backpressure
+        self.block_timeout = block_timeout
+
+        self._pending = OrderedDict()   # (kind, order_id) -> message, oldest first
+        self._first_at = None           # when the oldest pending message was queued
+        self._cond = threading.Condition()
+        self._thread = None
+        self._stopped = False
+
+        # metrics
+        self.enqueued = 0
+        self.coalesced = 0
+        self.dropped = 0
+        self.sent = 0
+        self.batches = 0
+        self.failures = 0
+        self._latency_total = 0.0
+        self._latency_max = 0.0
+
+    def submit(self, key, message):
+        """Queue a message; returns immediately (or after block_timeout when full and blocking)"""
+        with self._cond:
+            self.enqueued += 1
+            if key in self._pending:
+                self._pending[key] = message   # keep its place in line, send the latest state
+                self.coalesced += 1
+                return
+            if len(self._pending) >= self.queue_size:
+                if self.backpressure == "block":
+                    deadline = time.monotonic() + self.block_timeout
+                    while len(self._pending) >= self.queue_size:
+                        remaining = deadline - time.monotonic()
+                        if remaining <= 0:
+                            self.dropped += 1
+                            return
+                        self._cond.wait(remaining)
+                else:
+                    self._pending.popitem(last=False)
+                    self.dropped += 1
+            self._pending[key] = message
+            if self._first_at is None:
+                self._first_at = time.monotonic()
+            self._ensure_started()
+            self._cond.notify_all()
+
+    def _ensure_started(self):
+        if self._thread is None or not self._thread.is_alive():
+            self._thread = threading.Thread(target=self._run, name="realtime-dispatcher", daemon=True)
+            self._thread.start()
+
+    def _next_batch(self):
+        """Wait for a full batch or the end of the coalescing window; caller holds the lock"""
+        while True:
+            if self._pending:
+                due = self._first_at + self.coalesce
+                if len(self._pending) >= self.batch_size or self._stopped or time.monotonic() >= due:
+                    break
+                self._cond.wait(due - time.monotonic())
+            elif self._stopped:
+                return []
+            else:
+                self._cond.wait()
+
+        batch = []
+        while self._pending and len(batch) < self.batch_size:
+            batch.append(self._pending.popitem(last=False)[1])
+        self._first_at = time.monotonic() if self._pending else None
+        self._cond.notify_all()   # wake producers blocked on a full queue
+        return batch
+
+    def _run(self):
+        while True:
+            with self._cond:
+                batch = self._next_batch()
+            if not batch:
+                return
+            started = time.perf_counter()
+            try:
+                self.publisher.send(batch)
+                self.sent += len(batch)
+            except Exception as e:
+                self.failures += 1
+                print(f"⚠ Could not send real-time update batch ({len(batch)} messages): {e}")
+                # Non-critical, so don't raise
+            elapsed = time.perf_counter() - started
+            self.batches += 1
+            self._latency_total += elapsed
+            self._latency_max = max(self._latency_max, elapsed)
+
+    def flush(self, timeout=5.0):
+        """Send everything pending and stop the worker (used at shutdown)"""
+        with self._cond:
+            self._stopped = True
+            self._cond.notify_all()
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def stats(self) -> dict:
+        with self._cond:
+            depth = len(self._pending)
+        return {
+            "publisher": type(self.publisher).__name__,
+            "queue_depth": depth,
+            "queue_size": self.queue_size,
+            "enqueued": self.enqueued,
+            "coalesced": self.coalesced,
+            "dropped": self.dropped,
+            "sent": self.sent,
+            "batches": self.batches,
+            "failures": self.failures,
+            "send_latency_avg_ms": round(self._latency_total / self.batches * 1000, 3) if self.batches else 0.0,
+            "send_latency_max_ms": round(self._latency_max * 1000, 3),
+        }
+
+dispatcher = Dispatcher(WebPubSubPublisher(client) if client else LocalPublisher())
+atexit.register(dispatcher.flush)
+
+def stats() -> dict:
+    return dispatcher.stats()
+
+# ==================
+# API
+# ==================
+
+def _enqueue(kind: str, order_id: str, status: str):
+    # kind only keys the coalescing; the message keeps its original shape
+    message = {
+        "order_id": order_id,
+        "status": status,
+        "timestamp": str(datetime.now())
+    }
+    dispatcher.submit((kind, order_id), message)
+
 def send_order_update(order_id: str, status: str):
     """
     Send real-time order update to connected clients.
-    Uses Azure Web PubSub if available, otherwise logs.
+    Queued for the background dispatcher; uses Azure Web PubSub if available,
+    otherwise the in-process LocalPublisher.
     """
-    try:
-        message = {
-            "order_id": order_id,
-            "status": status,
-            "timestamp": str(datetime.now())
-        }
-        
-        if client:
-            client.send_to_all(
-                message=json.dumps(message),
-                content_type="application/json"
-            )
-            print(f"✓ Sent update: Order {order_id} → {status}")
-        else:
-            # Fallback: just log it
-            print(f"📢 Order Update: {order_id} → {status}")
-            
-    except Exception as e:
-        print(f"⚠ Could not send real-time update: {e}")
-        # Non-critical, so don't raise
+    _enqueue("order", order_id, status)
 
 def send_inventory_update(order_id: str, status: str):
     """Send inventory-specific update"""
-    send_order_update(order_id, status)
+    _enqueue("inventory", order_id, status)
 
 def send_delivery_update(order_id: str, status: str):
     """Send delivery-specific update"""
-    send_order_update(order_id, status)
-
-from datetime import datetime
\ No newline at end of file
+    _enqueue("delivery", order_id, status)
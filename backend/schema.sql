@@ -12,6 +12,8 @@ IF OBJECT_ID('customers', 'U') IS NOT NULL DROP TABLE customers;
 IF OBJECT_ID('delivery_partners', 'U') IS NOT NULL DROP TABLE delivery_partners;
 IF OBJECT_ID('user_profiles', 'U') IS NOT NULL DROP TABLE user_profiles;
 IF OBJECT_ID('user_activity_logs', 'U') IS NOT NULL DROP TABLE user_activity_logs;
+IF OBJECT_ID('stock_ledger_state', 'U') IS NOT NULL DROP TABLE stock_ledger_state;
+IF OBJECT_ID('revoked_tokens', 'U') IS NOT NULL DROP TABLE revoked_tokens;
 IF OBJECT_ID('inventory_stock', 'U') IS NOT NULL DROP TABLE inventory_stock;
 IF OBJECT_ID('products', 'U') IS NOT NULL DROP TABLE products;
 IF OBJECT_ID('product_categories', 'U') IS NOT NULL DROP TABLE product_categories;
@@ -67,7 +69,7 @@ CREATE TABLE products (
     unit NVARCHAR(20),
     description NVARCHAR(500),
     image_url NVARCHAR(500) NULL,
-    sku NVARCHAR(50) UNIQUE,
+    sku NVARCHAR(50),
     is_active BIT DEFAULT 1,
     created_at DATETIME DEFAULT GETDATE(),
     updated_at DATETIME DEFAULT GETDATE(),
@@ -190,6 +192,7 @@ CREATE TABLE orders (
     out_for_delivery_at DATETIME NULL,
     created_at DATETIME DEFAULT GETDATE(),
     updated_at DATETIME DEFAULT GETDATE(),
+    row_version ROWVERSION,
     FOREIGN KEY (customer_id) REFERENCES customers(customer_id),
     FOREIGN KEY (location_id) REFERENCES inventory_locations(location_id),
     FOREIGN KEY (delivery_partner_id) REFERENCES delivery_partners(partner_id)
@@ -252,6 +255,20 @@ CREATE TABLE user_activity_logs (
     FOREIGN KEY (user_id) REFERENCES users(user_id)
 );
 
+-- 15. STOCK LEDGER STATE (last journal seq written to inventory_stock)
+CREATE TABLE stock_ledger_state (
+    ledger_id NVARCHAR(50) PRIMARY KEY,
+    last_seq BIGINT NOT NULL DEFAULT 0,
+    updated_at DATETIME DEFAULT GETDATE()
+);
+
+-- 16. REVOKED TOKENS (logged-out JWTs, shared by every worker until they expire)
+CREATE TABLE revoked_tokens (
+    token_hash CHAR(64) PRIMARY KEY,   -- hex SHA-256 of the token
+    expires_at DATETIME NOT NULL       -- the token's own exp, UTC
+);
+CREATE INDEX idx_revoked_tokens_expires ON revoked_tokens(expires_at);
+
 -- ============================================
 -- CREATE INDEXES FOR PERFORMANCE
 -- ============================================
@@ -268,6 +285,12 @@ CREATE INDEX idx_orders_status ON orders(status);
 CREATE INDEX idx_orders_date ON orders(order_date);
 CREATE INDEX idx_orders_delivery_partner ON orders(delivery_partner_id);
 CREATE INDEX idx_orders_location ON orders(location_id);
+-- Keyset pagination on (created_at, order_id); delta sync on row_version
+CREATE INDEX idx_orders_customer_created ON orders(customer_id, created_at DESC, order_id DESC);
+CREATE INDEX idx_orders_partner_created ON orders(delivery_partner_id, created_at DESC, order_id DESC);
+CREATE INDEX idx_orders_location_created ON orders(location_id, created_at DESC, order_id DESC);
+CREATE INDEX idx_orders_updated ON orders(updated_at, order_id);
+CREATE INDEX idx_orders_row_version ON orders(row_version);
 
 -- Inventory indexes
 CREATE INDEX idx_inventory_product ON inventory_stock(product_id);
@@ -275,6 +298,8 @@ CREATE INDEX idx_inventory_location ON inventory_stock(location_id);
 
 -- Product indexes
 CREATE INDEX idx_products_category ON products(category_id);
+-- sku is optional: unique among products that have one (a UNIQUE column allows a single NULL)
+CREATE UNIQUE INDEX idx_products_sku ON products(sku) WHERE sku IS NOT NULL;
 
 -- Activity log indexes
 CREATE INDEX idx_activity_user ON user_activity_logs(user_id);
@@ -0,0 +1,530 @@
+import heapq
+import math
+import os
+import re
+import threading
+import time
+import unicodedata
+from bisect import bisect_left, bisect_right, insort
+from collections import OrderedDict
+from datetime import timedelta
+
+import numpy as np
+
+# In-memory product search and catalog browse.
+# An inverted index (term -> {slot: weight}) over product name, category
+# name and description, a sorted vocabulary used as a flattened prefix trie
+# for typeahead, and a delete-variant table for one-typo matching. Each
+# product keeps a fixed integer slot, so a query scores whole posting lists
+# as numpy arrays and per-location stock is a slot-aligned array.
+# Catalog rows are re-indexed incrementally from products.updated_at;
+# stock snapshots are kept current by the write paths in main.py.
+# Browse pages come from per-category sort orders over the same slots, and
+# per-category facet counts (active products, and in stock per location)
+# are maintained as products and stock levels change rather than counted
+# per request.
+
+REFRESH_SECONDS = float(os.getenv("SEARCH_REFRESH_SECONDS", "30"))
+STOCK_TTL_SECONDS = float(os.getenv("SEARCH_STOCK_TTL_SECONDS", "60"))
+INCREMENTAL_OVERLAP = timedelta(seconds=60)   # re-read rows whose transaction committed late
+
+FIELD_WEIGHTS = {"name": 3.0, "category": 2.0, "description": 1.0}
+NAME_START_BONUS = 1.5     # the term opens the product name ("milk" in "Milk 1L")
+PREFIX_QUALITY = 0.85      # "mil" -> "milk"
+TYPO_QUALITY = 0.6         # "mlik" -> "milk"
+PREFIX_EXPANSION = 50      # most common completions considered for the typed prefix
+SHORT_PREFIX_EXPANSION = 10
+MIN_TYPO_LENGTH = 4        # shorter tokens must match exactly (or as a prefix)
+MAX_QUERY_TOKENS = 8
+VOCABULARY_RESORT = 64     # more new terms than this and the vocabulary is re-sorted, not merged
+MATCH_CACHE_SLOTS = 4000000   # total matches kept across cached per-word results (~32MB)
+BROWSE_SCAN = 256          # slots checked per step when an in-stock page skips empty shelves
+
+# sort name -> key of a product dict; keys end in product_id so every position is unique
+BROWSE_SORTS = {
+    "name": lambda p: (p["product_name"].lower(), p["product_id"]),
+    "price_asc": lambda p: (p["price"], p["product_id"]),
+    "price_desc": lambda p: (-p["price"], p["product_id"]),
+}
+
+_TOKEN = re.compile(r"[a-z0-9]+")
+
+def tokenize(text):
+    if not text:
+        return []
+    text = unicodedata.normalize("NFKD", text).encode("ascii", "ignore").decode().lower()
+    return _TOKEN.findall(text)
+
+def _deletes(term):
+    """The term and every variant with one character removed"""
+    return {term} | {term[:i] + term[i + 1:] for i in range(len(term))}
+
+def _within_one_edit(a, b):
+    """Damerau-Levenshtein distance <= 1"""
+    if a == b:
+        return True
+    la, lb = len(a), len(b)
+    if abs(la - lb) > 1:
+        return False
+    i = 0
+    while i < min(la, lb) and a[i] == b[i]:
+        i += 1
+    if la == lb:
+        return a[i + 1:] == b[i + 1:] or (a[i + 1:i + 2] == b[i:i + 1] and a[i:i + 1] == b[i + 1:i + 2] and a[i + 2:] == b[i + 2:])
+    return a[i + 1:] == b[i:] if la > lb else a[i:] == b[i + 1:]
+
+class SearchIndex:
+    def __init__(self, refresh_seconds=REFRESH_SECONDS, stock_ttl=STOCK_TTL_SECONDS):
+        self.refresh_seconds = refresh_seconds
+        self.stock_ttl = stock_ttl
+        self._lock = threading.RLock()
+        self._slots = {}        # product_id -> slot, kept for the life of the process
+        self._docs = []         # slot -> product dict, None while inactive
+        self._doc_terms = {}    # slot -> {term: weight}
+        self._postings = {}     # term -> {slot: weight}
+        self._arrays = {}       # term -> (slots, weights) numpy cache of _postings[term]
+        self._terms = []        # sorted vocabulary, for prefix ranges
+        self._new_terms = set() # added since _terms was last sorted
+        self._matches = OrderedDict()   # (token, as_prefix) -> (slots, scores), LRU; cleared on any upsert
+        self._matches_size = 0
+        self._variants = {}     # delete variant -> {term}
+        self._stock = {}        # location_id -> int32 array of quantity_available by slot
+        self._stock_loaded_at = {}
+        self._totals = {}       # category_id -> active products
+        self._in_stock = {}     # location_id -> {category_id: active products with stock > 0}
+        self._category_names = {}
+        self._orders = {}       # (category_id or None, sort) -> (keys, slots) for browse
+        self._high_water = None     # max products.updated_at indexed
+        self._checked_at = None
+        self._dirty = False
+        self.active = 0
+        self.queries = 0
+        self.refreshes = 0
+
+    # ---- indexing ----
+
+    def _weights(self, product):
+        weights = {}
+        for field, text in (("name", product["product_name"]), ("category", product.get("category_name")),
+                            ("description", product.get("description"))):
+            for position, term in enumerate(tokenize(text)):
+                weight = FIELD_WEIGHTS[field]
+                if field == "name" and position == 0:
+                    weight *= NAME_START_BONUS
+                if weight > weights.get(term, 0):
+                    weights[term] = weight
+        return weights
+
+    def _add_term(self, term):
+        self._new_terms.add(term)
+        for variant in _deletes(term):
+            self._variants.setdefault(variant, set()).add(term)
+
+    def _remove_term(self, term):
+        if term in self._new_terms:
+            self._new_terms.discard(term)
+        else:
+            i = bisect_left(self._terms, term)
+            if i < len(self._terms) and self._terms[i] == term:
+                del self._terms[i]
+        for variant in _deletes(term):
+            terms = self._variants.get(variant)
+            if terms is not None:
+                terms.discard(term)
+                if not terms:
+                    del self._variants[variant]
+
+    def _vocabulary(self):
+        if self._new_terms:
+            if len(self._new_terms) > VOCABULARY_RESORT:
+                self._terms = sorted(self._postings)
+            else:
+                for term in self._new_terms:
+                    insort(self._terms, term)
+            self._new_terms.clear()
+        return self._terms
+
+    def _unindex(self, slot):
+        for term in self._doc_terms.pop(slot, {}):
+            postings = self._postings[term]
+            postings.pop(slot, None)
+            self._arrays.pop(term, None)
+            if not postings:
+                del self._postings[term]
+                self._remove_term(term)
+        if self._docs[slot] is not None:
+            self._count(slot, -1)
+            self._docs[slot] = None
+            self.active -= 1
+
+    def upsert(self, product):
+        """Index (or re-index) one product dict; inactive products are removed"""
+        with self._lock:
+            slot = self._slots.get(product["product_id"])
+            if slot is None:
+                slot = self._slots[product["product_id"]] = len(self._docs)
+                self._docs.append(None)
+            old = self._docs[slot]
+            self._unindex(slot)
+            self._matches.clear()
+            self._matches_size = 0
+            active = product.get("is_active", True)
+            self._reorder(slot, old, product if active else None)
+            if not active:
+                return
+            weights = self._weights(product)
+            self._docs[slot] = product
+            self.active += 1
+            self._count(slot, 1)
+            if product.get("category_name"):
+                self._category_names[product["category_id"]] = product["category_name"]
+            self._doc_terms[slot] = weights
+            for term, weight in weights.items():
+                postings = self._postings.get(term)
+                if postings is None:
+                    postings = self._postings[term] = {}
+                    self._add_term(term)
+                postings[slot] = weight
+                self._arrays.pop(term, None)
+
+    def _load_rows(self, rows):
+        for row in rows:
+            self.upsert({
+                "product_id": row[0],
+                "product_name": row[1],
+                "category_id": row[2],
+                "price": float(row[3]),
+                "unit": row[4],
+                "description": row[5],
+                "image_url": row[6],
+                "is_active": bool(row[7]),
+                "category_name": row[9],
+            })
+            if row[8] is not None and (self._high_water is None or row[8] > self._high_water):
+                self._high_water = row[8]
+
+    def needs_refresh(self) -> bool:
+        return (self._checked_at is None or self._dirty
+                or time.monotonic() - self._checked_at > self.refresh_seconds)
+
+    def refresh(self, conn):
+        """Full load the first time, then only products changed since the last refresh"""
+        query = """
+            SELECT p.product_id, p.product_name, p.category_id, p.price, p.unit, p.description,
+                   p.image_url, p.is_active, p.updated_at, c.category_name
+            FROM products p
+            LEFT JOIN product_categories c ON p.category_id = c.category_id
+        """
+        params = ()
+        if self._high_water is not None:
+            query += " WHERE p.updated_at >= ?"
+            params = (self._high_water - INCREMENTAL_OVERLAP,)
+        self._dirty = False
+        cur = conn.cursor()
+        try:
+            cur.execute(query, params)
+            rows = cur.fetchall()
+        finally:
+            cur.close()
+        with self._lock:
+            self._load_rows(rows)
+            self._vocabulary()
+            self._checked_at = time.monotonic()
+            self.refreshes += 1
+
+    def mark_dirty(self):
+        """Products were written; pick the changes up on the next query"""
+        self._dirty = True
+
+    # ---- stock ----
+
+    def needs_stock(self, location_id) -> bool:
+        loaded_at = self._stock_loaded_at.get(location_id)
+        return loaded_at is None or time.monotonic() - loaded_at > self.stock_ttl
+
+    def load_stock(self, location_id, conn):
+        cur = conn.cursor()
+        try:
+            cur.execute("SELECT product_id, quantity_available FROM inventory_stock WHERE location_id = ?", (location_id,))
+            rows = cur.fetchall()
+        finally:
+            cur.close()
+        with self._lock:
+            stock = np.zeros(len(self._docs), dtype=np.int32)
+            counts = {}
+            for product_id, quantity in rows:
+                slot = self._slots.get(product_id)
+                if slot is not None:
+                    stock[slot] = quantity or 0
+                    doc = self._docs[slot]
+                    if doc is not None and stock[slot] > 0:
+                        counts[doc["category_id"]] = counts.get(doc["category_id"], 0) + 1
+            self._stock[location_id] = stock
+            self._in_stock[location_id] = counts
+            self._stock_loaded_at[location_id] = time.monotonic()
+
+    def _count(self, slot, step):
+        """Add (1) or remove (-1) an active product's slot in the facet counts"""
+        category_id = self._docs[slot]["category_id"]
+        self._totals[category_id] = self._totals.get(category_id, 0) + step
+        for location_id, stock in self._stock.items():
+            if slot < len(stock) and stock[slot] > 0:
+                counts = self._in_stock[location_id]
+                counts[category_id] = counts.get(category_id, 0) + step
+
+    def _set_level(self, location_id, product_id, quantity):
+        slot = self._slots.get(product_id)
+        if slot is None:
+            return
+        stock = self._stock[location_id]
+        if slot >= len(stock):
+            stock = self._stock[location_id] = np.concatenate(
+                [stock, np.zeros(len(self._docs) - len(stock), dtype=np.int32)])
+        was_in_stock = stock[slot] > 0
+        stock[slot] = quantity
+        doc = self._docs[slot]
+        if doc is not None and was_in_stock != (quantity > 0):
+            counts = self._in_stock[location_id]
+            counts[doc["category_id"]] = counts.get(doc["category_id"], 0) + (1 if quantity > 0 else -1)
+
+    def adjust_stock(self, location_id, cart):
+        """Apply a checkout ({product_id: qty}) to a loaded snapshot"""
+        with self._lock:
+            stock = self._stock.get(location_id)
+            if stock is not None:
+                for product_id, qty in cart.items():
+                    slot = self._slots.get(product_id)
+                    current = int(stock[slot]) if slot is not None and slot < len(stock) else 0
+                    self._set_level(location_id, product_id, current - qty)
+
+    def set_stock(self, location_id, levels):
+        """Record new quantity_available values ({product_id: qty}) written for a location"""
+        with self._lock:
+            if location_id in self._stock:
+                for product_id, quantity in levels.items():
+                    self._set_level(location_id, product_id, quantity)
+
+    def invalidate_stock(self, location_id=None):
+        with self._lock:
+            if location_id is None:
+                self._stock_loaded_at.clear()
+            else:
+                self._stock_loaded_at.pop(location_id, None)
+
+    # ---- querying ----
+
+    def _posting_arrays(self, term):
+        """(slots, weights) of a term as numpy arrays, highest weight first"""
+        arrays = self._arrays.get(term)
+        if arrays is None:
+            postings = self._postings[term]
+            slots = np.fromiter(postings.keys(), dtype=np.int32, count=len(postings))
+            weights = np.fromiter(postings.values(), dtype=np.float32, count=len(postings))
+            order = np.argsort(-weights, kind="stable")
+            arrays = self._arrays[term] = (slots[order], weights[order])
+        return arrays
+
+    def _candidates(self, token, as_prefix):
+        """Index terms a query token may stand for, as {term: match quality}"""
+        candidates = {}
+        if token in self._postings:
+            candidates[token] = 1.0
+        if as_prefix:
+            terms = self._vocabulary()
+            lo = bisect_left(terms, token)
+            hi = bisect_left(terms, token + "\x7f", lo)
+            expansion = SHORT_PREFIX_EXPANSION if len(token) < 2 else PREFIX_EXPANSION
+            completions = terms[lo:hi]
+            if len(completions) > expansion:
+                completions = heapq.nlargest(expansion, completions, key=lambda t: len(self._postings[t]))
+            for term in completions:
+                candidates.setdefault(term, PREFIX_QUALITY)
+        if not candidates and len(token) >= MIN_TYPO_LENGTH:
+            for variant in _deletes(token):
+                for term in self._variants.get(variant, ()):
+                    if _within_one_edit(token, term):
+                        candidates.setdefault(term, TYPO_QUALITY)
+        return candidates
+
+    def _boosts(self, candidates):
+        n_docs = max(self.active, 1)
+        for term, quality in candidates.items():
+            slots, weights = self._posting_arrays(term)
+            yield slots, weights, math.log(1 + n_docs / len(slots)) * quality
+
+    def _token_matches(self, token, as_prefix, candidates):
+        """(slots ascending, best score per slot) over the terms a query word may stand for"""
+        key = (token, as_prefix)
+        cached = self._matches.get(key)
+        if cached is not None:
+            self._matches.move_to_end(key)
+            return cached
+        scores = np.zeros(len(self._docs), dtype=np.float32)
+        for slots, weights, boost in self._boosts(candidates):
+            scores[slots] = np.maximum(scores[slots], weights * boost)
+        slots = np.flatnonzero(scores > 0)
+        cached = self._matches[key] = (slots, scores[slots])
+        self._matches_size += len(slots)
+        while self._matches_size > MATCH_CACHE_SLOTS and len(self._matches) > 1:
+            _, (evicted, _) = self._matches.popitem(last=False)
+            self._matches_size -= len(evicted)
+        return cached
+
+    def _top_single(self, candidates, limit, stock):
+        """
+        One-word queries: only the head of each weight-ordered posting list is read, growing
+        until the limit-th best seen score beats anything still unread (threshold algorithm).
+        stock, when given, drops slots with nothing on the shelf.
+        """
+        lists = list(self._boosts(candidates))
+        depth = limit * 4
+        while True:
+            bound = 0.0
+            for slots, weights, boost in lists:
+                if len(slots) > depth:
+                    bound = max(bound, (weights[depth:depth + 1] * boost)[0])   # float32, like the scores
+            hits = np.concatenate([slots[:depth] for slots, _, _ in lists])
+            total = np.concatenate([weights[:depth] * boost for _, weights, boost in lists])
+            order = np.argsort(-total, kind="stable")
+            hits, first = np.unique(hits[order], return_index=True)    # first sighting = the slot's best score
+            total = total[order][first]
+            if stock is not None:
+                keep = hits < len(stock)
+                keep[keep] = stock[hits[keep]] > 0
+                hits, total = hits[keep], total[keep]
+            if not bound or (len(total) >= limit and np.partition(total, len(total) - limit)[len(total) - limit] >= bound):
+                return hits, total
+            depth *= 4
+
+    def search(self, query, limit=10, location_id=None, in_stock=False):
+        """[(score, product dict, quantity_available or None)] best first; every query word must match"""
+        tokens = tokenize(query)[:MAX_QUERY_TOKENS]
+        if not tokens:
+            return []
+        prefix_last = not query[-1:].isspace()
+        with self._lock:
+            self.queries += 1
+            stock = self._stock.get(location_id) if location_id is not None else None
+            per_token = []
+            for i, token in enumerate(tokens):
+                as_prefix = prefix_last and i == len(tokens) - 1
+                candidates = self._candidates(token, as_prefix)
+                if not candidates:
+                    return []
+                per_token.append((token, as_prefix, candidates))
+
+            if len(per_token) == 1:
+                hits, total = self._top_single(per_token[0][2], limit, stock if in_stock else None)
+            else:
+                # every word must match: start from the rarest and keep the slots each next word matches too
+                matches = sorted((self._token_matches(*word) for word in per_token), key=lambda m: len(m[0]))
+                hits, total = matches[0]
+                for slots, scores in matches[1:]:
+                    at = np.minimum(np.searchsorted(slots, hits), len(slots) - 1)
+                    keep = slots[at] == hits
+                    hits, total = hits[keep], total[keep] + scores[at[keep]]
+                    if not len(hits):
+                        return []
+
+            if stock is not None:
+                quantities = np.zeros(len(hits), dtype=np.int32)
+                known = hits < len(stock)    # products indexed after the snapshot count as 0
+                quantities[known] = stock[hits[known]]
+                if in_stock:
+                    keep = quantities > 0
+                    hits, total, quantities = hits[keep], total[keep], quantities[keep]
+
+            if len(hits) > limit:
+                top = np.argpartition(-total, limit - 1)[:limit]
+            else:
+                top = np.arange(len(hits))
+            docs = self._docs
+            best = sorted(top.tolist(), key=lambda j: (-total[j], docs[hits[j]]["product_name"]))
+            return [(float(total[j]), docs[hits[j]], int(quantities[j]) if stock is not None else None)
+                    for j in best]
+
+    # ---- browsing ----
+
+    def _order(self, category_id, sort):
+        """(keys, slots) of the category's active products (all when None) in sort order"""
+        order = self._orders.get((category_id, sort))
+        if order is None:
+            if category_id is not None and not self._totals.get(category_id):
+                return [], []   # unknown or empty category: not cached, so any id can't grow _orders
+            key = BROWSE_SORTS[sort]
+            ranked = sorted((key(doc), slot) for slot, doc in enumerate(self._docs)
+                            if doc is not None and (category_id is None or doc["category_id"] == category_id))
+            order = self._orders[(category_id, sort)] = ([k for k, _ in ranked], [slot for _, slot in ranked])
+        return order
+
+    def _reorder(self, slot, old, new):
+        """Move a product within the cached sort orders (old/new: product dicts or None)"""
+        for (category_id, sort), (keys, slots) in self._orders.items():
+            key = BROWSE_SORTS[sort]
+            if old is not None and category_id in (None, old["category_id"]):
+                i = bisect_left(keys, key(old))
+                if i < len(keys) and slots[i] == slot:
+                    del keys[i], slots[i]
+            if new is not None and category_id in (None, new["category_id"]):
+                i = bisect_left(keys, key(new))
+                keys.insert(i, key(new))
+                slots.insert(i, slot)
+
+    def browse(self, category_id=None, sort="name", after=None, limit=20, location_id=None, in_stock=False):
+        """
+        One page in sort order, starting after the key `after` (from a previous page).
+        Returns ([(product dict, quantity_available or None)], key of the last row or None when done).
+        """
+        with self._lock:
+            keys, slots = self._order(category_id, sort)
+            start = bisect_right(keys, tuple(after)) if after else 0
+            stock = self._stock.get(location_id) if location_id is not None else None
+            if in_stock and stock is not None:
+                # walk forward in growing steps until the page (and one more row) has stock
+                positions, step = [], BROWSE_SCAN
+                while len(positions) <= limit and start < len(slots):
+                    window = np.array(slots[start:start + step], dtype=np.int32)
+                    shelf = np.zeros(len(window), dtype=bool)
+                    known = window < len(stock)
+                    shelf[known] = stock[window[known]] > 0
+                    positions.extend((start + np.flatnonzero(shelf)).tolist())
+                    start += step
+                    step *= 2
+            else:
+                positions = list(range(start, min(start + limit + 1, len(slots))))
+            more = len(positions) > limit
+            positions = positions[:limit]
+            rows = []
+            for i in positions:
+                slot = slots[i]
+                quantity = None
+                if stock is not None:
+                    quantity = int(stock[slot]) if slot < len(stock) else 0
+                rows.append((self._docs[slot], quantity))
+            return rows, (keys[positions[-1]] if more else None)
+
+    def facets(self, location_id=None):
+        """[{category_id, category_name, total, in_stock}] for categories with active products"""
+        with self._lock:
+            counts = self._in_stock.get(location_id) if location_id is not None else None
+            return [
+                {
+                    "category_id": category_id,
+                    "category_name": self._category_names.get(category_id),
+                    "total": total,
+                    "in_stock": counts.get(category_id, 0) if counts is not None else None,
+                }
+                for category_id, total in sorted(self._totals.items()) if total > 0
+            ]
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "products": self.active,
+                "terms": len(self._postings),
+                "stock_locations": len(self._stock),
+                "queries": self.queries,
+                "refreshes": self.refreshes,
+            }
+
+index = SearchIndex()
@@ -0,0 +1,204 @@
+import os
+import re
+import sqlite3
+import threading
+from datetime import date, datetime
+from decimal import Decimal
+from functools import lru_cache
+
+# Local SQLite stand-in for the SQL Server database (DB_BACKEND=sqlite).
+# The database file is built from schema.sql (tables, indexes and seed data)
+# the first time a connection is opened. Statements are translated on the
+# way in, for the few T-SQL constructs the handlers use: SELECT TOP n,
+# ISNULL, GETDATE() and @@IDENTITY. UPDATE ... FROM (subquery) is already
+# valid SQLite. ROWVERSION columns become integers bumped by triggers, and
+# MIN_ACTIVE_ROWVERSION() is "no open writers": SQLite commits one at a time. Column values come back as pyodbc returns them: DATETIME as
+# datetime, BIT as bool, DECIMAL as Decimal. Meant for local runs and load
+# tests, not production: SQLite allows one writer at a time.
+
+PATH = os.getenv("SQLITE_PATH", "quickpick_local.sqlite3")
+SCHEMA_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "schema.sql")
+BUSY_TIMEOUT = float(os.getenv("SQLITE_BUSY_TIMEOUT", "10"))   # seconds a writer waits for the lock
+
+# same exception hierarchy names as pyodbc, so callers can catch db.Error / db.IntegrityError
+Error = sqlite3.Error
+IntegrityError = sqlite3.IntegrityError
+ProgrammingError = sqlite3.ProgrammingError
+
+# GETDATE() with millisecond precision, in the text format the datetime adapter writes
+NOW_SQL = "strftime('%Y-%m-%d %H:%M:%f', 'now')"
+
+_TOP = re.compile(r"^\s*SELECT\s+TOP\s+\(?(\d+)\)?\s+", re.IGNORECASE)
+_ISNULL = re.compile(r"\bISNULL\s*\(", re.IGNORECASE)
+_GETDATE = re.compile(r"\bGETDATE\(\)", re.IGNORECASE)
+_IDENTITY = re.compile(r"@@IDENTITY\b", re.IGNORECASE)
+_MIN_ACTIVE_ROWVERSION = re.compile(r"\bMIN_ACTIVE_ROWVERSION\(\)", re.IGNORECASE)
+_CREATE_TABLE = re.compile(r"^\s*CREATE TABLE (\w+)", re.IGNORECASE)
+_ROWVERSION = re.compile(r"^\s*(\w+) ROWVERSION\b", re.IGNORECASE)
+
+# each write stamps the row one past the table's highest version, as SQL Server's counter would
+_ROWVERSION_TRIGGERS = """
+CREATE TRIGGER {table}_{column}_insert AFTER INSERT ON {table}
+BEGIN
+    UPDATE {table} SET {column} = (SELECT MAX({column}) FROM {table}) + 1 WHERE rowid = NEW.rowid;
+END;
+CREATE TRIGGER {table}_{column}_update AFTER UPDATE ON {table} WHEN NEW.{column} = OLD.{column}
+BEGIN
+    UPDATE {table} SET {column} = (SELECT MAX({column}) FROM {table}) + 1 WHERE rowid = NEW.rowid;
+END;
+"""
+
+@lru_cache(maxsize=4096)
+def translate(sql: str) -> str:
+    """T-SQL statement -> SQLite; cached, the handlers' SQL is mostly a fixed set of strings"""
+    text = _ISNULL.sub("IFNULL(", sql)
+    text = _GETDATE.sub(NOW_SQL, text)
+    text = _IDENTITY.sub("last_insert_rowid()", text)
+    text = _MIN_ACTIVE_ROWVERSION.sub("9223372036854775807", text)
+    top = _TOP.match(text)
+    if top:
+        text = "SELECT " + text[top.end():].rstrip().rstrip(";") + f" LIMIT {top.group(1)}"
+    return text
+
+def schema_script(source: str) -> str:
+    """schema.sql as an SQLite script: identity and rowversion columns, defaults and DECLAREd seed ids rewritten"""
+    variables = {}
+    lines = []
+    triggers = []
+    table = None
+    for line in source.splitlines():
+        stripped = line.strip()
+        created = _CREATE_TABLE.match(line)
+        if created:
+            table = created.group(1)
+        versioned = _ROWVERSION.match(line)
+        if versioned:
+            triggers.append(_ROWVERSION_TRIGGERS.format(table=table, column=versioned.group(1)))
+            line = line.replace("ROWVERSION", "INTEGER NOT NULL DEFAULT 0")
+        if stripped.startswith("IF OBJECT_ID("):
+            continue   # fresh database, nothing to drop
+        if stripped.startswith("DECLARE "):
+            literal = re.match(r"DECLARE\s+(@\w+)\s+\w+(?:\(\d+\))?\s*=\s*('[^']*')\s*;", stripped)
+            if literal:
+                variables[literal.group(1)] = literal.group(2)
+            continue
+        line = re.sub(r"\bINT PRIMARY KEY IDENTITY\(1,\s*1\)", "INTEGER PRIMARY KEY AUTOINCREMENT", line)
+        line = re.sub(r"DEFAULT GETDATE\(\)", f"DEFAULT ({NOW_SQL})", line)
+        line = line.replace("(MAX)", "")
+        for name, value in variables.items():
+            line = re.sub(re.escape(name) + r"\b", value, line)
+        lines.append(line)
+        if triggers and stripped.startswith(");"):
+            lines.extend(triggers)   # before any seed rows are inserted
+            triggers = []
+    return "\n".join(lines)
+
+def _adapt_datetime(value):
+    return value.isoformat(" ", timespec="milliseconds")
+
+def _convert_datetime(raw):
+    return datetime.fromisoformat(raw.decode())
+
+def _convert_decimal(raw):
+    # every DECIMAL column in schema.sql has scale 2; pyodbc returns them as Decimal('30.00')
+    return Decimal(raw.decode()).quantize(Decimal("0.01"))
+
+sqlite3.register_adapter(datetime, _adapt_datetime)
+sqlite3.register_adapter(date, date.isoformat)
+sqlite3.register_adapter(Decimal, float)
+sqlite3.register_converter("DATETIME", _convert_datetime)
+sqlite3.register_converter("DATE", lambda raw: date.fromisoformat(raw.decode()))
+sqlite3.register_converter("BIT", lambda raw: raw not in (b"0", b""))
+sqlite3.register_converter("DECIMAL", _convert_decimal)
+
+_build_lock = threading.Lock()
+
+# shared with the async server's aiosqlite connections (aio_db.py)
+CONNECT_ARGS = {"timeout": BUSY_TIMEOUT, "detect_types": sqlite3.PARSE_DECLTYPES,
+                "check_same_thread": False}   # the pool hands connections between threads
+PRAGMAS = ("PRAGMA foreign_keys = ON", "PRAGMA synchronous = NORMAL")
+
+def ensure_database(path):
+    """Build the database file from schema.sql unless it exists"""
+    with _build_lock:
+        if os.path.exists(path):
+            return
+        building = f"{path}.{os.getpid()}.tmp"
+        with open(SCHEMA_PATH, encoding="utf-8") as f:
+            script = schema_script(f.read())
+        raw = sqlite3.connect(building)
+        try:
+            raw.execute("PRAGMA journal_mode = WAL")
+            raw.executescript(script)
+            raw.commit()
+        finally:
+            raw.close()
+        os.replace(building, path)   # another process may have built it meanwhile; either copy will do
+
+def connect(path=None):
+    """A pyodbc-style connection to the local database, built from schema.sql on first use"""
+    path = path or PATH
+    ensure_database(path)
+    raw = sqlite3.connect(path, **CONNECT_ARGS)
+    for pragma in PRAGMAS:
+        raw.execute(pragma)
+    return Connection(raw)
+
+class Connection:
+    """The subset of pyodbc.Connection the app uses"""
+
+    def __init__(self, raw):
+        self._raw = raw
+
+    def cursor(self):
+        return Cursor(self._raw.cursor())
+
+    def commit(self):
+        self._raw.commit()
+
+    def rollback(self):
+        self._raw.rollback()
+
+    def close(self):
+        self._raw.close()
+
+class Cursor:
+    """The subset of pyodbc.Cursor the app uses, translating T-SQL on the way in"""
+
+    def __init__(self, cur):
+        self._cur = cur
+        self.fast_executemany = False   # accepted for pyodbc compatibility; executemany is always batched here
+
+    @property
+    def description(self):
+        return self._cur.description
+
+    @property
+    def rowcount(self):
+        return self._cur.rowcount
+
+    def execute(self, sql, *params):
+        # pyodbc takes parameters as one sequence or spread out
+        if len(params) == 1 and isinstance(params[0], (list, tuple)):
+            params = params[0]
+        self._cur.execute(translate(sql), params)
+        return self
+
+    def executemany(self, sql, rows):
+        self._cur.executemany(translate(sql), rows)
+        return self
+
+    def fetchone(self):
+        return self._cur.fetchone()
+
+    def fetchmany(self, size=None):
+        return self._cur.fetchmany(size) if size is not None else self._cur.fetchmany()
+
+    def fetchall(self):
+        return self._cur.fetchall()
+
+    def __iter__(self):
+        return iter(self._cur)
+
+    def close(self):
+        self._cur.close()
@@ -0,0 +1,443 @@
+import os
+import json
+import time
+import atexit
+import threading
+from contextlib import contextmanager
+
+import db
+
+# In-memory stock reservation ledger.
+# Checkout reserves against per-(location, product) counters held here, so a
+# hot SKU costs a dictionary update instead of a row lock held for the whole
+# order transaction. Each reservation is appended to a journal and fsynced
+# (group commit) before it is acknowledged; a background writer folds the
+# accumulated deltas into inventory_stock in batched UPDATEs, recording the
+# last journal seq it covered in stock_ledger_state in the same transaction.
+# After a crash, recover() re-applies journaled reservations past that seq.
+#
+# Off by default. The counters are authoritative for the one process that
+# owns them, so only enable it where a single process serves every checkout
+# for its stores (one worker, not a prefork pool): workers with their own
+# counters would each sell the same units. That process needs its own
+# STOCK_LEDGER_ID and STOCK_LEDGER_JOURNAL; the journal is locked on first
+# use, and a second process (or a forked worker) pointed at it fails loudly
+# instead of replaying someone else's reservations. Writes to
+# inventory_stock from elsewhere are picked up via invalidate() or the
+# periodic reload.
+
+ENABLED = os.getenv("STOCK_LEDGER", "0") == "1"
+JOURNAL_PATH = os.getenv("STOCK_LEDGER_JOURNAL", os.path.join(os.path.dirname(os.path.abspath(__file__)), "stock_ledger.journal"))
+FLUSH_SECONDS = float(os.getenv("STOCK_LEDGER_FLUSH_MS", "100")) / 1000
+RELOAD_SECONDS = float(os.getenv("STOCK_LEDGER_RELOAD_SECONDS", "300"))
+LEDGER_ID = os.getenv("STOCK_LEDGER_ID", "")          # one row in stock_ledger_state per ledger process
+JOURNAL_MAX_BYTES = 16 * 1024 * 1024                  # compact the journal past this size
+FLUSH_CHUNK = 500   # 4 parameters per row, under SQL Server's 2100 limit
+
+def delta_update_sql(n: int) -> str:
+    """UPDATE applying n (product_id, location_id, d_available, d_reserved) parameter rows as deltas"""
+    rows = " UNION ALL ".join(
+        ["SELECT ? AS product_id, ? AS location_id, ? AS d_available, ? AS d_reserved"] + ["SELECT ?, ?, ?, ?"] * (n - 1))
+    return f"""
+        UPDATE inventory_stock
+        SET quantity_available = inventory_stock.quantity_available + d.d_available,
+            quantity_reserved = inventory_stock.quantity_reserved + d.d_reserved,
+            last_updated = GETDATE()
+        FROM ({rows}) d
+        WHERE inventory_stock.product_id = d.product_id AND inventory_stock.location_id = d.location_id
+    """
+
+class Journal:
+    """Append-only JSON-lines file with group-commit fsync"""
+
+    def __init__(self, path):
+        self.path = path
+        self._file = None
+        self._cond = threading.Condition()
+        self._buffer = []
+        self._written = 0     # highest seq handed to the syncer
+        self._synced = 0      # highest seq known to be on disk
+        self._syncing = False
+        self.syncs = 0
+
+    def _open(self):
+        if self._file is None:
+            self._file = open(self.path, "a", encoding="utf-8")
+
+    def append(self, seq, record):
+        """Queue a record; caller must make sure seqs are appended in order"""
+        with self._cond:
+            self._buffer.append(json.dumps({"seq": seq, **record}, separators=(",", ":")))
+            self._written = seq
+
+    def wait_durable(self, seq):
+        """Block until seq is fsynced; whoever arrives first syncs everything buffered so far"""
+        with self._cond:
+            while self._synced < seq:
+                if self._syncing:
+                    self._cond.wait()
+                    continue
+                lines, upto = self._buffer, self._written
+                self._buffer = []
+                self._syncing = True
+                self._cond.release()
+                try:
+                    self._open()
+                    self._file.write("\n".join(lines) + "\n")
+                    self._file.flush()
+                    os.fsync(self._file.fileno())
+                finally:
+                    self._cond.acquire()
+                    self._syncing = False
+                self._synced = upto
+                self.syncs += 1
+                self._cond.notify_all()
+
+    def read(self):
+        """All records currently on disk (a torn last line from a crash is skipped)"""
+        if not os.path.exists(self.path):
+            return []
+        records = []
+        with open(self.path, encoding="utf-8") as f:
+            for line in f:
+                try:
+                    records.append(json.loads(line))
+                except json.JSONDecodeError:
+                    break
+        return records
+
+    def size(self) -> int:
+        try:
+            return os.path.getsize(self.path)
+        except OSError:
+            return 0
+
+    def compact(self, after_seq):
+        """Rewrite the file keeping only records past after_seq (everything else is in the database)"""
+        with self._cond:
+            while self._syncing:
+                self._cond.wait()
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+            kept = [json.dumps(r, separators=(",", ":")) for r in self.read() if r.get("seq", 0) > after_seq]
+            kept += [line for line in self._buffer if json.loads(line)["seq"] > after_seq]
+            self._buffer = []
+            tmp = self.path + ".tmp"
+            with open(tmp, "w", encoding="utf-8") as f:
+                if kept:
+                    f.write("\n".join(kept) + "\n")
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp, self.path)
+            self._synced = self._written
+            self._cond.notify_all()
+
+class StockLedger:
+    def __init__(self, journal_path=JOURNAL_PATH, flush_seconds=FLUSH_SECONDS,
+                 reload_seconds=RELOAD_SECONDS, pool=None):
+        self.journal = Journal(journal_path)
+        self.flush_seconds = flush_seconds
+        self.reload_seconds = reload_seconds
+        self.pool = pool or db.pool
+
+        self._lock = threading.RLock()          # counters, pending deltas and seq (re-entered under hold())
+        self._flush_lock = threading.Lock()     # one database write (or reload) at a time
+        self._stock = {}        # location_id -> {product_id: [available, reserved]}
+        self._loaded_at = {}    # location_id -> monotonic time, dropped by invalidate()
+        self._pending = {}      # (location_id, product_id) -> [d_available, d_reserved] not yet in the database
+        self._seq = 0
+        self._recovered = False
+        self._owner_pid = None  # process holding the journal lock
+        self._journal_lock = None
+        self._wake = threading.Event()
+        self._thread = None
+        self.on_flushed = None  # called with {location_id: {product_id: available}} once deltas are committed
+        self._stopped = False
+
+        # metrics
+        self.reservations = 0
+        self.rejections = 0
+        self.flushes = 0
+        self.flushed_rows = 0
+        self.failures = 0
+        self.reloads = 0
+
+    # ---- loading & recovery ----
+
+    def _claim(self):
+        """Make this process the journal's only user, or refuse to run"""
+        if self._owner_pid == os.getpid():
+            return
+        if not LEDGER_ID:
+            raise RuntimeError("STOCK_LEDGER=1 needs a STOCK_LEDGER_ID unique to this process")
+        try:
+            import fcntl
+        except ImportError:
+            fcntl = None   # no flock (Windows): one process per journal by configuration only
+        if fcntl is not None:
+            f = open(self.journal.path + ".lock", "a")
+            try:
+                fcntl.flock(f, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except OSError:
+                f.close()
+                raise RuntimeError(f"Stock ledger journal {self.journal.path} is in use by another process; "
+                                   "give each process its own STOCK_LEDGER_JOURNAL and STOCK_LEDGER_ID")
+            self._journal_lock = f
+        self._owner_pid = os.getpid()
+
+    def recover(self, conn):
+        """Apply journaled reservations that never reached the database"""
+        with self._flush_lock:
+            self._claim()
+            if self._recovered:
+                return 0
+            cur = conn.cursor()
+            try:
+                cur.execute("SELECT last_seq FROM stock_ledger_state WHERE ledger_id = ?", (LEDGER_ID,))
+                row = cur.fetchone()
+            finally:
+                cur.close()
+            checkpoint = row[0] if row else 0
+
+            deltas, last_seq = {}, checkpoint
+            for record in self.journal.read():
+                if record["seq"] <= checkpoint:
+                    continue
+                last_seq = max(last_seq, record["seq"])
+                sign = -1 if record.get("release") else 1
+                for product_id, qty in record["items"].items():
+                    d = deltas.setdefault((record["location_id"], product_id), [0, 0])
+                    d[0] -= sign * qty
+                    d[1] += sign * qty
+            if deltas:
+                self._write(conn, deltas, last_seq)
+                conn.commit()
+                print(f"Stock ledger: recovered {len(deltas)} stock rows from the journal (seq {checkpoint + 1}..{last_seq})")
+            self.journal.compact(last_seq)
+            with self._lock:
+                self._seq = max(self._seq, last_seq)
+            self._recovered = True
+            return len(deltas)
+
+    def _ensure_loaded(self, location_id, conn):
+        loaded_at = self._loaded_at.get(location_id)
+        if loaded_at is not None and time.monotonic() - loaded_at < self.reload_seconds:
+            return
+        if not self._recovered:
+            self.recover(conn)
+        with self._flush_lock:   # no delta is half-written while we read
+            loaded_at = self._loaded_at.get(location_id)
+            if loaded_at is not None and time.monotonic() - loaded_at < self.reload_seconds:
+                return   # another thread loaded it while we waited
+            cur = conn.cursor()
+            try:
+                cur.execute("SELECT product_id, quantity_available, quantity_reserved FROM inventory_stock WHERE location_id = ?",
+                            (location_id,))
+                rows = cur.fetchall()
+            finally:
+                cur.close()
+            with self._lock:
+                stock = {row[0]: [row[1] or 0, row[2] or 0] for row in rows}
+                for (loc, product_id), (d_available, d_reserved) in self._pending.items():
+                    if loc == location_id and product_id in stock:
+                        stock[product_id][0] += d_available
+                        stock[product_id][1] += d_reserved
+                self._stock[location_id] = stock
+                self._loaded_at[location_id] = time.monotonic()
+                self.reloads += 1
+
+    def invalidate(self, location_id=None):
+        """Stock was written outside the ledger; reload the location (or all) on next use"""
+        with self._lock:
+            if location_id is None:
+                self._loaded_at.clear()
+            else:
+                self._loaded_at.pop(location_id, None)
+
+    # ---- reservations ----
+
+    def reserve(self, location_id, cart, conn):
+        """
+        Atomically move cart quantities ({product_id: qty}) from available to reserved.
+        Returns None on success, else the first product_id that is short.
+        The reservation is durable in the journal when this returns.
+        """
+        if self._owner_pid != os.getpid():
+            self.recover(conn)   # first reservation in this process: claim the journal
+        self._ensure_loaded(location_id, conn)
+        with self._lock:
+            stock = self._stock[location_id]
+            for product_id, qty in cart.items():
+                counters = stock.get(product_id)
+                if counters is None or counters[0] < qty:
+                    self.rejections += 1
+                    return product_id
+            for product_id, qty in cart.items():
+                stock[product_id][0] -= qty
+                stock[product_id][1] += qty
+                d = self._pending.setdefault((location_id, product_id), [0, 0])
+                d[0] -= qty
+                d[1] += qty
+            self._seq += 1
+            seq = self._seq
+            self.journal.append(seq, {"location_id": location_id, "items": cart})
+            self.reservations += 1
+        self.journal.wait_durable(seq)
+        self._ensure_started()
+        return None
+
+    def release(self, location_id, cart):
+        """Undo a reservation whose order could not be created"""
+        with self._lock:
+            stock = self._stock.get(location_id, {})
+            for product_id, qty in cart.items():
+                if product_id in stock:
+                    stock[product_id][0] += qty
+                    stock[product_id][1] -= qty
+                d = self._pending.setdefault((location_id, product_id), [0, 0])
+                d[0] += qty
+                d[1] -= qty
+            self._seq += 1
+            seq = self._seq
+            self.journal.append(seq, {"location_id": location_id, "items": cart, "release": True})
+        self.journal.wait_durable(seq)
+        self._ensure_started()
+
+    def available(self, location_id, product_id):
+        with self._lock:
+            counters = self._stock.get(location_id, {}).get(product_id)
+            return None if counters is None else counters[0]
+
+    # ---- write-behind ----
+
+    def _write(self, conn, deltas, upto):
+        """Apply deltas and record upto as the last journal seq they cover; caller commits"""
+        items = [(product_id, location_id, d[0], d[1])
+                 for (location_id, product_id), d in deltas.items() if d[0] or d[1]]
+        cur = conn.cursor()
+        try:
+            for i in range(0, len(items), FLUSH_CHUNK):
+                chunk = items[i:i + FLUSH_CHUNK]
+                cur.execute(delta_update_sql(len(chunk)), [v for row in chunk for v in row])
+            cur.execute("UPDATE stock_ledger_state SET last_seq = ?, updated_at = GETDATE() WHERE ledger_id = ?",
+                        (upto, LEDGER_ID))
+            if cur.rowcount == 0:
+                cur.execute("INSERT INTO stock_ledger_state (ledger_id, last_seq) VALUES (?, ?)", (LEDGER_ID, upto))
+        finally:
+            cur.close()
+        return len(items)
+
+    def flush(self):
+        """Write pending deltas to inventory_stock, then drop the journal records they cover"""
+        with self._flush_lock:
+            with self._lock:
+                deltas, self._pending = self._pending, {}
+                upto = self._seq
+            if not deltas:
+                return 0
+            try:
+                with self.pool.get_connection() as conn:
+                    written = self._write(conn, deltas, upto)
+            except Exception as e:
+                self.failures += 1
+                print(f"⚠ Stock ledger flush failed, will retry: {e}")
+                with self._lock:
+                    for key, (d_available, d_reserved) in deltas.items():
+                        d = self._pending.setdefault(key, [0, 0])
+                        d[0] += d_available
+                        d[1] += d_reserved
+                return 0
+
+            with self._lock:
+                clean = not self._pending
+            if clean or self.journal.size() > JOURNAL_MAX_BYTES:
+                self.journal.compact(upto)
+            self.flushes += 1
+            self.flushed_rows += written
+            self._notify_flushed(deltas)
+            return written
+
+    def _notify_flushed(self, deltas):
+        """Tell on_flushed which stores changed, with the current available counts of the flushed rows"""
+        if self.on_flushed is None:
+            return
+        with self._lock:
+            levels = {}
+            for location_id, product_id in deltas:
+                counters = self._stock.get(location_id, {}).get(product_id)
+                products = levels.setdefault(location_id, {})
+                if counters is not None:
+                    products[product_id] = counters[0]
+        try:
+            self.on_flushed(levels)
+        except Exception as e:
+            print(f"⚠ Stock ledger flush hook failed: {e}")
+
+    @contextmanager
+    def hold(self, conn):
+        """
+        For staff read-modify-writes of inventory_stock: commits every pending
+        delta over conn first, so the caller reads current stock, and holds
+        off reservations until the block ends so nothing is reserved against
+        the numbers it is about to rewrite. Keep the block short; checkouts
+        at every location wait on it.
+        """
+        with self._flush_lock:
+            with self._lock:
+                deltas, self._pending = self._pending, {}
+                upto = self._seq
+                if deltas:
+                    try:
+                        written = self._write(conn, deltas, upto)
+                        conn.commit()
+                    except Exception:
+                        conn.rollback()
+                        self.failures += 1
+                        self._pending = deltas
+                        raise
+                    self.flushes += 1
+                    self.flushed_rows += written
+                    self._notify_flushed(deltas)   # before the caller's own writes update the caches
+                yield
+            if deltas:
+                self.journal.compact(upto)
+
+    def _ensure_started(self):
+        if self._thread is None or not self._thread.is_alive():
+            with self._lock:
+                if self._thread is None or not self._thread.is_alive():
+                    self._thread = threading.Thread(target=self._run, name="stock-ledger-writer", daemon=True)
+                    self._thread.start()
+
+    def _run(self):
+        while not self._stopped:
+            self._wake.wait(self.flush_seconds)
+            self.flush()
+
+    def stop(self, timeout=5.0):
+        """Flush what is pending and stop the writer (used at shutdown)"""
+        self._stopped = True
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def stats(self) -> dict:
+        with self._lock:
+            pending = len(self._pending)
+            locations = len(self._stock)
+        return {
+            "enabled": ENABLED,
+            "locations": locations,
+            "pending_rows": pending,
+            "reservations": self.reservations,
+            "rejections": self.rejections,
+            "flushes": self.flushes,
+            "flushed_rows": self.flushed_rows,
+            "failures": self.failures,
+            "reloads": self.reloads,
+            "journal_syncs": self.journal.syncs,
+        }
+
+ledger = StockLedger()
+atexit.register(ledger.stop)
@@ -0,0 +1,77 @@
+import json
+import os
+
+try:
+    import orjson
+except ImportError:   # optional; the stdlib encoder produces the same JSON, just slower
+    orjson = None
+
+# Streaming JSON array responses for large result sets.
+# Rows are pulled from an open cursor BATCH_ROWS at a time, encoded straight
+# to bytes and yielded, so a request holds one batch of Python objects
+# instead of the whole result. The response owns the cursor and connection
+# and closes them when the body is finished or the client goes away.
+
+ENABLED = os.getenv("STREAM_RESPONSES", "1") == "1"
+BATCH_ROWS = int(os.getenv("STREAM_BATCH_ROWS", "1000"))
+
+def encoder(default):
+    """dumps(list) -> bytes with jsonify's output: sorted keys, compact, `default` for dates/Decimals"""
+    if orjson is not None:
+        # orjson would write datetimes as ISO; pass them to `default` so they match jsonify
+        options = orjson.OPT_SORT_KEYS | orjson.OPT_PASSTHROUGH_DATETIME
+        return lambda obj: orjson.dumps(obj, default=default, option=options)
+    encode = json.JSONEncoder(default=default, sort_keys=True, separators=(",", ":")).encode
+    return lambda obj: encode(obj).encode()
+
+class RowStream:
+    """
+    Iterable response body: a JSON array of to_json(row) for every row left on cur.
+    on_complete(body bytes) runs once the whole array has been sent (e.g. to cache it);
+    pass it only when keeping one copy of the encoded body is acceptable.
+    """
+
+    def __init__(self, conn, cur, to_json, default, batch_rows=None, on_complete=None):
+        self._conn = conn
+        self._cur = cur
+        self._to_json = to_json
+        self._dumps = encoder(default)
+        self._batch_rows = batch_rows or BATCH_ROWS
+        self._on_complete = on_complete
+
+    def __iter__(self):
+        return self._chunks()
+
+    def _chunks(self):
+        sent = [] if self._on_complete else None
+        opening = b"["
+        try:
+            while True:
+                rows = self._cur.fetchmany(self._batch_rows)
+                if not rows:
+                    break
+                # encode the batch as one array and splice it into the open one
+                chunk = opening + self._dumps([self._to_json(row) for row in rows])[1:-1]
+                opening = b","
+                if sent is not None:
+                    sent.append(chunk)
+                yield chunk
+            closing = b"[]" if opening == b"[" else b"]"
+            yield closing
+            if sent is not None:
+                sent.append(closing)
+                self._on_complete(b"".join(sent))
+        except Exception as e:
+            # headers are already out; all we can do is cut the body short
+            print(f"Streaming response aborted: {e}")
+        finally:
+            self.close()
+
+    def close(self):
+        """Return the cursor and connection; safe to call more than once (the WSGI server calls it too)"""
+        if self._cur is not None:
+            try:
+                self._cur.close()
+            finally:
+                self._cur = None
+                self._conn.close()
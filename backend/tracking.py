@@ -0,0 +1,253 @@
+import os
+import time
+import atexit
+import threading
+from datetime import datetime
+
+import numpy as np
+
+import db
+import geo
+
+# Partner GPS ingestion.
+# Pings land in a fixed-size ring buffer per partner (one float64 array of
+# (ts, lat, lon) rows); a background thread periodically downsamples what
+# arrived since the last flush, bulk-inserts it into delivery_tracking with
+# executemany and moves every partner's current position in one UPDATE.
+
+TRAIL_SIZE = int(os.getenv("TRACKING_TRAIL_SIZE", "120"))              # points kept per partner
+FLUSH_SECONDS = float(os.getenv("TRACKING_FLUSH_SECONDS", "5"))
+MIN_DISTANCE_M = float(os.getenv("TRACKING_MIN_DISTANCE_M", "25"))     # persist a point once the partner moved this far...
+MIN_INTERVAL_SECONDS = float(os.getenv("TRACKING_MIN_INTERVAL_S", "30"))   # ...or this much time passed
+ACTIVE_ORDER_TTL = 60.0      # re-check a partner's active order after this long
+IDLE_EVICT_SECONDS = 3600.0  # drop trails of partners that stopped pinging
+MAX_BACKLOG = 100000         # tracking rows kept for retry while the database is unreachable
+INSERT_BATCH = 1000
+POSITION_BATCH = 500         # 4 parameters per row, under SQL Server's 2100 limit
+
+INSERT_TRACKING = """
+    INSERT INTO delivery_tracking (order_id, delivery_partner_id, status, latitude, longitude, created_at)
+    VALUES (?, ?, ?, ?, ?, ?)
+"""
+
+def position_update_sql(n: int) -> str:
+    """One UPDATE moving n partners, parameters are (partner_id, latitude, longitude, updated_at) per row"""
+    rows = " UNION ALL ".join(
+        ["SELECT ? AS partner_id, ? AS latitude, ? AS longitude, ? AS updated_at"] + ["SELECT ?, ?, ?, ?"] * (n - 1))
+    return f"""
+        UPDATE delivery_partners
+        SET current_location_latitude = p.latitude,
+            current_location_longitude = p.longitude,
+            last_location_update = p.updated_at
+        FROM ({rows}) p
+        WHERE delivery_partners.partner_id = p.partner_id
+    """
+
+class Trail:
+    """Ring buffer of the latest (ts, lat, lon) points for one partner"""
+    __slots__ = ("points", "seq", "flushed", "kept", "order_id", "status", "order_checked_at")
+
+    def __init__(self, size=TRAIL_SIZE):
+        self.points = np.empty((size, 3), dtype=np.float64)
+        self.seq = 0          # points ever appended
+        self.flushed = 0      # seq at the last flush
+        self.kept = None      # last persisted (ts, lat, lon), for downsampling across flushes
+        self.order_id = None
+        self.status = None
+        self.order_checked_at = None
+
+    def latest(self):
+        if not self.seq:
+            return None
+        return self.points[(self.seq - 1) % len(self.points)]
+
+    def append(self, points) -> int:
+        """points: (n, 3) array sorted by ts; anything not newer than the latest point is dropped"""
+        last = self.latest()
+        if last is not None:
+            points = points[points[:, 0] > last[0]]
+        n = len(points)
+        if not n:
+            return 0
+        size = len(self.points)
+        if n > size:
+            points = points[-size:]
+        self.points[(self.seq + n - len(points) + np.arange(len(points))) % size] = points
+        self.seq += n
+        return n
+
+    def recent(self, count=None):
+        """The newest points in time order"""
+        available = min(self.seq, len(self.points))
+        count = available if count is None else min(count, available)
+        return self.points[(self.seq - count + np.arange(count)) % len(self.points)]
+
+class Tracker:
+    def __init__(self, trail_size=TRAIL_SIZE, flush_seconds=FLUSH_SECONDS,
+                 min_distance_m=MIN_DISTANCE_M, min_interval=MIN_INTERVAL_SECONDS, pool=None):
+        self.trail_size = trail_size
+        self.flush_seconds = flush_seconds
+        self.min_distance_km = min_distance_m / 1000
+        self.min_interval = min_interval
+        self.pool = pool or db.pool
+
+        self.partner_ids = {}   # user_id -> partner_id, so pings don't need a lookup
+        self._trails = {}     # partner_id -> Trail
+        self._backlog = []    # tracking rows waiting for the next flush
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._thread = None
+        self._stopped = False
+
+        # metrics
+        self.received = 0
+        self.stale = 0
+        self.persisted = 0
+        self.flushes = 0
+        self.failures = 0
+        self._flush_total = 0.0
+
+    # ---- ingestion ----
+
+    def needs_order(self, partner_id) -> bool:
+        """Whether the caller should look up the partner's active order before ingesting"""
+        trail = self._trails.get(partner_id)
+        return (trail is None or trail.order_checked_at is None
+                or time.monotonic() - trail.order_checked_at > ACTIVE_ORDER_TTL)
+
+    def set_active_order(self, partner_id, order_id, status):
+        """Attach subsequent points to this order (None when the partner has none)"""
+        with self._lock:
+            trail = self._trails.get(partner_id)
+            if trail is None:
+                trail = self._trails[partner_id] = Trail(self.trail_size)
+            elif trail.order_id != order_id and trail.seq != trail.flushed:
+                # points so far belong to the previous order
+                self._backlog.extend(self._drain(partner_id, trail))
+            trail.order_id, trail.status = order_id, status
+            trail.order_checked_at = time.monotonic()
+
+    def ingest(self, partner_id, points):
+        """
+        points: iterable of (ts, lat, lon). Returns the latest (lat, lon) or None
+        if nothing newer than what is already buffered arrived.
+        """
+        batch = np.asarray(points, dtype=np.float64).reshape(-1, 3)
+        batch = batch[np.argsort(batch[:, 0], kind="stable")]
+        with self._lock:
+            trail = self._trails.get(partner_id)
+            if trail is None:
+                trail = self._trails[partner_id] = Trail(self.trail_size)
+            accepted = trail.append(batch)
+            self.received += len(batch)
+            self.stale += len(batch) - accepted
+            self._ensure_started()
+            if not accepted:
+                return None
+            latest = trail.latest()
+            return float(latest[1]), float(latest[2])
+
+    def trail(self, partner_id, count=None):
+        """Recent [(ts, lat, lon)] for a partner, oldest first"""
+        with self._lock:
+            trail = self._trails.get(partner_id)
+            return [] if trail is None else [tuple(p) for p in trail.recent(count).tolist()]
+
+    # ---- flushing ----
+
+    def _drain(self, partner_id, trail):
+        """Downsample the points since the last flush into tracking rows; caller holds the lock"""
+        pending = trail.recent(trail.seq - trail.flushed)
+        trail.flushed = trail.seq
+        if trail.order_id is None or not len(pending):
+            return []
+        # distance of every point from its predecessor, computed in one pass
+        prev = np.vstack([pending[:1] if trail.kept is None else [trail.kept], pending[:-1]])
+        steps = geo.haversine_km(prev[:, 1], prev[:, 2], pending[:, 1], pending[:, 2])
+        rows, kept, moved = [], trail.kept, 0.0
+        for i, (ts, lat, lon) in enumerate(pending.tolist()):
+            moved += steps[i]
+            if kept is None or moved >= self.min_distance_km or ts - kept[0] >= self.min_interval:
+                rows.append((trail.order_id, partner_id, trail.status, lat, lon, datetime.fromtimestamp(ts)))
+                kept, moved = (ts, lat, lon), 0.0
+        trail.kept = kept
+        return rows
+
+    def flush(self):
+        """Persist everything received since the last flush; returns the number of tracking rows written"""
+        started = time.perf_counter()
+        now = time.time()
+        with self._lock:
+            rows, self._backlog = self._backlog, []
+            positions = []
+            for partner_id, trail in list(self._trails.items()):
+                if trail.seq == trail.flushed:
+                    latest = trail.latest()
+                    if latest is None or now - latest[0] > IDLE_EVICT_SECONDS:
+                        del self._trails[partner_id]
+                    continue
+                rows.extend(self._drain(partner_id, trail))
+                ts, lat, lon = trail.latest().tolist()
+                positions.append((partner_id, lat, lon, datetime.fromtimestamp(ts)))
+        if not rows and not positions:
+            return 0
+
+        try:
+            with self.pool.get_cursor() as cur:
+                if hasattr(cur, "fast_executemany"):
+                    cur.fast_executemany = True
+                for i in range(0, len(rows), INSERT_BATCH):
+                    cur.executemany(INSERT_TRACKING, rows[i:i + INSERT_BATCH])
+                for i in range(0, len(positions), POSITION_BATCH):
+                    chunk = positions[i:i + POSITION_BATCH]
+                    cur.execute(position_update_sql(len(chunk)), [value for row in chunk for value in row])
+        except Exception as e:
+            self.failures += 1
+            print(f"⚠ Could not flush {len(rows)} tracking points: {e}")
+            with self._lock:
+                # positions are re-sent with the next ping; keep the trail rows for a retry
+                self._backlog = (rows + self._backlog)[-MAX_BACKLOG:]
+            return 0
+
+        self.persisted += len(rows)
+        self.flushes += 1
+        self._flush_total += time.perf_counter() - started
+        return len(rows)
+
+    def _ensure_started(self):
+        """Caller holds the lock"""
+        if self._thread is None or not self._thread.is_alive():
+            self._thread = threading.Thread(target=self._run, name="tracking-flusher", daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        while not self._stopped:
+            self._wake.wait(self.flush_seconds)
+            self.flush()
+
+    def stop(self, timeout=5.0):
+        """Flush what is buffered and stop the worker (used at shutdown)"""
+        self._stopped = True
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+        else:
+            self.flush()
+
+    def stats(self) -> dict:
+        with self._lock:
+            partners = len(self._trails)
+            backlog = len(self._backlog)
+        return {
+            "partners": partners,
+            "received": self.received,
+            "stale": self.stale,
+            "persisted": self.persisted,
+            "backlog": backlog,
+            "flushes": self.flushes,
+            "failures": self.failures,
+            "flush_avg_ms": round(self._flush_total / self.flushes * 1000, 3) if self.flushes else 0.0,
+        }
+
+tracker = Tracker()
+atexit.register(tracker.stop)
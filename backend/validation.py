@@ -0,0 +1,72 @@
+from functools import lru_cache
+from typing import Annotated, Any, List, Union
+
+from pydantic import Field, TypeAdapter, ValidationError
+from pydantic_core import from_json
+
+# Request validation fast path.
+# Model(**request.get_json()) parses the body with the stdlib json module and
+# then walks the resulting dict again in Python. Here the raw body goes to the
+# type's compiled pydantic-core validator, which parses and validates in one
+# pass. JSON-mode validation words a few errors differently ("an object"
+# rather than "a valid dictionary"), so a body that fails is re-validated as
+# Model(**data): callers see exactly the same e.errors() as before.
+
+@lru_cache(maxsize=None)
+def validator(tp):
+    """Compiled validator for a type that isn't a model class (e.g. List[OrderItem]), built once"""
+    return TypeAdapter(tp).validator
+
+def parse_body(model, req):
+    """
+    model(**req.get_json()) for a Flask request, in one pass over the raw body.
+    A wrong content type (415) or malformed JSON (400) fails exactly as get_json() does;
+    a body that isn't a JSON object raises ValidationError rather than model(**list)'s TypeError.
+    """
+    if not req.is_json:
+        return model(**req.get_json())
+    body = req.get_data()
+    try:
+        return model.__pydantic_validator__.validate_json(body)
+    except ValidationError:
+        pass
+    # slow path for bad input only: parse on its own and let the model raise what it always has
+    try:
+        data = from_json(body)
+    except ValueError as e:
+        return req.on_json_loading_failed(e)
+    if not isinstance(data, dict):
+        return model.model_validate(data)
+    return model(**data)
+
+def json_or_none(req):
+    """req.get_json(silent=True): the parsed body, or None if it isn't JSON"""
+    if not req.is_json:
+        return None
+    try:
+        return from_json(req.get_data())
+    except ValueError:
+        return None
+
+@lru_cache(maxsize=None)
+def _lenient_list(model):
+    return validator(List[Annotated[Union[model, Any], Field(union_mode="left_to_right")]])
+
+def validate_many(model, items):
+    """
+    Bulk mode: validate a list of dicts in one call instead of model(**item) per item.
+    Returns (values, errors): values[i] is the validated model (None if it failed) and
+    errors maps i -> the e.errors() that model(**items[i]) raises.
+    """
+    # an item the model rejects falls through to Any and comes back as-is, so one bad
+    # line doesn't throw away the rest of the batch; only those are validated again
+    values = _lenient_list(model).validate_python(items)
+    errors = {}
+    for i, value in enumerate(values):
+        if not isinstance(value, model):
+            values[i] = None
+            try:
+                values[i] = model(**items[i])
+            except ValidationError as e:
+                errors[i] = e.errors()
+    return values, errors
@@ -0,0 +1,69 @@
+// Live order status updates over Server-Sent Events, with a slow poll behind them.
+// EventSource can't send an Authorization header, and the login token must not
+// end up in URLs (access and proxy logs keep them), so each connection opens
+// with a short-lived, single-use ticket from POST /api/orders/stream/ticket.
+// Because a ticket can't be reused, EventSource's own reconnect (same URL) is
+// refused: on any error we close the source and open a new one with a fresh
+// ticket, passing the last event id so missed events on the same server
+// process are replayed. The server's event bus is per process, though: with
+// several workers this stream only carries changes made on the one it is
+// connected to, and after a reconnect it may be talking to a different one.
+// So onResync (refetch /api/orders) runs on a "reset" event, on every
+// reconnect, and every FALLBACK_POLL_MS.
+import api from "./axios";
+
+const FALLBACK_POLL_MS = 60000;
+const RECONNECT_MS = 3000;
+
+export function subscribeOrders({ onOrder, onResync }) {
+  const base = import.meta.env.VITE_API_BASE_URL || "";
+  let source = null;
+  let retry = null;
+  let lastEventId = "";
+  let connected = false;
+  let closed = false;
+
+  const reconnect = () => {
+    if (source) source.close();
+    source = null;
+    if (!closed && !retry) retry = setTimeout(open, RECONNECT_MS);
+  };
+
+  async function open() {
+    retry = null;
+    let ticket;
+    try {
+      ({ ticket } = (await api.post("/api/orders/stream/ticket")).data);
+    } catch {
+      reconnect();
+      return;
+    }
+    if (closed) return;
+    const params = new URLSearchParams({ ticket });
+    if (lastEventId) params.set("last_event_id", lastEventId);
+    source = new EventSource(`${base}/api/orders/stream?${params}`);
+    source.addEventListener("open", () => {
+      if (connected) onResync(); // reconnected: reconcile whatever happened while we were away
+      connected = true;
+    });
+    source.addEventListener("order", (e) => {
+      lastEventId = e.lastEventId || lastEventId;
+      onOrder(JSON.parse(e.data));
+    });
+    source.addEventListener("reset", (e) => {
+      lastEventId = e.lastEventId || lastEventId;
+      onResync();
+    });
+    source.addEventListener("error", reconnect);
+  }
+
+  open();
+  const poll = setInterval(onResync, FALLBACK_POLL_MS);
+
+  return () => {
+    closed = true;
+    clearInterval(poll);
+    clearTimeout(retry);
+    if (source) source.close();
+  };
+}
@@ -1,6 +1,7 @@
-import React, { useState, useEffect, useContext } from 'react';
+import React, { useState, useEffect, useContext, useRef } from 'react';
 import { AuthContext } from '../context/AuthContext';
 import api from '../api/axios';
+import { subscribeOrders } from '../api/orderStream';
 
 const DeliveryDashboard = () => {
     const { user } = useContext(AuthContext);
@@ -8,12 +9,19 @@ const DeliveryDashboard = () => {
     const [loading, setLoading] = useState(true);
 
     const [isOnline, setIsOnline] = useState(false);
+    const knownIds = useRef(new Set());
 
     useEffect(() => {
         fetchOrders();
         checkStatus();
-        const interval = setInterval(fetchOrders, 15000); // 15s updates
-        return () => clearInterval(interval);
+        // New assignments and status changes are pushed by the server (slow poll as a fallback)
+        return subscribeOrders({
+            onOrder: (event) => {
+                if (!knownIds.current.has(event.order_id)) return fetchOrders();
+                setOrders(prev => prev.map(o => o.order_id === event.order_id ? { ...o, status: event.status } : o));
+            },
+            onResync: fetchOrders,
+        });
     }, []);
 
     const checkStatus = async () => {
@@ -35,6 +43,7 @@ const DeliveryDashboard = () => {
     const fetchOrders = async () => {
         try {
             const res = await api.get('/api/orders');
+            knownIds.current = new Set(res.data.map(o => o.order_id));
             setOrders(res.data);
             setLoading(false);
         } catch (err) {
@@ -1,19 +1,28 @@
-import { useState, useEffect } from "react";
+import { useState, useEffect, useRef } from "react";
 import api from "../api/axios";
+import { subscribeOrders } from "../api/orderStream";
 
 export default function OrderTracking() {
   const [orders, setOrders] = useState([]);
   const [loading, setLoading] = useState(true);
+  const knownIds = useRef(new Set());
 
   useEffect(() => {
     fetchOrders();
-    const interval = setInterval(fetchOrders, 10000); // Poll every 10s
-    return () => clearInterval(interval);
+    // Status changes are pushed by the server (slow poll as a fallback); refetch for orders we haven't seen
+    return subscribeOrders({
+      onOrder: (event) => {
+        if (!knownIds.current.has(event.order_id)) return fetchOrders();
+        setOrders((prev) => prev.map((o) => (o.order_id === event.order_id ? { ...o, status: event.status } : o)));
+      },
+      onResync: fetchOrders,
+    });
   }, []);
 
   const fetchOrders = async () => {
     try {
       const res = await api.get("/api/orders");
+      knownIds.current = new Set(res.data.map((o) => o.order_id));
       setOrders(res.data);
       setLoading(false);
     } catch (err) {